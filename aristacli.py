@@ -0,0 +1,749 @@
+#!/usr/bin/env python
+'''
+Arista state backup / diff / parse tools
+
+All the arista-cli*.py variants in one module. Heavy dependencies are imported
+only by the code path that needs them:
+    pyeapi      --> AristaCli (backup, unless client='async')
+    clitable    --> execute_parser (backup, parse)
+    pandas      --> AristaStateDiff with engine='pandas'
+so a diff run with the default merge engine never loads pyeapi, textfsm or pandas.
+
+Usage (see arista-cli.py):
+    arista-cli.py backup carcore3 --username herry
+    arista-cli.py diff carcore3_backup_20170928005037.json carcore3_backup_20170928110800.json
+    arista-cli.py diff carcore3_backup_20170928005037.json carcore3_backup_20170928110800.json --feed diff.jsonl
+    arista-cli.py parse carcore3_backup_20170928110800.txt
+'''
+from __future__ import print_function
+
+import os
+import sys
+import json
+import getpass
+import pprint
+import argparse
+import threading
+
+from datetime import datetime
+
+import eosjson
+import fastdiff
+import rowschema
+import snapstats
+import snapfilter
+import diffconfig
+
+from difftable import table_rows
+
+TEMPLATE_INDEX_DIR = '/scratch/herry/git/code/systems-lib/python/systemslib/net/Arista/template/'
+TEMPLATE_INDEX_FLIE = 'index'
+
+COMMAND_LIST = ['show ip route',
+                'show ip bgp',
+                'show ip bgp summary',
+                'show ip ospf database',
+                'show ip pim neighbor',
+                'show ip pim interface',
+                'show ip mroute',
+                'show interfaces status',
+                'show ip interface brief',
+                'show lldp neighbors detail',
+                'show mac address-table',
+                'show ip arp',
+                'show ip mfib',
+                ]
+
+
+def execute_parser(template, attributes, section_data):
+    '''
+    parse section_data with the template clitable finds for attributes
+    return the table as a list of rows (first row is the header) or None
+    '''
+    import clitable
+    cli_table = clitable.CliTable(template['Index File'], template['Template Dir'])
+    try:
+        cli_table.ParseCmd(section_data, attributes)
+    except clitable.CliTableError as e:
+        return None
+    result = []
+    for line in cli_table.table.split('\n'):
+        result.append(line.split(', '))
+    return result
+
+
+def format_table(header, records, separator=', '):
+    '''
+    the rows execute_parser makes of clitable's text table: header, one row per record split
+    on ', ' (list values are printed as a python list) and a trailing ['']
+    separator=',' gives the rows of cliparser's execute_parser instead
+    '''
+    return list(iter_table(header, records, separator))
+
+
+def iter_table(header, records, separator=', '):
+    '''
+    format_table one row at a time
+    '''
+    yield ', '.join(header).split(separator)
+    for record in records:
+        line = ', '.join(str([str(v) for v in value]) if isinstance(value, list) else str(value)
+                         for value in record)
+        yield line.split(separator)
+    yield ['']
+
+
+class TemplateCache(object):
+    '''
+    execute_parser without reading the index and compiling the template on every call
+
+    the index is read once into a templateindex.TemplateIndex per set of attributes
+    other than the command, and every TextFSM template compiled the first time it is
+    used (as a fastfsm.FastTextFSM), then Reset() for each parse; commands with more
+    than one template (merged tables) are still left to clitable
+
+    a compiled FSM holds the state of the parse running in it, so it is checked out
+    for the whole parse (until an iter_rows generator is done) and given back after:
+    parses running at the same time (snapshotd threads, interleaved generators) each
+    get their own FSM, compiled when no free one is left
+    '''
+    def __init__(self, template_dir=TEMPLATE_INDEX_DIR, index_file=TEMPLATE_INDEX_FLIE):
+        self.template = {'Template Dir': template_dir, 'Index File': index_file}
+        self.indexes = {}
+        self.fsm = {}
+        self.lock = threading.Lock()
+
+    def get_index(self, attributes):
+        fixed = dict((k, v) for k, v in attributes.items() if k != 'Command')
+        key = tuple(sorted(fixed.items()))
+        with self.lock:
+            if key not in self.indexes:
+                from templateindex import TemplateIndex
+                self.indexes[key] = TemplateIndex(self.template['Index File'], self.template['Template Dir'],
+                                                  fixed)
+            return self.indexes[key]
+
+    def get_templates(self, attributes):
+        return self.get_index(attributes).templates(attributes['Command'])
+
+    def get_fsm(self, name):
+        '''
+        a Reset() FSM of template name nobody else is using, to hand back with put_fsm
+        '''
+        with self.lock:
+            free = self.fsm.setdefault(name, [])
+            fsm = free.pop() if free else None
+        if fsm is None:
+            from fastfsm import FastTextFSM
+            with open(os.path.join(self.template['Template Dir'], name)) as f:
+                fsm = FastTextFSM(f)
+        fsm.Reset()
+        return fsm
+
+    def put_fsm(self, name, fsm):
+        with self.lock:
+            self.fsm[name].append(fsm)
+
+    def parse(self, attributes, section_data, separator=', '):
+        '''
+        same result as execute_parser(template, attributes, section_data)
+        '''
+        names = self.get_templates(attributes)
+        if not names:
+            return None
+        if len(names) > 1:
+            result = execute_parser(self.template, attributes, section_data)
+            if result and separator != ', ':
+                result = [', '.join(row).split(separator) for row in result]
+            return result
+        fsm = self.get_fsm(names[0])
+        try:
+            return format_table(fsm.header, fsm.ParseText(section_data), separator)
+        finally:
+            self.put_fsm(names[0], fsm)
+
+    def parse_lines(self, attributes, lines, separator=', '):
+        '''
+        parse with the lines of a section fed to TextFSM as they come, e.g. from
+        cliparser.iter_section_lines, without joining them into one string
+        '''
+        rows = self.iter_rows(attributes, lines, separator)
+        return list(rows) if rows is not None else None
+
+    def iter_rows(self, attributes, lines, separator=', '):
+        '''
+        the rows of parse_lines as a generator, each one made as soon as TextFSM has the record
+        None without a template; commands with more than one template are joined and parsed whole
+        '''
+        names = self.get_templates(attributes)
+        if not names:
+            return None
+        if len(names) > 1:
+            result = self.parse(attributes, ''.join(lines), separator)
+            return iter(result) if result else None
+        return self.stream_rows(names[0], lines, separator)
+
+    def stream_rows(self, name, lines, separator):
+        import fsmstream
+        fsm = self.get_fsm(name)
+        try:
+            for row in iter_table(fsm.header, fsmstream.iter_records(fsm, lines), separator):
+                yield row
+        finally:
+            # also when the generator is dropped half way (GeneratorExit)
+            self.put_fsm(name, fsm)
+
+
+class AristaCli(object):
+    '''
+    client='pyeapi' runs the command list in one pyeapi call, client='async' with the
+    chunked / pipelined eapiclient.EapiClient
+    '''
+    def __init__(self, device, username='', password='', transport='https', command_list=[], client='pyeapi',
+                 port=None):
+        self.device = device
+        self.username = username
+        self.transport = transport
+        self.command_list = command_list
+
+        if not password:
+            # get password from console
+            self.password = getpass.getpass('Please input your password: ')
+        else:
+            self.password = password
+
+        if client == 'async':
+            import eapiclient
+            self.node = eapiclient.EapiClient(self.device, username=self.username, password=self.password,
+                                              transport=self.transport, port=port)
+            return
+        import pyeapi
+        self.node = pyeapi.connect(transport=self.transport,
+                                host=self.device,
+                                username=self.username,
+                                password=self.password,
+                                port=port,
+                                return_node=True)
+
+    def set_command_list(self, c_list):
+        if c_list:
+            self.command_list = c_list if type(c_list) == list else list(c_list)
+
+    def get_result(self, encoding):
+        if self.command_list:
+            return(self.node.enable(self.command_list, encoding=encoding))
+        return None
+
+
+class AristaStateBackup(object):
+    '''
+    encoding='text' parses every command with TextFSM, encoding='json' takes the
+    eAPI json of the commands which support it (flattened into the template table by
+    eosjson.py where there is a normalizer) and only parses the others
+    cli is an already connected AristaCli to use, e.g. from a connpool.ConnectionPool session
+    templates is a TemplateCache to parse with instead of execute_parser
+    store is a deltastore.DeltaStore to put the snapshot in instead of the .txt / .json files
+    the summary statistics of every table (snapstats.py) are kept in self.stats and written
+    to <backup_file_name>.stats.json, with a store to <device>_backup_<timestamp>.stats.json
+    in the store directory
+    the Bloom filters of the key columns of every table (snapfilter.py) go to .bloom.json the same way
+    '''
+    def __init__(self, device, username='', password='', command_list=[], backup_file_name='',
+                 encoding='text', template_dir=TEMPLATE_INDEX_DIR, index_file=TEMPLATE_INDEX_FLIE, client='pyeapi',
+                 cli=None, templates=None, store=None):
+        self.device = device
+        self.username = username
+        self.password = password
+        self.encoding = encoding
+        self.template = {'Template Dir': template_dir, 'Index File': index_file}
+        self.templates = templates
+        self.store = store
+        self.stats = None
+
+        self.command_list = command_list
+        self.timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+        if not backup_file_name:
+            backup_file_name = self.device + "_backup_" + self.timestamp
+        self.backup_file_name = backup_file_name
+
+        if cli is not None:
+            self.cli = cli
+            self.cli.set_command_list(self.command_list)
+            return
+        self.cli = AristaCli(self.device, username=self.username, password=self.password,
+                       command_list=self.command_list, client=client)
+
+    def set_command_list(self, c_list):
+        if c_list:
+            self.command_list = c_list if type(c_list) == list else list(c_list)
+            self.cli.set_command_list(self.command_list)
+
+    def get_status(self):
+        fin_result_text = []
+        fin_result_json = []
+
+        # get text version of all commands and save it into a text backup file
+        cli_result = self.cli.get_result('text')
+
+        if cli_result:
+            # the async client reports a command it couldn't run instead of failing them all
+            cli_result = [r for r in cli_result if 'error' not in r]
+            fin_result_text = [[r['command'], r['result']['output']] for r in cli_result]
+        if self.store is None:
+            with open(self.backup_file_name + ".txt", 'w') as f:
+                for command, output in fin_result_text:
+                    f.write("--------------- %s -------------\n" % command)
+                    f.write(output)
+                    f.write("--------------------------------\n")
+
+        if self.encoding == 'json':
+            # commands without json support come back as text and still need a parse
+            cli_result = [r for r in self.cli.get_result('json') if 'error' not in r]
+
+        for r in cli_result:
+            print(r['command'])
+            if self.encoding == 'json' and r['encoding'] == 'json':
+                # flattened into the template table where eosjson knows the command, else kept as json
+                if not eosjson.normalize_result(r):
+                    r['parser'] = 'eos'
+                fin_result_json.append(r)
+                continue
+            r['parser'] = 'google'
+            attributes = {'Command': r['command'], 'Vendor': 'Arista'}
+            if self.templates is not None:
+                parse_result = self.templates.parse(attributes, r['result']['output'])
+            else:
+                parse_result = execute_parser(self.template, attributes, r['result']['output'])
+            if parse_result:
+                r['result'] = parse_result
+                r['encoding'] = 'list'
+            else:
+                print("Don't know how to parse %s. But keep it raw !!" % r['command'])
+            fin_result_json.append(r)
+        self.stats = snapstats.snapshot_stats(fin_result_json, self.device, self.timestamp)
+        if self.store is not None:
+            self.store.put(self.device, fin_result_text, fin_result_json, timestamp=self.timestamp)
+            sidecar_name = self.store.backup_file_name(self.device, self.timestamp)
+        else:
+            with open(self.backup_file_name + ".json", 'w') as f:
+                json.dump(fin_result_json, f, indent=2)
+            sidecar_name = self.backup_file_name
+        # after the snapshot, so the sidecars are not older than it
+        snapstats.write_stats(self.stats, snapstats.stats_file(sidecar_name))
+        snapfilter.write_filters(snapfilter.snapshot_filters(fin_result_json, self.device, self.timestamp),
+                                 snapfilter.filter_file(sidecar_name))
+
+        return fin_result_json
+
+    @staticmethod
+    def execute_parser(template, attributes, section_data):
+        return execute_parser(template, attributes, section_data)
+
+
+class AristaStateDiff(object):
+    '''
+    engine is 'pandas' or one of the pandas free engines in fastdiff.ENGINE ('merge', 'hash')
+    the result of every command diffed is kept in self.diff_result
+    with a diffcache.DiffCache the snapshots are only loaded when the pair is not cached
+    workers > 1 diffs the commands in that many processes, big tables cut in partitions (partdiff.py)
+    buckets diffs big tables in that many key hash buckets, spilled to spill_dir if given
+    iter_changes() streams the differences as change feed records instead (changefeed.py)
+    log prints the notes of the diff (commands skipped, diffed), print by default
+    the diff handle config of every command comes from the diffconfig registry
+    '''
+    def __init__(self, first, second, engine='pandas', run=True, verbose=True, cache=None,
+                 registry_file=diffconfig.REGISTRY_FILE, workers=None, partition_rows=None, buckets=None,
+                 spill_dir=None, log=None):
+        self.engine = engine
+        self.log = log or print
+        self.workers = workers
+        self.partition_rows = partition_rows
+        self.buckets = buckets
+        self.spill_dir = spill_dir
+        self.verbose = verbose
+        self.cache = cache
+        self.registry_file = registry_file
+        self.first_file_name = first
+        self.second_file_name = second
+        self.first_data = None
+        self.second_data = None
+        self.diff_handle_config = {}
+        self.diff_result = {}
+
+        self.config_diff_handle()
+        if run:
+            self.diff_state()
+
+    def config_diff_handle(self):
+        self.registry = diffconfig.DiffRegistry(getattr(self, 'registry_file', diffconfig.REGISTRY_FILE))
+        self.diff_handle_config = self.registry.config
+
+    def get_diff_handle_config(self, command):
+        if command in self.diff_handle_config:
+            return self.diff_handle_config[command]
+        return None
+
+    def load_data(self):
+        # compact rows (rowschema.py) hold the two snapshots in about half the memory
+        if self.first_data is None:
+            self.first_data = rowschema.load_compact(self.first_file_name)
+        if self.second_data is None:
+            self.second_data = rowschema.load_compact(self.second_file_name)
+
+    def get_cached_diff(self):
+        '''
+        return {command: diff} of the pair from the cache in the order they were diffed,
+        None unless every command is cached (a cached None diff, e.g. columns not matching, counts)
+        '''
+        hash_1 = self.cache.snapshot_hash(self.first_file_name)
+        hash_2 = self.cache.snapshot_hash(self.second_file_name)
+        command_list = self.cache.get(self.cache.make_key(hash_1, hash_2, None, self.diff_handle_config,
+                                                          self.engine))
+        if command_list is None:
+            return None
+        missing = object()
+        result = {}
+        for command in command_list:
+            key = self.cache.make_key(hash_1, hash_2, command, self.get_diff_handle_config(command), self.engine)
+            diff = self.cache.get(key, missing)
+            if diff is missing:
+                return None
+            result[command] = diff
+        return result
+
+    def put_cached_diff(self):
+        hash_1 = self.cache.snapshot_hash(self.first_file_name)
+        hash_2 = self.cache.snapshot_hash(self.second_file_name)
+        for command, diff in self.diff_result.items():
+            key = self.cache.make_key(hash_1, hash_2, command, self.get_diff_handle_config(command), self.engine)
+            self.cache.put(key, diff)
+        # the command list goes last, it is what marks the pair as complete; in diff order, the order to print
+        self.cache.put(self.cache.make_key(hash_1, hash_2, None, self.diff_handle_config, self.engine),
+                       list(self.diff_result))
+
+    def diff_state(self):
+        if self.cache is not None:
+            cached = self.get_cached_diff()
+            if cached is not None:
+                for command in cached:
+                    self.log("diff command %s (cached)" % command)
+                    if self.verbose:
+                        pprint.pprint(cached[command], width=2000)
+                self.diff_result = cached
+                return self.diff_result
+
+        self.load_data()
+        jobs = []
+        for command, data_1, data_2, diff_spec in self.iter_commands():
+            if self.workers and self.workers > 1:
+                if list(data_1[0]) == list(data_2[0]):
+                    jobs.append((command, data_1, data_2, diff_spec))
+                else:
+                    self.diff_result[command] = self.diff_generic(data_1, data_2, diff_spec)
+            else:
+                self.log("diff command %s" % command)
+                self.diff_result[command] = self.diff_generic(data_1, data_2, diff_spec)
+        if jobs:
+            self.diff_parallel(jobs)
+        if self.cache is not None:
+            self.put_cached_diff()
+        return self.diff_result
+
+    def iter_commands(self):
+        '''
+        yield (command, data_1, data_2, diff_spec) of every command of the loaded snapshots which can be diffed
+        '''
+        for cmd1, cmd2 in zip(self.first_data, self.second_data):
+            # get the data from two json file
+            cmd_name_1 = cmd1['command']
+            cmd_result_1 = cmd1['result']
+            cmd_name_2 = cmd2['command']
+            cmd_result_2 = cmd2['result']
+
+            if cmd_name_1 != cmd_name_2:
+                self.log("Can't compare %s with %s!!" % (cmd_name_1, cmd_name_2))
+                continue
+
+            if not self.get_diff_handle_config(cmd_name_1):
+                self.log("Can't find diff handle config for %s" % cmd_name_1)
+                continue
+            if cmd1.get('encoding') != 'list' or cmd2.get('encoding') != 'list':
+                self.log("%s is not a parsed table, skip it" % cmd_name_1)
+                continue
+            diff_spec = self.registry.compile(cmd_name_1, cmd_result_1[0])
+            if diff_spec:
+                yield cmd_name_1, cmd_result_1, cmd_result_2, diff_spec
+
+    def iter_changes(self, commands=None):
+        '''
+        yield the change feed records (changefeed.py) of every command, or only of commands
+
+        the merge and hash engines stream the records out of the join, a bucketed or
+        pandas diff is turned into records once the diff of the command is done;
+        nothing is printed or kept in self.diff_result
+        '''
+        import changefeed
+        self.load_data()
+        for command, data_1, data_2, diff_spec in self.iter_commands():
+            if commands and command not in commands:
+                continue
+            self.log("diff command %s" % command)
+            if list(data_1[0]) != list(data_2[0]):
+                self.log('Column Name is not matching for those two data:\n data 1:%s \n data 2: %s' %
+                         (data_1[0], data_2[0]))
+                continue
+            if self.engine in changefeed.STREAM_ENGINE and not self.buckets:
+                for record in changefeed.iter_table_changes(command, data_1, data_2, diff_spec, self.engine):
+                    yield record
+                continue
+            verbose, self.verbose = self.verbose, False
+            diff = self.diff_generic(data_1, data_2, diff_spec)
+            self.verbose = verbose
+            for record in changefeed.diff_changes(command, diff, diff_spec):
+                yield record
+
+    def diff_parallel(self, jobs):
+        '''
+        diff the (command, data_1, data_2, diff_spec) jobs in self.workers processes (partdiff.py)
+        '''
+        import partdiff
+        kwargs = {'partition_rows': self.partition_rows} if self.partition_rows else {}
+        result = partdiff.parallel_diff(jobs, self.engine, self.workers, buckets=self.buckets, **kwargs)
+        for command, _, _, _ in jobs:
+            self.log("diff command %s" % command)
+            if self.verbose:
+                pprint.pprint(result[command], width=2000)
+            self.diff_result[command] = result[command]
+
+    def diff_generic(self, data_1, data_2, diff_conf):
+        '''
+        diff_conf is a diffconfig.DiffSpec compiled for the header of data_1 or a plain config dict
+        '''
+        diff = None
+        if self.buckets:
+            import partdiff
+            if max(len(data_1), len(data_2)) > (self.partition_rows or partdiff.PARTITION_ROWS):
+                diff_spec = self.check_data_format(data_1, data_2, diff_conf)
+                if not diff_spec:
+                    return None
+                diff = partdiff.diff_buckets(data_1, data_2, diff_spec, self.buckets, self.diff_table, self.spill_dir)
+        if diff is None:
+            diff = self.diff_table(data_1, data_2, diff_conf)
+        if self.verbose:
+            pprint.pprint(diff, width=2000)
+        return diff
+
+    def diff_table(self, data_1, data_2, diff_conf):
+        '''
+        the diff of two tables with the engine, without printing it
+        '''
+        if self.engine in fastdiff.ENGINE:
+            return fastdiff.ENGINE[self.engine](data_1, data_2, diff_conf)
+
+        import pandas as pd
+        # check if data_1 and data_2 has same format
+        diff_spec = self.check_data_format(data_1, data_2, diff_conf)
+        if not diff_spec:
+            return None
+        diff_conf = diff_spec.config()
+
+        # make index based on fields based on diff_conf
+        # values split on ',' are folded back so every row has the width of the header
+        t1 = pd.DataFrame(data=list(table_rows(data_1, diff_spec.overflow_pos)), columns=data_1[0])
+        t2 = pd.DataFrame(data=list(table_rows(data_2, diff_spec.overflow_pos)), columns=data_2[0])
+
+        index = diff_conf['index']
+        # grouping the entries to make it all unique to index key
+        grouping = diff_conf['grouping']
+        if grouping:
+            t1_grouped = t1.groupby(grouping)
+            t2_grouped = t2.groupby(grouping)
+        t1 = t1_grouped.agg(lambda x: set(x)).reset_index()
+        t2 = t2_grouped.agg(lambda x: set(x)).reset_index()
+
+        # make a outer join to formulate a table with all entreis
+        result_table = pd.merge(t1, t2, on=index, how='outer', suffixes=['_L','_R'], indicator='DIFF_RESULT')
+
+        # diff table convert to a list
+        # insert a dummy column name at the front to match the merge operation
+        result = [[''] + result_table.columns.tolist()] + result_table.reset_index().values.tolist()
+
+        # find out which entry is new / missing / changed
+        return self.get_diffs(result, diff_conf['check'], diff_spec)
+
+    @staticmethod
+    def get_diffs(result, check, diff_spec=None):
+        '''
+        with a diff_spec the check column positions are taken from it instead of the header row
+        '''
+
+        diff  = {'new': [],
+                'missing': [],
+                'changed': [],
+                }
+        if diff_spec:
+            left_index = diff_spec.left_pos
+            right_index = diff_spec.right_pos
+            indicator_index = diff_spec.indicator_pos
+        else:
+            # the column name is appended with _L or _R for non-index field
+            all_column = result[0]
+            # find all checking pair index according to column name
+            full_index = [(all_column.index(c+'_L'), all_column.index(c+'_R')) for c in check]
+            left_index = [x[0] for x in full_index]
+            right_index = [x[1] for x in full_index]
+            indicator_index = all_column.index('DIFF_RESULT')
+
+        for r in result[1:]:
+            if r[indicator_index] == 'left_only':
+                diff['new'].append(r)
+                continue
+            if r[indicator_index] == 'right_only':
+                diff['missing'].append(r)
+                continue
+            if r[indicator_index] == 'both':
+                left = [r[i] for i in left_index]
+                right = [r[i] for i in right_index]
+                if not left == right:
+                    diff['changed'].append(r)
+        return diff
+
+
+    @staticmethod
+    def check_data_format(data_1, data_2, diff_conf):
+        '''
+        return the DiffSpec of diff_conf for the header of data_1 and data_2, None if they don't match
+        a DiffSpec already compiled for that header is handed back without checking it again
+        '''
+        # check if the column name has the same contains
+        if data_1[0] != data_2[0]:
+            print('Column Name is not matching for those two data:\n data 1:%s \n data 2: %s' %
+                  (data_1[0], data_2[0]))
+            return None
+        if isinstance(diff_conf, diffconfig.DiffSpec):
+            if list(diff_conf.column) == list(data_1[0]):
+                return diff_conf
+            diff_conf = diff_conf.config()
+        # check if the diff_conf using the right column name
+        return diffconfig.compile_spec('', data_1[0], diff_conf)
+
+
+def do_backup(args):
+    if args.credentials:
+        import connpool
+        args.username, args.password = connpool.get_credentials(args.credentials, args.username).get(args.device)
+    store = None
+    if args.delta_store:
+        import deltastore
+        store = deltastore.DeltaStore(args.delta_store, keyframe_every=args.keyframe_every)
+    backup = AristaStateBackup(args.device, username=args.username, password=args.password,
+                               command_list=args.command or COMMAND_LIST,
+                               backup_file_name=args.backup_file_name, encoding=args.encoding,
+                               template_dir=args.template_dir, client=args.client, store=store)
+    backup.get_status()
+
+
+def do_diff(args):
+    cache = None
+    if args.cache or args.cache_dir:
+        import diffcache
+        cache = diffcache.DiffCache(args.cache_dir or diffcache.CACHE_DIR)
+    if args.feed:
+        import changefeed
+        # the notes go to stderr, stdout may be the feed
+        differ = AristaStateDiff(args.first, args.second, engine=args.engine, run=False, verbose=False,
+                                 registry_file=args.registry, buckets=args.buckets, spill_dir=args.spill_dir,
+                                 log=lambda message: print(message, file=sys.stderr))
+        changefeed.write_feed(differ.iter_changes(), args.feed, args.feed_format)
+        return
+    AristaStateDiff(args.first, args.second, engine=args.engine, cache=cache, registry_file=args.registry,
+                    workers=args.workers, buckets=args.buckets, spill_dir=args.spill_dir)
+
+
+def do_parse(args):
+    import cliparser
+    if args.backup or args.file.endswith('.txt'):
+        from templateindex import TemplateIndex
+        template = {'Template Dir': args.template_dir, 'Index File': TEMPLATE_INDEX_FLIE}
+        index = TemplateIndex(TEMPLATE_INDEX_FLIE, args.template_dir)
+        keep = index.has_template
+        if args.command:
+            keep = lambda command: command in args.command and index.has_template(command)
+        result = {}
+        with open(args.file) as f:
+            if args.stream:
+                # the lines of a section go to TextFSM as they are read, never joined
+                cache = TemplateCache(args.template_dir)
+                sections = cliparser.iter_section_lines(f, cliparser.BACKUP_SECTION_DELIMITER,
+                                                        cliparser.BACKUP_SECTION_END, keep=keep)
+            else:
+                sections = cliparser.iter_sections(f, cliparser.BACKUP_SECTION_DELIMITER,
+                                                   cliparser.BACKUP_SECTION_END, keep=keep)
+            for command, section_data in sections:
+                if section_data is None:
+                    continue
+                attributes = {'Command': command, 'Vendor': 'Arista'}
+                if args.stream:
+                    parse_result = cache.parse_lines(attributes, section_data)
+                else:
+                    parse_result = execute_parser(template, attributes, section_data)
+                if parse_result:
+                    result[command] = parse_result
+        json.dump(result, sys.stdout, indent=2)
+    else:
+        cliparser.AristaSTParser(args.file, zipped=args.file.endswith('.gz'), commands=args.command,
+                                 stream=args.stream)
+
+
+def get_arg_parser():
+    arg_parser = argparse.ArgumentParser(description='Arista state backup / diff / parse')
+    sub_parser = arg_parser.add_subparsers(dest='subcommand')
+    sub_parser.required = True
+
+    backup = sub_parser.add_parser('backup', help='save text and parsed state of a device')
+    backup.add_argument('device')
+    backup.add_argument('--username', default=getpass.getuser())
+    backup.add_argument('--password', default='', help='prompted for when not given')
+    backup.add_argument('--command', action='append', help='command to save, repeat for more')
+    backup.add_argument('--backup-file-name', default='')
+    backup.add_argument('--encoding', choices=['text', 'json'], default='text')
+    backup.add_argument('--template-dir', default=TEMPLATE_INDEX_DIR)
+    backup.add_argument('--credentials', action='append', default=None,
+                        help='env, file:PATH, keyring or prompt, repeat to try in order (see connpool.py)')
+    backup.add_argument('--client', choices=['pyeapi', 'async'], default='pyeapi',
+                        help='async: chunked, pipelined eAPI requests retried per command')
+    backup.add_argument('--delta-store', default=None,
+                        help='directory of a delta encoded store to put the snapshot in (see deltastore.py)')
+    backup.add_argument('--keyframe-every', type=int, default=60, help='snapshots per full keyframe in the delta store')
+    backup.set_defaults(func=do_backup)
+
+    diff = sub_parser.add_parser('diff', help='diff two json backups')
+    diff.add_argument('first')
+    diff.add_argument('second')
+    diff.add_argument('--engine', choices=['pandas'] + sorted(fastdiff.ENGINE), default='merge')
+    diff.add_argument('--registry', default=diffconfig.REGISTRY_FILE, help='diff config registry json')
+    diff.add_argument('--cache', action='store_true', help='reuse/store results in the diff cache')
+    diff.add_argument('--cache-dir', default=None, help='diff cache directory, implies --cache')
+    diff.add_argument('--workers', type=int, default=None,
+                      help='diff the commands (and partitions of big tables) in this many processes')
+    diff.add_argument('--buckets', type=int, default=None, help='diff big tables in this many key hash buckets')
+    diff.add_argument('--spill-dir', default=None, help='write the buckets to temporary files in this directory')
+    diff.add_argument('--feed', default=None,
+                      help='write the change feed (changefeed.py) to this file, - for stdout, instead of printing')
+    diff.add_argument('--feed-format', choices=['jsonl', 'arrow'], default='jsonl')
+    diff.set_defaults(func=do_diff)
+
+    parse = sub_parser.add_parser('parse', help='parse a show tech or a .txt backup')
+    parse.add_argument('file')
+    parse.add_argument('--backup', action='store_true', help='file is a .txt backup, not a show tech')
+    parse.add_argument('--template-dir', default=TEMPLATE_INDEX_DIR)
+    parse.add_argument('--command', action='append', help='only parse this section, repeat for more')
+    parse.add_argument('--stream', action='store_true',
+                       help='feed the sections to TextFSM line by line instead of joining them')
+    parse.set_defaults(func=do_parse)
+    return arg_parser
+
+
+def main(argv=None):
+    args = get_arg_parser().parse_args(argv)
+    args.func(args)
@@ -0,0 +1,411 @@
+#!/usr/bin/env python
+'''
+Benchmark harness over the bundled <device>_backup_<timestamp>.txt/.json files
+
+Stages measured for every device that has fixtures in the fixture directory:
+    split       --> cliparser.iter_sections over the .txt backup
+    parse       --> AristaStateBackup.execute_parser for every section
+    json_load   --> json.load of every .json backup
+    json_load_compact --> the same loaded into rowschema compact rows
+    diff        --> AristaStateDiff.diff_generic on 'show ip route' (oldest vs newest)
+    get_diffs   --> AristaStateDiff.get_diffs on the merged table of the diff stage
+    merge_diff  --> fastdiff.sort_merge_diff on the same tables (checked against diff)
+    hash_diff   --> fastdiff.hash_diff on the same tables (checked against diff)
+plus the diff/get_diffs stages again on synthetic 10x/100x/1000x route tables (only
+the fastdiff engines, with no pandas reference, when pandas is not installed), and
+    startup     --> wall time of a fresh interpreter importing aristacli and each heavy
+                    dependency, and of a full 'arista-cli.py diff' run
+
+Every measurement is appended as one JSON line to the history file so throughput
+and peak memory can be compared across revisions:
+    ./benchmark.py                      # run everything and append to history
+    ./benchmark.py --scales 10,100      # skip the slow 1000x variant
+    ./benchmark.py --check              # compare the last run against the previous revision
+'''
+from __future__ import print_function
+
+import os
+import re
+import gc
+import sys
+import glob
+import json
+import time
+import socket
+import argparse
+import platform
+import subprocess
+import tracemalloc
+
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.realpath(__file__))
+HISTORY_FILE = 'benchmark_history.jsonl'
+TEMPLATE_INDEX_DIR = '/scratch/herry/git/code/systems-lib/python/systemslib/net/Arista/template/'
+TEMPLATE_INDEX_FLIE = 'index'
+ROUTE_COMMAND = 'show ip route'
+STARTUP_COMMANDS = [('python', ['-c', 'pass']),
+                    ('import_aristacli', ['-c', 'import aristacli']),
+                    ('import_pandas', ['-c', 'import pandas']),
+                    ('import_numpy', ['-c', 'import numpy']),
+                    ('import_pyeapi', ['-c', 'import pyeapi']),
+                    ('import_clitable', ['-c', 'import clitable']),
+                    ]
+BACKUP_NAME = re.compile(r'(?P<device>.+)_backup_(?P<timestamp>\d{14})\.(?P<ext>txt|json)$')
+
+
+def find_fixtures(fixture_dir):
+    '''
+    return {device: [(timestamp, txt_file, json_file), ...]} sorted by timestamp
+    empty files (interrupted backups) are ignored
+    '''
+    found = {}
+    for name in glob.glob(os.path.join(fixture_dir, '*_backup_*')):
+        m = BACKUP_NAME.match(os.path.basename(name))
+        if not m or not os.path.getsize(name):
+            continue
+        entry = found.setdefault(m.group('device'), {}).setdefault(m.group('timestamp'), {})
+        entry[m.group('ext')] = name
+    fixtures = {}
+    for device, snapshots in found.items():
+        fixtures[device] = [(ts, files.get('txt'), files.get('json'))
+                            for ts, files in sorted(snapshots.items())]
+    return fixtures
+
+
+def get_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR,
+                                       stderr=subprocess.STDOUT).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def has_pandas():
+    try:
+        import pandas  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def get_command_result(data, command):
+    for r in data:
+        if r['command'] == command:
+            return r['result']
+    return None
+
+
+def int2ip(value):
+    return '.'.join(str((value >> shift) & 0xff) for shift in (24, 16, 8, 0))
+
+
+def scale_route_table(tables, factor):
+    '''
+    blow up route tables by factor, keeping rows which share NETWORK/MASK across
+    the given tables mapped to the same synthetic prefix so the diff result scales too
+
+    every copy beyond the first gets its NETWORK renumbered out of 11.0.0.0/8
+    '''
+    header = tables[0][0]
+    network = header.index('NETWORK')
+    mask = header.index('MASK')
+    keys = {}
+    for table in tables:
+        for row in table[1:]:
+            if len(row) == len(header):
+                keys.setdefault((row[network], row[mask]), len(keys))
+    scaled = []
+    for table in tables:
+        rows = [row for row in table[1:] if len(row) == len(header)]
+        result = [header] + rows
+        for copy in range(1, factor):
+            base = (11 << 24) + copy * len(keys)
+            for row in rows:
+                new_row = list(row)
+                new_row[network] = int2ip(base + keys[(row[network], row[mask])])
+                result.append(new_row)
+        scaled.append(result)
+    return scaled
+
+
+class Benchmark(object):
+    def __init__(self, fixture_dir='.', history_file=HISTORY_FILE, repeat=3, memory=True,
+                 template_dir=TEMPLATE_INDEX_DIR, index_file=TEMPLATE_INDEX_FLIE):
+        self.fixture_dir = fixture_dir
+        self.history_file = history_file
+        self.repeat = repeat
+        self.memory = memory
+        self.template = {'Template Dir': template_dir, 'Index File': index_file}
+        self.revision = get_revision()
+        self.run_id = datetime.now().strftime('%Y%m%d%H%M%S')
+        self.records = []
+
+    def measure(self, stage, fixture, func, items, scale=1):
+        '''
+        time func() repeat times (best of) and, in a separate run, trace its peak memory
+        items is the number of rows/lines/bytes func works through, for throughput
+        '''
+        best = None
+        for _ in range(self.repeat):
+            gc.collect()
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        peak = None
+        if self.memory:
+            gc.collect()
+            tracemalloc.start()
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        record = {'run_id': self.run_id,
+                  'revision': self.revision,
+                  'host': socket.gethostname(),
+                  'python': platform.python_version(),
+                  'stage': stage,
+                  'fixture': fixture,
+                  'scale': scale,
+                  'items': items,
+                  'seconds': best,
+                  'items_per_sec': items / best if best else None,
+                  'peak_bytes': peak,
+                  }
+        self.records.append(record)
+        print("%-10s %-40s x%-5d %10d items %10.4fs %12.0f items/s peak %s" %
+              (stage, fixture, scale, items, best, record['items_per_sec'] or 0,
+               '-' if peak is None else '%.1fMB' % (peak / 1048576.0)))
+        return record
+
+    def bench_split(self, device, txt_file):
+        import cliparser
+        with open(txt_file) as f:
+            lines = f.readlines()
+
+        def split():
+            return list(cliparser.iter_sections(lines, cliparser.BACKUP_SECTION_DELIMITER,
+                                                cliparser.BACKUP_SECTION_END))
+        self.measure('split', os.path.basename(txt_file), split, len(lines))
+        return split()
+
+    def bench_parse(self, device, txt_file, sections):
+        if not os.path.isdir(self.template['Template Dir']):
+            print("template dir %s not found, skip parse stage" % self.template['Template Dir'])
+            return
+        import aristacli
+        rows = [0]
+
+        def parse():
+            rows[0] = 0
+            for command, section_data in sections:
+                attributes = {'Command': command, 'Vendor': 'Arista'}
+                result = aristacli.execute_parser(self.template, attributes, section_data)
+                if result:
+                    rows[0] += len(result)
+        parse()
+        self.measure('parse', os.path.basename(txt_file), parse, rows[0])
+
+    def bench_json_load(self, device, json_file):
+        def load():
+            with open(json_file) as f:
+                return json.load(f)
+        self.measure('json_load', os.path.basename(json_file), load, os.path.getsize(json_file))
+        import rowschema
+        self.measure('json_load_compact', os.path.basename(json_file), lambda: rowschema.load_compact(json_file),
+                     os.path.getsize(json_file))
+        return load()
+
+    def bench_diff(self, fixture, table_1, table_2, scale=1):
+        import pandas as pd
+        from aristacli import AristaStateDiff as differ
+        from difftable import table_rows
+        # run=False: no snapshot file is loaded or diffed, the tables are handed to diff_generic
+        state_diff = differ(None, None, engine='pandas', verbose=False, run=False)
+        diff_conf = state_diff.get_diff_handle_config(ROUTE_COMMAND)
+        rows = len(table_1) + len(table_2) - 2
+
+        diff = lambda: state_diff.diff_generic(table_1, table_2, diff_conf)
+        self.measure('diff', fixture, diff, rows, scale)
+        expected = diff()
+
+        # rebuild the merged table diff_generic hands to get_diffs, from the same folded rows
+        diff_spec = state_diff.registry.compile(ROUTE_COMMAND, table_1[0])
+        t1 = pd.DataFrame(data=list(table_rows(table_1, diff_spec.overflow_pos)), columns=table_1[0])
+        t2 = pd.DataFrame(data=list(table_rows(table_2, diff_spec.overflow_pos)), columns=table_2[0])
+        t1 = t1.groupby(diff_conf['grouping']).agg(lambda x: set(x)).reset_index()
+        t2 = t2.groupby(diff_conf['grouping']).agg(lambda x: set(x)).reset_index()
+        result_table = pd.merge(t1, t2, on=diff_conf['index'], how='outer', suffixes=['_L', '_R'],
+                                indicator='DIFF_RESULT')
+        result = [[''] + result_table.columns.tolist()] + result_table.reset_index().values.tolist()
+        self.measure('get_diffs', fixture, lambda: differ.get_diffs(result, diff_conf['check'], diff_spec),
+                     len(result) - 1, scale)
+        self.bench_fastdiff(fixture, table_1, table_2, diff_conf, scale, expected)
+
+    def bench_fastdiff(self, fixture, table_1, table_2, diff_conf, scale=1, expected=None):
+        import fastdiff
+        rows = len(table_1) + len(table_2) - 2
+        for engine, func in sorted(fastdiff.ENGINE.items()):
+            record = self.measure(engine + '_diff', fixture, lambda: func(table_1, table_2, diff_conf),
+                                  rows, scale)
+            if expected is not None:
+                record['same_as_pandas'] = fastdiff.same_diff(expected, func(table_1, table_2, diff_conf))
+                if not record['same_as_pandas']:
+                    print("WARNING: %s engine result differs from pandas diff_generic" % engine)
+
+    def bench_fastdiff_only(self, fixture, table_1, table_2, scale=1):
+        # no pandas reference, e.g. when pandas is not installed
+        diff_conf = {'grouping': ['NETWORK', 'MASK'], 'index': ['NETWORK', 'MASK'],
+                     'check': ['NEXT_HOP', 'INTERFACE']}
+        self.bench_fastdiff(fixture, table_1, table_2, diff_conf, scale)
+
+    def bench_startup(self, fixtures):
+        '''
+        time fresh interpreters, the number that matters for cron driven per device runs
+        '''
+        with open(os.devnull, 'w') as devnull:
+            def run(argv):
+                return subprocess.call([sys.executable] + argv, cwd=BENCH_DIR, stdout=devnull, stderr=devnull)
+            for name, argv in STARTUP_COMMANDS:
+                if run(argv):
+                    print("%s fails, skip it (module not installed?)" % name)
+                    continue
+                self.measure('startup', name, lambda: run(argv), 1)
+            for device, snapshots in sorted(fixtures.items()):
+                json_files = [j for _, _, j in snapshots if j][-2:]
+                if len(json_files) == 2:
+                    argv = ['arista-cli.py', 'diff'] + json_files
+                    self.measure('startup', 'cli_diff:%s' % device, lambda: run(argv), 1)
+
+    def run(self, scales=(10, 100, 1000), stages=None):
+        fixtures = find_fixtures(self.fixture_dir)
+        if not fixtures:
+            print("no backup fixtures found in %s" % self.fixture_dir)
+            return self.records
+        wanted = lambda s: stages is None or s in stages
+        if wanted('startup'):
+            self.bench_startup(fixtures)
+        for device, snapshots in sorted(fixtures.items()):
+            for _, txt_file, json_file in snapshots:
+                if txt_file and (wanted('split') or wanted('parse')):
+                    sections = self.bench_split(device, txt_file)
+                    if wanted('parse'):
+                        self.bench_parse(device, txt_file, sections)
+                if json_file and wanted('json_load'):
+                    self.bench_json_load(device, json_file)
+
+            if not (wanted('diff') or wanted('get_diffs') or wanted('merge_diff') or wanted('hash_diff')):
+                continue
+            json_files = [j for _, _, j in snapshots if j]
+            if len(json_files) < 2:
+                continue
+            with open(json_files[-1]) as f:
+                table_2 = get_command_result(json.load(f), ROUTE_COMMAND)
+            # oldest snapshot with the same columns, older backups split fields on ', '
+            table_1 = None
+            for json_file in json_files[:-1]:
+                with open(json_file) as f:
+                    table_1 = get_command_result(json.load(f), ROUTE_COMMAND)
+                if table_1 and table_2 and table_1[0] == table_2[0]:
+                    break
+                table_1 = None
+            if not table_1:
+                print("%s: no comparable '%s' tables, skip diff stages" % (device, ROUTE_COMMAND))
+                continue
+            fixture = '%s:%s' % (os.path.basename(json_file), os.path.basename(json_files[-1]))
+            bench_diff = self.bench_fastdiff_only
+            if wanted('diff') or wanted('get_diffs'):
+                if has_pandas():
+                    bench_diff = self.bench_diff
+                else:
+                    print("pandas not installed, skip the diff and get_diffs stages")
+            bench_diff(fixture, table_1, table_2)
+            for factor in scales:
+                scaled_1, scaled_2 = scale_route_table([table_1, table_2], factor)
+                bench_diff(fixture, scaled_1, scaled_2, factor)
+        return self.records
+
+    def save(self):
+        with open(self.history_file, 'a') as f:
+            for record in self.records:
+                f.write(json.dumps(record, sort_keys=True) + '\n')
+        print("%d results appended to %s" % (len(self.records), self.history_file))
+
+
+def load_history(history_file):
+    records = []
+    if os.path.exists(history_file):
+        with open(history_file) as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    return records
+
+
+def check_regression(history_file, threshold=0.2):
+    '''
+    compare the latest run with the latest earlier run from another revision
+    return the list of (key, metric, old, new) that got worse by more than threshold
+    '''
+    records = load_history(history_file)
+    if not records:
+        print("no history in %s" % history_file)
+        return []
+    latest = records[-1]['run_id']
+    current = [r for r in records if r['run_id'] == latest]
+    revision = current[0]['revision']
+    previous_runs = [r for r in records if r['revision'] != revision]
+    if not previous_runs:
+        print("no earlier revision to compare %s against" % revision)
+        return []
+    previous_id = previous_runs[-1]['run_id']
+    previous = dict(((r['stage'], r['fixture'], r['scale']), r)
+                    for r in records if r['run_id'] == previous_id)
+    print("comparing %s (run %s) against %s (run %s)" %
+          (revision, latest, previous_runs[-1]['revision'], previous_id))
+    regressions = []
+    for r in current:
+        key = (r['stage'], r['fixture'], r['scale'])
+        old = previous.get(key)
+        if not old:
+            continue
+        if old['items_per_sec'] and r['items_per_sec'] and \
+           r['items_per_sec'] < old['items_per_sec'] * (1 - threshold):
+            regressions.append((key, 'items_per_sec', old['items_per_sec'], r['items_per_sec']))
+        if old['peak_bytes'] and r['peak_bytes'] and \
+           r['peak_bytes'] > old['peak_bytes'] * (1 + threshold):
+            regressions.append((key, 'peak_bytes', old['peak_bytes'], r['peak_bytes']))
+    for key, metric, old, new in regressions:
+        print("REGRESSION %s %s: %.1f -> %.1f" % (key, metric, old, new))
+    if not regressions:
+        print("no regression above %d%%" % (threshold * 100))
+    return regressions
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='benchmark the show parser / diff tools')
+    arg_parser.add_argument('--fixture-dir', default=BENCH_DIR)
+    arg_parser.add_argument('--history', default=HISTORY_FILE)
+    arg_parser.add_argument('--template-dir', default=TEMPLATE_INDEX_DIR)
+    arg_parser.add_argument('--scales', default='10,100,1000',
+                            help='comma separated route table scale factors')
+    arg_parser.add_argument('--stages', default='',
+                            help='comma separated subset of startup,split,parse,json_load,diff,get_diffs,merge_diff,hash_diff')
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    arg_parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc run')
+    arg_parser.add_argument('--check', action='store_true',
+                            help='only compare the last run in history with the previous revision')
+    arg_parser.add_argument('--threshold', type=float, default=0.2)
+    args = arg_parser.parse_args()
+
+    if args.check:
+        sys.exit(1 if check_regression(args.history, args.threshold) else 0)
+
+    sys.path.insert(0, BENCH_DIR)
+    bench = Benchmark(args.fixture_dir, args.history, args.repeat, not args.no_memory,
+                      template_dir=args.template_dir)
+    scales = [int(s) for s in args.scales.split(',') if s]
+    stages = [s for s in args.stages.split(',') if s] or None
+    try:
+        bench.run(scales, stages)
+    finally:
+        # what was measured before a failure is kept
+        bench.save()
@@ -0,0 +1,328 @@
+#!/usr/bin/env python
+'''
+Typed change feed of a diff, written as JSON Lines or Arrow IPC, rendered apart
+
+A diff as AristaStateDiff returns it is a dict of lists of full merged rows
+    [row index, key..., every value column _L..., every value column _R..., DIFF_RESULT]
+printed row by row (or pprinted whole) before anything else can use it; for a big
+diff the terminal output takes longer than the diff. Here every difference is one
+record, handed out as soon as the engine finds it:
+    {'command': 'show ip route', 'kind': 'changed',
+     'key': {'NETWORK': '10.1.0.0', 'MASK': '16'},
+     'changed': {'NEXT_HOP': [['10.0.0.1'], ['10.0.0.2']]}}
+    - kind is 'new' / 'missing' / 'changed' as in the diff ('new' being the keys only
+      in the first snapshot)
+    - key holds the grouping columns, a value column is the sorted list of the
+      values of the group (the set of the merged row)
+    - a 'changed' record only has the check columns which differ, as [first, second]
+    - a 'new' / 'missing' record has the value columns of the side holding the key
+      in 'values'
+The records of a command come in key order. With the merge and hash engines they
+are streamed straight out of the join (fastdiff.iter_classify), the whole diff dict
+is never built; other engines and bucketed diffs give a diff dict which is turned
+into records afterwards (diff_changes).
+
+write_jsonl writes one json record per line; write_arrow writes an Arrow IPC
+stream (pyarrow, only imported there) in record batches of batch_rows, with the
+typed schema of arrow_schema(). read_feed reads both back, show renders a feed for
+people one page at a time and is the only part printing anything.
+
+Usage:
+    differ = AristaStateDiff(first, second, engine='merge', run=False, verbose=False)
+    with open('diff.jsonl', 'w') as f:
+        write_jsonl(differ.iter_changes(), f)
+    show(read_feed('diff.jsonl'), page_rows=40)
+
+    ./changefeed.py diff carcore3_backup_20170928005037.json carcore3_backup_20170928110800.json > diff.jsonl
+    ./changefeed.py diff <first.json> <second.json> --format arrow --output diff.arrow
+    ./changefeed.py diff <first.json> <second.json> --external      # extdiff sorted files
+    ./changefeed.py show diff.arrow --page-rows 40 --command 'show ip route'
+'''
+from __future__ import print_function
+
+import sys
+import json
+import heapq
+import argparse
+
+from difftable import table_rows, group_rows
+from fastdiff import group_sorted, merge_join, iter_classify, sort_rows
+
+STREAM_ENGINE = ('merge', 'hash')
+ARROW_BATCH_ROWS = 10000
+KINDS = ('new', 'missing', 'changed')
+
+
+def sorted_values(value):
+    '''
+    the values of one merged row column as a sorted list, None for the side without the key
+    '''
+    if isinstance(value, (set, frozenset, list, tuple)):
+        return sorted(value)
+    return None
+
+
+def change_record(command, kind, row, spec):
+    '''
+    the feed record of one merged row of a diff of command with spec
+    '''
+    offset = 1 + len(spec.grouping)
+    width = len(spec.value_column)
+    record = {'command': command, 'kind': kind, 'key': dict(zip(spec.grouping, row[1:offset]))}
+    if kind == 'changed':
+        left = row[offset:offset + width]
+        right = row[offset + width:offset + 2 * width]
+        record['changed'] = dict((spec.value_column[p], [sorted_values(left[p]), sorted_values(right[p])])
+                                 for p in spec.check_pos if left[p] != right[p])
+    else:
+        side = row[offset:offset + width] if kind == 'new' else row[offset + width:offset + 2 * width]
+        record['values'] = dict(zip(spec.value_column, [sorted_values(v) for v in side]))
+    return record
+
+
+def iter_table_changes(command, data_1, data_2, spec, engine='merge'):
+    '''
+    yield the records of the diff of two tables, streamed out of a merge or hash join
+
+    spec is the DiffSpec of both headers (AristaStateDiff.check_data_format)
+    '''
+    rows_1 = table_rows(data_1, spec.overflow_pos)
+    rows_2 = table_rows(data_2, spec.overflow_pos)
+    if engine == 'hash':
+        grouped_1 = group_rows(rows_1, spec.key_pos, spec.value_pos)
+        grouped_2 = group_rows(rows_2, spec.key_pos, spec.value_pos)
+        joined = ((k, grouped_1.get(k), grouped_2.get(k)) for k in sorted(set(grouped_1).union(grouped_2)))
+    else:
+        left = group_sorted(sort_rows(list(rows_1), spec), spec.key_pos, spec.value_pos)
+        right = group_sorted(sort_rows(list(rows_2), spec), spec.key_pos, spec.value_pos)
+        joined = merge_join(left, right)
+    for kind, row in iter_classify(joined, spec.check_pos, len(spec.value_pos)):
+        yield change_record(command, kind, row, spec)
+
+
+def diff_changes(command, diff, spec):
+    '''
+    yield the records of a diff dict of command, in key order (the row index of the merged rows)
+    '''
+    if not diff:
+        return
+    kinds = [[(row[0], n, row) for row in diff.get(kind, [])] for n, kind in enumerate(KINDS)]
+    for _, n, row in heapq.merge(*kinds, key=lambda item: item[0]):
+        yield change_record(command, KINDS[n], row, spec)
+
+
+def external_changes(first, second, registry, commands=None):
+    '''
+    yield the records of two backups diffed through their extdiff sorted files
+    '''
+    import extdiff
+    index = extdiff.load_index(first, registry)
+    if commands:
+        stream = ((command, kind, row) for command in commands
+                  for kind, row in extdiff.stream_diff(first, second, command, registry))
+    else:
+        stream = extdiff.stream_diff_all(first, second, registry)
+    specs = {}
+    for command, kind, row in stream:
+        if command not in specs:
+            specs[command] = registry.compile(command, index[command]['column'])
+        yield change_record(command, kind, row, specs[command])
+
+
+def write_jsonl(records, out):
+    '''
+    write every record as one json line to the open file out, return the number written
+    '''
+    count = 0
+    for record in records:
+        out.write(json.dumps(record))
+        out.write('\n')
+        count += 1
+    return count
+
+
+def arrow_schema():
+    import pyarrow as pa
+    values = pa.list_(pa.string())
+    return pa.schema([('command', pa.string()),
+                      ('kind', pa.string()),
+                      ('key', pa.map_(pa.string(), pa.string())),
+                      ('values', pa.map_(pa.string(), values)),
+                      ('changed', pa.map_(pa.string(), pa.struct([('first', values), ('second', values)]))),
+                      ])
+
+
+def arrow_batch(schema, records):
+    import pyarrow as pa
+    columns = {'command': [r['command'] for r in records],
+               'kind': [r['kind'] for r in records],
+               'key': [list(r['key'].items()) for r in records],
+               'values': [list(r['values'].items()) if 'values' in r else None for r in records],
+               'changed': [[(c, {'first': v[0], 'second': v[1]}) for c, v in r['changed'].items()]
+                           if 'changed' in r else None for r in records],
+               }
+    return pa.RecordBatch.from_arrays([pa.array(columns[f.name], type=f.type) for f in schema], schema=schema)
+
+
+def write_arrow(records, out, batch_rows=ARROW_BATCH_ROWS):
+    '''
+    write the records as an Arrow IPC stream to the open binary file out, return the number written
+    '''
+    import pyarrow as pa
+    schema = arrow_schema()
+    count = 0
+    writer = pa.ipc.new_stream(out, schema)
+    try:
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_rows:
+                writer.write_batch(arrow_batch(schema, batch))
+                count += len(batch)
+                batch = []
+        if batch:
+            writer.write_batch(arrow_batch(schema, batch))
+            count += len(batch)
+    finally:
+        writer.close()
+    return count
+
+
+FORMAT = {'jsonl': write_jsonl,
+          'arrow': write_arrow,
+          }
+
+
+def write_feed(records, file_name, feed_format='jsonl'):
+    '''
+    write the records to file_name ('-' for stdout) in feed_format, return the number written
+    '''
+    binary = feed_format == 'arrow'
+    if file_name == '-':
+        out = sys.stdout.buffer if binary and hasattr(sys.stdout, 'buffer') else sys.stdout
+        return FORMAT[feed_format](records, out)
+    with open(file_name, 'wb' if binary else 'w') as out:
+        return FORMAT[feed_format](records, out)
+
+
+def read_arrow(f):
+    import pyarrow as pa
+    for batch in pa.ipc.open_stream(f):
+        for row in batch.to_pylist():
+            record = {'command': row['command'], 'kind': row['kind'], 'key': dict(row['key'])}
+            if row['values'] is not None:
+                record['values'] = dict(row['values'])
+            if row['changed'] is not None:
+                record['changed'] = dict((c, [v['first'], v['second']]) for c, v in row['changed'])
+            yield record
+
+
+def read_feed(file_name):
+    '''
+    yield the records of a feed file, JSON Lines or Arrow IPC stream, '-' for stdin
+    '''
+    binary = sys.stdin.buffer if hasattr(sys.stdin, 'buffer') else sys.stdin
+    f = binary if file_name == '-' else open(file_name, 'rb')
+    try:
+        # a json line starts with '{', an Arrow stream with its 0xFFFFFFFF continuation marker
+        if hasattr(f, 'peek'):
+            jsonl = f.peek(1)[:1] == b'{'
+        else:
+            jsonl = not file_name.endswith('.arrow')
+        if jsonl:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line.decode('utf-8'))
+        else:
+            for record in read_arrow(f):
+                yield record
+    finally:
+        if f is not binary:
+            f.close()
+
+
+def format_values(values):
+    return '-' if values is None else ','.join(values)
+
+
+def render(record):
+    '''
+    the text lines of one record
+    '''
+    key = ' '.join(format_values([v]) for v in record['key'].values())
+    if record['kind'] == 'changed':
+        return ['  changed  %s' % key] + ['      %s: %s --> %s' % (c, format_values(v[0]), format_values(v[1]))
+                                         for c, v in record['changed'].items()]
+    return ['  %-8s %s  %s' % (record['kind'], key,
+                               ' '.join('%s=%s' % (c, format_values(v)) for c, v in record['values'].items()))]
+
+
+def iter_lines(records, commands=None):
+    '''
+    yield the text lines of the records, a header line before the records of each command
+    '''
+    command = None
+    for record in records:
+        if commands and record['command'] not in commands:
+            continue
+        if record['command'] != command:
+            command = record['command']
+            yield "diff command %s" % command
+        for line in render(record):
+            yield line
+
+
+def show(records, page_rows=None, out=None, commands=None):
+    '''
+    print the records page_rows lines at a time, waiting for Enter between pages ('q' stops)
+    when out and stdin are terminals; no page_rows prints them in one go
+    '''
+    out = out or sys.stdout
+    interactive = page_rows and out.isatty() and sys.stdin.isatty()
+    shown = 0
+    for line in iter_lines(records, commands):
+        out.write(line + '\n')
+        shown += 1
+        if interactive and shown % page_rows == 0:
+            out.write('-- more (Enter, q to quit) --')
+            out.flush()
+            if sys.stdin.readline().strip().lower().startswith('q'):
+                break
+    return shown
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='write the change feed of a diff / show a change feed')
+    sub_parser = arg_parser.add_subparsers(dest='action')
+    sub_parser.required = True
+    diff_parser = sub_parser.add_parser('diff', help='diff two json backups into a change feed')
+    diff_parser.add_argument('first')
+    diff_parser.add_argument('second')
+    diff_parser.add_argument('--engine', default='merge', help='merge, hash or pandas')
+    diff_parser.add_argument('--format', choices=sorted(FORMAT), default='jsonl')
+    diff_parser.add_argument('--output', default='-', help='feed file, - for stdout')
+    diff_parser.add_argument('--command', action='append', default=None, help='only these commands')
+    diff_parser.add_argument('--buckets', type=int, default=None, help='diff big tables in key hash buckets')
+    diff_parser.add_argument('--external', action='store_true',
+                             help='diff the extdiff sorted files of the backups instead of loading them')
+    show_parser = sub_parser.add_parser('show', help='render a change feed one page at a time')
+    show_parser.add_argument('feed', help='JSON Lines or Arrow IPC feed file, - for stdin')
+    show_parser.add_argument('--page-rows', type=int, default=40, help='lines per page, 0 for no paging')
+    show_parser.add_argument('--command', action='append', default=None, help='only these commands')
+    args = arg_parser.parse_args()
+
+    if args.action == 'show':
+        show(read_feed(args.feed), args.page_rows, commands=args.command)
+        sys.exit(0)
+
+    from diffconfig import DiffRegistry
+    from aristacli import AristaStateDiff
+
+    if args.external:
+        changes = external_changes(args.first, args.second, DiffRegistry(), args.command)
+    else:
+        # notes go to stderr, stdout may be the feed
+        differ = AristaStateDiff(args.first, args.second, engine=args.engine, run=False, verbose=False,
+                                 buckets=args.buckets, log=lambda message: print(message, file=sys.stderr))
+        changes = differ.iter_changes(args.command)
+    print("%d changes" % write_feed(changes, args.output, args.format), file=sys.stderr)
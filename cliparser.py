@@ -8,12 +8,17 @@ import gzip
 import logging
 import pprint
 
-import textfsm
-import clitable
+import rowschema
+from templateindex import TemplateIndex
 
 logging.basicConfig()
 log = logging.getLogger(__name__) # pylint: disable=C0103
 TEMPLATE_INDEX_DIR = '/systems/lib/systemslib/net/Arista/template'
+# section delimiter in a show tech file
+SECTION_DELIMITER = re.compile(r'------------- (show .*) -------------')
+# section delimiters in the text file written by AristaStateBackup
+BACKUP_SECTION_DELIMITER = re.compile(r'--------------- (show .*) -------------$')
+BACKUP_SECTION_END = re.compile(r'--------------------------------$')
 
 class LogDataException(Exception):
     '''
@@ -22,6 +27,66 @@ class LogDataException(Exception):
     def __init__(self, *args, **kwargs):
         Exception.__init__(self, *args, **kwargs)
 
+def iter_sections(lines, delimiter=SECTION_DELIMITER, end=None, keep=None):
+    '''
+    split show output into (command, section_data) pairs
+
+    a section starts after a line matching delimiter and runs up to the next
+    delimiter, a line matching the optional end pattern or the end of input
+    with keep, a function of the command, the lines of the sections it turns down
+    are only looked at for the next delimiter and section_data is None
+    '''
+    command = None
+    wanted = False
+    section_data = []
+    for line in lines:
+        m = delimiter.match(line)
+        if m or (end is not None and end.match(line)):
+            if command is not None:
+                yield command, ''.join(section_data) if wanted else None
+            command = m.group(1) if m else None
+            wanted = command is not None and (keep is None or keep(command))
+            section_data = []
+        elif wanted:
+            section_data.append(line)
+    if command is not None:
+        yield command, ''.join(section_data) if wanted else None
+
+def iter_section_lines(lines, delimiter=SECTION_DELIMITER, end=None, keep=None):
+    '''
+    iter_sections without joining a section: yield (command, iterator over its lines)
+
+    the lines are read from lines as the iterator is consumed, whatever is left of it
+    is skipped when the next section is asked for; sections keep turns down come as
+    (command, None) and are only looked at for the next delimiter
+    '''
+    lines = iter(lines)
+    current = [next(lines, None)]
+
+    def boundary(line):
+        return delimiter.match(line) or (end is not None and end.match(line))
+
+    def section():
+        while current[0] is not None and not boundary(current[0]):
+            yield current[0]
+            current[0] = next(lines, None)
+
+    while current[0] is not None:
+        m = boundary(current[0])
+        current[0] = next(lines, None)
+        if not m or m.re is not delimiter:
+            continue
+        command = m.group(1)
+        if keep is None or keep(command):
+            body = section()
+            yield command, body
+        else:
+            yield command, None
+            body = section()
+        for _ in body:
+            pass
+
+
 class AristaSTParser(object):
     '''
     Class to parse a Cisco 'show tech' output
@@ -46,11 +111,16 @@ class AristaSTParser(object):
     self.section_parser --> the list of all show commands and associated parser
     self.section_parser_ordered --> same as above but will the order appears in log file
     self.all_command --> all command in the show tech file up to last registered handler
+
+    commands limits the parse to those sections (by default all with a template), the
+    text of the others is never kept; stream=True feeds the lines of a section to its
+    TextFSM template as they are read instead of joining the section first
     '''
-    def __init__(self, filename, zipped=True, parse=True, index_file='index'):
+    def __init__(self, filename, zipped=True, parse=True, index_file='index', compact=False,
+                 commands=None, stream=False):
         # check if the log file is a Cisco one
         if AristaSTParser.is_arista_log(filename, zipped):
-            self.log_file = gzip.open(filename) if zipped else open(filename)
+            self.log_file = gzip.open(filename, 'rt') if zipped else open(filename)
         # initalize a few internal data structure
         self.index_file = index_file
         if os.path.exists('./template'):
@@ -66,6 +136,10 @@ class AristaSTParser(object):
         self.section_parser_ordered = []
         self.parsed = False
         # raw outoput from different show commands
+        # with compact=True the rows are rowschema namedtuples of interned strings
+        self.compact = compact
+        self.commands = set(commands) if commands else None
+        self.stream = stream
         self.st_result = {}
         # consolidated info
         self.result = {}
@@ -79,35 +153,32 @@ class AristaSTParser(object):
         '''
         # read in logfile and try to find out each show tech section
         # and pass the section to defined template for parsing
-        section = re.compile(r'------------- (show .*) -------------')
-        section_found = False
-        section_data = ''
-        command = ''
-
-        for line in self.log_file:
-            m = section.match(line)
-            if m and not section_found:
-                command = m.group(1)
-                print("command is %s" % command)
-                # append the command into all command list
-                self.all_command.append(command)
-                # continue to find the end session
-                section_found = True
-                section_data = ''
-            elif m and section_found:
-                # end of session and excute the parser
-                attributes = {'Command': command, 'Vendor': 'Arista'}
-                template = {'Template Dir': self.template_dir, 'Index File': self.index_file}
-                result =  AristaSTParser.execute_parser(template, attributes, section_data)
-                # get the parser result and save into st_result
-                if result:
-                    self.st_result[command] = result
-                # reset the file pointer to rewind one lien
-                self.log_file.seek(-len(line), 1)
-                section_found = False
-
-            if section_found:
-                section_data = section_data + line
+        template = {'Template Dir': self.template_dir, 'Index File': self.index_file}
+        # sections without a template (or not asked for) are skipped before their text is kept
+        index = TemplateIndex(self.index_file, self.template_dir)
+        keep = index.has_template
+        if self.commands is not None:
+            keep = lambda command: command in self.commands and index.has_template(command)
+        if self.stream:
+            from aristacli import TemplateCache
+            templates = TemplateCache(self.template_dir, self.index_file)
+            sections = iter_section_lines(self.log_file, keep=keep)
+        else:
+            sections = iter_sections(self.log_file, keep=keep)
+        for command, section_data in sections:
+            print("command is %s" % command)
+            # append the command into all command list
+            self.all_command.append(command)
+            if section_data is None:
+                continue
+            attributes = {'Command': command, 'Vendor': 'Arista'}
+            if self.stream:
+                result = templates.parse_lines(attributes, section_data, separator=',')
+            else:
+                result = AristaSTParser.execute_parser(template, attributes, section_data)
+            # get the parser result and save into st_result
+            if result:
+                self.st_result[command] = rowschema.compact_table(result, command) if self.compact else result
 
         pprint.pprint(self.st_result)
         self.parsed = True
@@ -118,6 +189,7 @@ class AristaSTParser(object):
     def execute_parser(template, attributes, section_data):
         #print("executing command %s" % attributes['Command'])
         #print("template directory %s" % template['Template Dir'])
+        import clitable
         cli_table = clitable.CliTable(template['Index File'], template['Template Dir'])
         try:
             cli_table.ParseCmd(section_data, attributes)
@@ -229,7 +301,7 @@ class AristaSTParser(object):
         '''
         check if it is cisco show tech file
         '''
-        file_handle = gzip.open(filename) if zipped else open(filename)
+        file_handle = gzip.open(filename, 'rt') if zipped else open(filename)
         try:
             head = [next(file_handle) for _ in range(50)]
         except IOError as exception:
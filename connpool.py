@@ -0,0 +1,313 @@
+#!/usr/bin/env python
+'''
+Pool of warm eAPI sessions per device, with pluggable credential sources
+
+Every AristaCli connects from scratch and prompts for the password when none is
+given, so a loop of backups or a long-running service reconnects each time and
+can't run unattended. ConnectionPool keeps one AristaCli per device and lends it
+out under a per-device lock; with the async client its keep-alive HTTPS
+connections (and the output sizes it chunks on) live on between cycles. Connections
+unused for idle_timeout seconds are closed by evict_idle(), which every session
+end runs; the least recently used device is dropped beyond max_size devices.
+
+Credentials come from the first source of a CredentialChain that knows the device:
+    env         ARISTA_USERNAME / ARISTA_PASSWORD, or the _<DEVICE> suffixed ones
+    file:PATH   json {"default": {"username": .., "password": ..}, "<device>": {..}}
+    keyring     the keyring module, service 'arista-eapi' (skipped when not installed)
+    prompt      getpass, once per device, only on a terminal
+
+Usage:
+    pool = ConnectionPool(get_credentials(['env', 'file:~/.arista.json']))
+    for cycle in range(10):
+        with pool.session('carcore3') as cli:
+            cli.set_command_list(COMMAND_LIST)
+            result = cli.get_result('text')
+'''
+from __future__ import print_function
+
+import os
+import re
+import sys
+import json
+import time
+import stat
+import getpass
+import argparse
+import threading
+
+from collections import OrderedDict
+from contextlib import contextmanager
+
+IDLE_TIMEOUT = 60
+KEYRING_SERVICE = 'arista-eapi'
+
+
+class CredentialError(Exception):
+    '''
+    Raised when no credential source knows the device
+    '''
+    def __init__(self, *args, **kwargs):
+        Exception.__init__(self, *args, **kwargs)
+
+
+class EnvCredentials(object):
+    def __init__(self, prefix='ARISTA', environ=None):
+        self.prefix = prefix
+        self.environ = os.environ if environ is None else environ
+
+    def get(self, device):
+        suffix = '_' + re.sub(r'\W', '_', device).upper()
+        password = (self.environ.get(self.prefix + '_PASSWORD' + suffix) or
+                    self.environ.get(self.prefix + '_PASSWORD'))
+        if not password:
+            return None
+        username = (self.environ.get(self.prefix + '_USERNAME' + suffix) or
+                    self.environ.get(self.prefix + '_USERNAME') or getpass.getuser())
+        return username, password
+
+
+class FileCredentials(object):
+    '''
+    json file of {device or "default": {"username": .., "password": ..}}, re-read when it changes
+    '''
+    def __init__(self, path):
+        self.path = os.path.expanduser(path)
+        self.mtime = None
+        self.credentials = {}
+
+    def load(self):
+        st = os.stat(self.path)
+        if st.st_mtime == self.mtime:
+            return
+        if st.st_mode & (stat.S_IRWXG | stat.S_IRWXO):
+            print("WARNING: %s can be read by others, chmod 600 it" % self.path)
+        with open(self.path) as f:
+            self.credentials = json.load(f)
+        self.mtime = st.st_mtime
+
+    def get(self, device):
+        try:
+            self.load()
+        except (IOError, OSError, ValueError) as e:
+            print("can't read credentials from %s: %s" % (self.path, e))
+            return None
+        entry = self.credentials.get(device) or self.credentials.get('default')
+        if not entry or not entry.get('password'):
+            return None
+        return entry.get('username') or getpass.getuser(), entry['password']
+
+
+class KeyringCredentials(object):
+    '''
+    password of username@device (or username) in the system keyring, when the keyring module is there
+    '''
+    def __init__(self, username=None, service=KEYRING_SERVICE):
+        self.username = username or getpass.getuser()
+        self.service = service
+        self.keyring = None
+
+    def get(self, device):
+        if self.keyring is None:
+            try:
+                import keyring
+            except ImportError:
+                self.keyring = False
+                print("keyring module not installed, skip the keyring credential source")
+            else:
+                self.keyring = keyring
+        if not self.keyring:
+            return None
+        password = (self.keyring.get_password(self.service, '%s@%s' % (self.username, device)) or
+                    self.keyring.get_password(self.service, self.username))
+        return (self.username, password) if password else None
+
+
+class PromptCredentials(object):
+    def __init__(self, username=None):
+        self.username = username or getpass.getuser()
+        self.passwords = {}
+
+    def get(self, device):
+        if device not in self.passwords:
+            if not sys.stdin.isatty():
+                return None
+            self.passwords[device] = getpass.getpass('Please input your password for %s: ' % device)
+        return self.username, self.passwords[device]
+
+
+class CredentialChain(object):
+    def __init__(self, sources):
+        self.sources = sources
+
+    def get(self, device):
+        '''
+        return (username, password) from the first source which has them
+        '''
+        for source in self.sources:
+            credentials = source.get(device)
+            if credentials:
+                return credentials
+        raise CredentialError('no credentials for %s in %s' %
+                              (device, [type(s).__name__ for s in self.sources]))
+
+
+def get_credentials(spec, username=None):
+    '''
+    CredentialChain of a list like ['env', 'file:~/.arista.json', 'keyring', 'prompt']
+    '''
+    sources = []
+    for name in spec:
+        if name == 'env':
+            sources.append(EnvCredentials())
+        elif name.startswith('file:'):
+            sources.append(FileCredentials(name[len('file:'):]))
+        elif name == 'keyring':
+            sources.append(KeyringCredentials(username))
+        elif name == 'prompt':
+            sources.append(PromptCredentials(username))
+        else:
+            raise ValueError('unknown credential source %s' % name)
+    return CredentialChain(sources)
+
+
+class Session(object):
+    def __init__(self, cli):
+        self.cli = cli
+        self.lock = threading.Lock()
+        self.last_used = time.time()
+        self.uses = 0
+
+
+class ConnectionPool(object):
+    '''
+    self.sessions --> OrderedDict {device: Session}, least recently used first
+    '''
+    def __init__(self, credentials, client='async', transport='https', port=None, idle_timeout=IDLE_TIMEOUT,
+                 max_size=None):
+        self.credentials = credentials
+        self.client = client
+        self.transport = transport
+        self.port = port
+        self.idle_timeout = idle_timeout
+        self.max_size = max_size
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+        self.created = 0
+
+    def connect(self, device):
+        from aristacli import AristaCli
+        username, password = self.credentials.get(device)
+        cli = AristaCli(device, username=username, password=password, transport=self.transport,
+                        client=self.client, port=self.port)
+        if self.client == 'async':
+            cli.node.idle_timeout = self.idle_timeout
+        self.created += 1
+        return cli
+
+    def get_session(self, device):
+        with self.lock:
+            session = self.sessions.pop(device, None)
+            if session is None:
+                session = Session(self.connect(device))
+            self.sessions[device] = session
+        return session
+
+    @contextmanager
+    def session(self, device):
+        '''
+        lend the AristaCli of device to one user at a time
+        '''
+        session = self.get_session(device)
+        with session.lock:
+            try:
+                yield session.cli
+            finally:
+                session.last_used = time.time()
+                session.uses += 1
+        self.evict_idle()
+
+    def evict_idle(self):
+        '''
+        close connections idle for idle_timeout; sessions without a client which can keep
+        them apart (pyeapi) are dropped then, and the oldest ones beyond max_size
+        '''
+        now = time.time()
+        with self.lock:
+            for device, session in list(self.sessions.items()):
+                if not session.lock.acquire(False):
+                    continue
+                try:
+                    node = session.cli.node
+                    if hasattr(node, 'evict_idle'):
+                        node.evict_idle()
+                    elif now - session.last_used >= self.idle_timeout:
+                        del self.sessions[device]
+                finally:
+                    session.lock.release()
+            while self.max_size and len(self.sessions) > self.max_size:
+                device, session = self.sessions.popitem(last=False)
+                self.close_session(session)
+
+    @staticmethod
+    def close_session(session):
+        if hasattr(session.cli.node, 'close'):
+            with session.lock:
+                session.cli.node.close()
+
+    def close(self):
+        with self.lock:
+            for session in self.sessions.values():
+                self.close_session(session)
+            self.sessions.clear()
+
+    def stats(self):
+        result = {}
+        for device, session in self.sessions.items():
+            node = session.cli.node
+            result[device] = {'uses': session.uses,
+                              'idle': int(time.time() - session.last_used),
+                              'connections_opened': getattr(node, 'connections', None),
+                              'connections_idle': len(getattr(node, 'idle', [])),
+                              }
+        return result
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='run backup command cycles over pooled sessions')
+    arg_parser.add_argument('device', nargs='*')
+    arg_parser.add_argument('--credentials', action='append', default=None,
+                            help='env, file:PATH, keyring or prompt, in the order to try (default env, prompt)')
+    arg_parser.add_argument('--cycles', type=int, default=3)
+    arg_parser.add_argument('--interval', type=float, default=0)
+    arg_parser.add_argument('--idle-timeout', type=float, default=IDLE_TIMEOUT)
+    arg_parser.add_argument('--fake', default=None, help='backup .txt file served by a local fake eAPI server')
+    args = arg_parser.parse_args()
+
+    from aristacli import COMMAND_LIST
+    transport = 'https'
+    port = None
+    devices = args.device
+    credentials = get_credentials(args.credentials or ['env', 'prompt'])
+    if args.fake:
+        import asyncio
+        import eapiclient
+        server = eapiclient.FakeEapiServer.from_backup(args.fake)
+        server_loop = asyncio.new_event_loop()
+        server_loop.run_until_complete(server.start())
+        threading.Thread(target=server_loop.run_forever, daemon=True).start()
+        transport = 'http'
+        port = server.port
+        devices = ['127.0.0.1']
+        credentials = CredentialChain([EnvCredentials(environ={'ARISTA_PASSWORD': 'fake'})])
+
+    pool = ConnectionPool(credentials, transport=transport, port=port, idle_timeout=args.idle_timeout)
+    for cycle in range(args.cycles):
+        start = time.time()
+        for device in devices:
+            with pool.session(device) as cli:
+                cli.set_command_list(COMMAND_LIST)
+                result = cli.get_result('text')
+                print("cycle %d %s: %d commands %.3fs" % (cycle + 1, device, len(result), time.time() - start))
+        time.sleep(args.interval)
+    print(json.dumps(pool.stats(), indent=2))
+    pool.close()
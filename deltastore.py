@@ -0,0 +1,426 @@
+#!/usr/bin/env python
+'''
+Delta encoded snapshot storage for high frequency collection
+
+Backing a device up every minute writes a full .txt and .json each time although
+only a few rows changed. DeltaStore writes a full keyframe every keyframe_every
+snapshots of a device and in between only what changed against the previous one:
+    - a parsed table (encoding 'list') as row level changes keyed on the diff key
+      of its command (diff_config.json, the whole row for commands without one):
+      the rows of the keys which changed or appeared, and the edits of the sequence
+      of row keys (so row order is kept exactly); the key columns are written in the
+      delta and applied from there, so a later change of diff_config.json doesn't
+      change how a stored delta is rebuilt
+    - a text section (the .txt and the unparsed outputs) as line level edits
+    - any other result (eAPI json) whole, only when it changed
+so the bytes written follow the churn, not the table size. A snapshot is rebuilt
+from its keyframe plus at most keyframe_every - 1 deltas, each applied in one pass.
+
+Files in store_dir, gzipped json, the timestamp is the one of the backup file name:
+    <device>_backup_<timestamp>.key.json.gz     {'text': [[command, output]], 'json': backup json}
+    <device>_backup_<timestamp>.delta.json.gz   {'base': previous timestamp, 'text': .., 'json': ..}
+and the sidecars of the backup (snapstats.py, snapfilter.py) as for a backup json,
+<device>_backup_<timestamp>.stats.json / .bloom.json. load_backup takes the name the
+backup json would have in store_dir, so the sidecar tools query a store like backups.
+
+Usage:
+    store = DeltaStore('/backup', keyframe_every=60)
+    backup = AristaStateBackup('carcore3', command_list=COMMAND_LIST, store=store)
+    backup.get_status()
+    text, data = store.load('carcore3', '20170928110800')
+    data = load_backup('/backup/carcore3_backup_20170928110800.json')     # normalized like load_snapshot
+
+    ./deltastore.py --store /backup import carcore3_backup_*.json
+    ./deltastore.py --store /backup export carcore3 20170928110800    # back to .txt / .json
+    ./deltastore.py --store /backup stats
+'''
+from __future__ import print_function
+
+import os
+import re
+import gzip
+import json
+import time
+import argparse
+
+from datetime import datetime
+from difflib import SequenceMatcher
+
+import eosjson
+
+from diffconfig import DiffRegistry, check_spec
+from difftable import fold_row, backup_name, backup_time, load_snapshot
+
+KEYFRAME_EVERY = 60
+STORE_FILE = re.compile(r'(?P<device>.+)_backup_(?P<timestamp>\d{14})\.(?P<kind>key|delta)\.json\.gz$')
+
+
+def delta_sequence(old, new):
+    '''
+    return the edits turning the list old into new, [[i1, i2, new items]] of the slices which differ
+    '''
+    if old == new:
+        return []
+    # the common head and tail are cut first; SequenceMatcher's junk heuristic (lines
+    # like '  Outgoing interface list:' repeated thousands of times) keeps it near
+    # linear on the rest, at the price of a slightly bigger delta
+    head = 0
+    end = min(len(old), len(new))
+    while head < end and old[head] == new[head]:
+        head += 1
+    tail = 0
+    while tail < end - head and old[-1 - tail] == new[-1 - tail]:
+        tail += 1
+    matcher = SequenceMatcher(None, old[head:len(old) - tail], new[head:len(new) - tail])
+    return [[head + i1, head + i2, new[head + j1:head + j2]]
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal']
+
+
+def apply_sequence(old, edits):
+    result = []
+    pos = 0
+    for i1, i2, items in edits:
+        result.extend(old[pos:i1])
+        result.extend(items)
+        pos = i2
+    result.extend(old[pos:])
+    return result
+
+
+def row_keys(table, row_key):
+    '''
+    return the key of every row of a table (as text) and {key: [rows]} in table order
+
+    row_key is {'pos': positions of the diff key, 'overflow': position or None} (see
+    DeltaStore.row_key), a row is keyed on those columns once folded like
+    difftable.table_rows; None keys a row on all its fields; rows shorter than the
+    header (the trailing ['']) are keyed on their position
+    '''
+    width = len(table[0])
+    keys = []
+    rows = {}
+    for i, row in enumerate(table[1:]):
+        if len(row) < width:
+            key = '#%d' % i
+        elif row_key is None:
+            key = json.dumps(row)
+        else:
+            folded = row if len(row) == width else fold_row(row, width, row_key['overflow'])
+            key = json.dumps([folded[p] for p in row_key['pos']])
+        keys.append(key)
+        rows.setdefault(key, []).append(row)
+    return keys, rows
+
+
+def table_from_keys(header, keys, rows):
+    result = [header]
+    taken = {}
+    for key in keys:
+        n = taken.get(key, 0)
+        result.append(rows[key][n])
+        taken[key] = n + 1
+    return result
+
+
+class DeltaStore(object):
+    '''
+    self.last --> {device: (timestamp, text, json, snapshots since the keyframe)} of the last snapshot written
+    '''
+    def __init__(self, store_dir, keyframe_every=KEYFRAME_EVERY, registry=None):
+        self.store_dir = store_dir
+        self.keyframe_every = keyframe_every
+        self.registry = registry or DiffRegistry()
+        self.last = {}
+        if not os.path.isdir(self.store_dir):
+            os.makedirs(self.store_dir)
+
+    def file_name(self, device, timestamp, kind):
+        return os.path.join(self.store_dir, '%s_backup_%s.%s.json.gz' % (device, timestamp, kind))
+
+    def backup_file_name(self, device, timestamp):
+        '''
+        the backup file name (no extension) of a snapshot in the store directory, what its sidecars are named after
+        '''
+        return os.path.join(self.store_dir, '%s_backup_%s' % (device, timestamp))
+
+    def snapshots(self, device):
+        '''
+        return [(timestamp, 'key' or 'delta')] of device, oldest first
+        '''
+        result = []
+        for name in os.listdir(self.store_dir):
+            m = STORE_FILE.match(name)
+            if m and m.group('device') == device:
+                result.append((m.group('timestamp'), m.group('kind')))
+        return sorted(result)
+
+    def devices(self):
+        return sorted(set(m.group('device') for m in map(STORE_FILE.match, os.listdir(self.store_dir)) if m))
+
+    @staticmethod
+    def read(file_name):
+        with gzip.open(file_name, 'rt') as f:
+            return json.load(f)
+
+    @staticmethod
+    def write(file_name, content):
+        # write aside and rename, a reader never sees half a snapshot
+        with gzip.open(file_name + '.tmp', 'wt') as f:
+            json.dump(content, f, separators=(',', ':'))
+        os.rename(file_name + '.tmp', file_name)
+
+    def row_key(self, command, header):
+        '''
+        return {'pos': positions of the diff key of command, 'overflow': overflow column position},
+        None to key the rows on all their fields
+        '''
+        diff_conf = self.registry.get(command)
+        if not diff_conf or check_spec(command, header, diff_conf):
+            return None
+        spec = self.registry.compile(command, header)
+        return {'pos': spec.key_pos, 'overflow': spec.overflow_pos}
+
+    def delta_result(self, old, new):
+        '''
+        return the delta of one command result, None if it didn't change
+        '''
+        if old == new:
+            return None
+        if old['encoding'] != new['encoding'] or old.get('parser') != new.get('parser'):
+            return {'full': new}
+        if new['encoding'] == 'list' and old['result'][0] == new['result'][0]:
+            row_key = self.row_key(new['command'], new['result'][0])
+            old_keys, old_rows = row_keys(old['result'], row_key)
+            new_keys, new_rows = row_keys(new['result'], row_key)
+            return {'key': row_key,
+                    'keys': delta_sequence(old_keys, new_keys),
+                    'rows': dict((k, v) for k, v in new_rows.items() if old_rows.get(k) != v)}
+        if new['encoding'] == 'text' and isinstance(new['result'], dict) and 'output' in new['result']:
+            return {'lines': delta_sequence(old['result']['output'].splitlines(True),
+                                            new['result']['output'].splitlines(True))}
+        return {'full': new}
+
+    def apply_result(self, old, delta):
+        if 'full' in delta:
+            return delta['full']
+        new = dict(old)
+        if 'keys' in delta:
+            # the rows are keyed the way the delta was made; deltas written before the
+            # key was stored in them only have the registry to go by
+            row_key = delta['key'] if 'key' in delta else self.row_key(old['command'], old['result'][0])
+            old_keys, rows = row_keys(old['result'], row_key)
+            rows.update(delta['rows'])
+            new['result'] = table_from_keys(old['result'][0], apply_sequence(old_keys, delta['keys']), rows)
+        else:
+            new['result'] = {'output': ''.join(apply_sequence(old['result']['output'].splitlines(True),
+                                                              delta['lines']))}
+        return new
+
+    def make_delta(self, old_text, old_json, text, data):
+        old_output = dict(old_text)
+        old_result = dict((r['command'], r) for r in old_json)
+        delta = {'text_commands': [c for c, _ in text], 'text': {},
+                 'json_commands': [r['command'] for r in data], 'json': {}}
+        for command, output in text:
+            if command not in old_output:
+                delta['text'][command] = {'full': output}
+            elif old_output[command] != output:
+                delta['text'][command] = {'lines': delta_sequence(old_output[command].splitlines(True),
+                                                                  output.splitlines(True))}
+        for r in data:
+            if r['command'] not in old_result:
+                delta['json'][r['command']] = {'full': r}
+                continue
+            result_delta = self.delta_result(old_result[r['command']], r)
+            if result_delta is not None:
+                delta['json'][r['command']] = result_delta
+        return delta
+
+    def apply_delta(self, old_text, old_json, delta):
+        old_output = dict(old_text)
+        old_result = dict((r['command'], r) for r in old_json)
+        text = []
+        for command in delta['text_commands']:
+            change = delta['text'].get(command)
+            if change is None:
+                text.append([command, old_output[command]])
+            elif 'full' in change:
+                text.append([command, change['full']])
+            else:
+                text.append([command, ''.join(apply_sequence(old_output[command].splitlines(True),
+                                                             change['lines']))])
+        data = []
+        for command in delta['json_commands']:
+            change = delta['json'].get(command)
+            if change is None:
+                data.append(old_result[command])
+            else:
+                data.append(self.apply_result(old_result.get(command), change))
+        return text, data
+
+    def put(self, device, text, data, timestamp=None):
+        '''
+        store one snapshot, text is [[command, output]] as in the .txt backup, data the backup json
+        return the file written
+        '''
+        timestamp = timestamp or datetime.now().strftime('%Y%m%d%H%M%S')
+        text = [list(t) for t in text]
+        last = self.last.get(device)
+        if last is None:
+            last = self.load_last(device)
+        if last is not None and timestamp <= last[0]:
+            raise ValueError('%s: %s is not newer than %s' % (device, timestamp, last[0]))
+        if last is None or last[3] + 1 >= self.keyframe_every:
+            file_name = self.file_name(device, timestamp, 'key')
+            self.write(file_name, {'text': text, 'json': data})
+            since_keyframe = 0
+        else:
+            file_name = self.file_name(device, timestamp, 'delta')
+            delta = self.make_delta(last[1], last[2], text, data)
+            delta['base'] = last[0]
+            self.write(file_name, delta)
+            since_keyframe = last[3] + 1
+        self.last[device] = (timestamp, text, data, since_keyframe)
+        return file_name
+
+    def load_last(self, device):
+        snapshots = self.snapshots(device)
+        if not snapshots:
+            return None
+        timestamp = snapshots[-1][0]
+        since_keyframe = len(snapshots) - 1 - max(i for i, s in enumerate(snapshots) if s[1] == 'key')
+        text, data = self.load(device, timestamp)
+        return timestamp, text, data, since_keyframe
+
+    def load(self, device, timestamp):
+        '''
+        return (text, data) of the snapshot of device at timestamp: the keyframe at or before it plus the deltas up to it
+        '''
+        last = self.last.get(device)
+        if last is not None and last[0] == timestamp:
+            return last[1], last[2]
+        snapshots = [s for s in self.snapshots(device) if s[0] <= timestamp]
+        if not snapshots or snapshots[-1][0] != timestamp:
+            raise KeyError('%s: no snapshot %s in %s' % (device, timestamp, self.store_dir))
+        start = max(i for i, s in enumerate(snapshots) if s[1] == 'key')
+        keyframe = self.read(self.file_name(device, snapshots[start][0], 'key'))
+        text, data = keyframe['text'], keyframe['json']
+        base = snapshots[start][0]
+        for ts, kind in snapshots[start + 1:]:
+            delta = self.read(self.file_name(device, ts, kind))
+            if delta['base'] != base:
+                raise ValueError('%s: delta %s is based on %s, not on %s' % (device, ts, delta['base'], base))
+            text, data = self.apply_delta(text, data, delta)
+            base = ts
+        return text, data
+
+    def export(self, device, timestamp, backup_file_name=None):
+        '''
+        write the snapshot back as the .txt / .json pair AristaStateBackup would have written
+        '''
+        text, data = self.load(device, timestamp)
+        backup_file_name = backup_file_name or '%s_backup_%s' % (device, timestamp)
+        with open(backup_file_name + '.txt', 'w', newline='') as f:
+            f.write(format_text(text))
+        with open(backup_file_name + '.json', 'w') as f:
+            json.dump(data, f, indent=2)
+        return backup_file_name
+
+    def stats(self):
+        result = {}
+        for device in self.devices():
+            stat = {'keyframes': 0, 'deltas': 0, 'keyframe_bytes': 0, 'delta_bytes': 0}
+            for timestamp, kind in self.snapshots(device):
+                size = os.path.getsize(self.file_name(device, timestamp, kind))
+                stat['keyframes' if kind == 'key' else 'deltas'] += 1
+                stat['keyframe_bytes' if kind == 'key' else 'delta_bytes'] += size
+            result[device] = stat
+        return result
+
+
+def format_text(text):
+    '''
+    the .txt backup of [[command, output]], as AristaStateBackup writes it
+    '''
+    return ''.join("--------------- %s -------------\n%s--------------------------------\n" % (command, output)
+                   for command, output in text)
+
+
+def read_text(txt_file):
+    import cliparser
+    with open(txt_file, newline='') as f:
+        return [[command, output] for command, output in
+                cliparser.iter_sections(f, cliparser.BACKUP_SECTION_DELIMITER, cliparser.BACKUP_SECTION_END)]
+
+
+def stored_file(snapshot):
+    '''
+    the store file (keyframe or delta) of a backup json file name in a store directory, None if there is none
+    '''
+    name = backup_name(snapshot)
+    if not name:
+        return None
+    for kind in ('key', 'delta'):
+        file_name = os.path.join(os.path.dirname(snapshot), '%s_backup_%s.%s.json.gz' % (name[0], name[1], kind))
+        if os.path.exists(file_name):
+            return file_name
+    return None
+
+
+def stored_backups(store_dir):
+    '''
+    the backup json file names of the snapshots of a store directory, as AristaStateBackup would have written them
+    '''
+    return sorted(set(os.path.join(store_dir, '%s_backup_%s.json' % (m.group('device'), m.group('timestamp')))
+                      for m in map(STORE_FILE.match, os.listdir(store_dir)) if m))
+
+
+def load_backup(snapshot):
+    '''
+    the command results of a backup json file name like difftable.load_snapshot, rebuilt from
+    the store of its directory when there is no such file but a snapshot of the store
+    '''
+    if os.path.exists(snapshot) or not stored_file(snapshot):
+        return load_snapshot(snapshot)
+    device, timestamp = backup_name(snapshot)
+    data = DeltaStore(os.path.dirname(snapshot) or '.').load(device, timestamp)[1]
+    return eosjson.normalize_snapshot(data, backup_time(snapshot))
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='delta encoded snapshot store')
+    arg_parser.add_argument('--store', required=True, help='store directory')
+    arg_parser.add_argument('--keyframe-every', type=int, default=KEYFRAME_EVERY)
+    sub_parser = arg_parser.add_subparsers(dest='action')
+    sub_parser.required = True
+    import_parser = sub_parser.add_parser('import', help='add .json backups (and their .txt), oldest first')
+    import_parser.add_argument('snapshot', nargs='+')
+    export_parser = sub_parser.add_parser('export', help='rebuild a .txt / .json backup')
+    export_parser.add_argument('device')
+    export_parser.add_argument('timestamp')
+    export_parser.add_argument('--backup-file-name', default=None)
+    sub_parser.add_parser('stats', help='keyframe and delta sizes per device')
+    args = arg_parser.parse_args()
+
+    store = DeltaStore(args.store, keyframe_every=args.keyframe_every)
+    if args.action == 'import':
+        for snapshot in sorted(args.snapshot, key=lambda s: backup_name(s) or ('', s)):
+            name = backup_name(snapshot)
+            if not name:
+                print("%s: not a <device>_backup_<timestamp>.json name, skip it" % snapshot)
+                continue
+            try:
+                with open(snapshot) as f:
+                    data = json.load(f)
+            except ValueError as e:
+                print("%s: can't load it (%s), skip it" % (snapshot, e))
+                continue
+            txt_file = snapshot[:-len('.json')] + '.txt'
+            text = read_text(txt_file) if os.path.exists(txt_file) else []
+            start = time.time()
+            file_name = store.put(name[0], text, data, timestamp=name[1])
+            print("%s: %d bytes %.3fs" % (file_name, os.path.getsize(file_name), time.time() - start))
+    elif args.action == 'export':
+        print(store.export(args.device, args.timestamp, args.backup_file_name))
+    else:
+        print(json.dumps(store.stats(), indent=2))
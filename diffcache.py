@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+'''
+On-disk cache of diff results keyed on the snapshot pair
+
+A key is made of
+    (sha1 of snapshot A, sha1 of snapshot B, command, hash of the diff_handle_config
+     entry, engine, code version)
+where the code version is a hash of the diff engine sources, so editing the diff
+code invalidates everything cached by the old one. Values are pickled and zlib
+compressed, one file per key. The cache is bounded in size and evicts the least
+recently used files first (a hit touches the file's mtime).
+
+Snapshot hashes are memoized on (path, size, mtime) so a repeated diff of the same
+two files neither re-reads nor re-parses them.
+
+Usage:
+    cache = DiffCache()
+    diff = AristaStateDiff(first, second, engine='merge', cache=cache)
+    ./diffcache.py --stats
+    ./diffcache.py --clear
+'''
+from __future__ import print_function
+
+import os
+import zlib
+import json
+import pickle
+import hashlib
+import argparse
+
+CACHE_DIR = os.path.expanduser('~/.cache/showparser/diff')
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+CACHE_SUFFIX = '.diff'
+HASH_MEMO_FILE = 'snapshot_hash.json'
+# sources whose change must invalidate cached results
+CODE_FILES = ['difftable.py', 'diffconfig.py', 'fastdiff.py', 'aristacli.py', 'eosjson.py', 'rowschema.py',
+              'partdiff.py', 'extdiff.py']
+
+_code_version = None
+
+
+def code_version():
+    global _code_version
+    if _code_version is None:
+        code_dir = os.path.dirname(os.path.realpath(__file__))
+        h = hashlib.sha1()
+        for name in CODE_FILES:
+            path = os.path.join(code_dir, name)
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    h.update(f.read())
+        _code_version = h.hexdigest()
+    return _code_version
+
+
+def file_hash(file_name):
+    h = hashlib.sha1()
+    with open(file_name, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+class DiffCache(object):
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        self.hash_memo_file = os.path.join(self.cache_dir, HASH_MEMO_FILE)
+        self.hash_memo = None
+
+    def snapshot_hash(self, file_name):
+        '''
+        sha1 of the snapshot file, only recomputed when its size or mtime changed
+        '''
+        if self.hash_memo is None:
+            try:
+                with open(self.hash_memo_file) as f:
+                    self.hash_memo = json.load(f)
+            except (IOError, OSError, ValueError):
+                self.hash_memo = {}
+        path = os.path.realpath(file_name)
+        st = os.stat(path)
+        stamp = [st.st_size, st.st_mtime]
+        memo = self.hash_memo.get(path)
+        if memo and memo[0] == stamp:
+            return memo[1]
+        digest = file_hash(path)
+        self.hash_memo[path] = [stamp, digest]
+        self.write_file(self.hash_memo_file, json.dumps(self.hash_memo).encode())
+        return digest
+
+    @staticmethod
+    def make_key(hash_1, hash_2, command, diff_conf, engine):
+        '''
+        command None is used for the list of commands diffed for the pair
+        '''
+        conf = json.dumps(diff_conf, sort_keys=True)
+        key = '\0'.join([hash_1, hash_2, command or '', conf, engine, code_version()])
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + CACHE_SUFFIX)
+
+    def get(self, key, default=None):
+        '''
+        the value stored for key, default when there is none (a stored None is a hit)
+        '''
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except (IOError, OSError):
+            return default
+        try:
+            value = pickle.loads(zlib.decompress(data))
+        except Exception as e:
+            # truncated or from an incompatible python, drop it
+            print("drop broken cache entry %s: %s" % (key, e))
+            os.remove(path)
+            return default
+        # mark it recently used
+        os.utime(path, None)
+        return value
+
+    def put(self, key, value):
+        self.write_file(self.path(key), zlib.compress(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)))
+        self.evict()
+
+    @staticmethod
+    def write_file(path, data):
+        # write aside and rename, a reader never sees half an entry
+        tmp = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.rename(tmp, path)
+
+    def entries(self):
+        '''
+        return [(mtime, size, path)] of all entries, least recently used first
+        '''
+        result = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(CACHE_SUFFIX):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                result.append((st.st_mtime, st.st_size, path))
+        result.sort()
+        return result
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(e[1] for e in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            os.remove(path)
+        if os.path.exists(self.hash_memo_file):
+            os.remove(self.hash_memo_file)
+        self.hash_memo = {}
+
+    def stats(self):
+        entries = self.entries()
+        return {'cache_dir': self.cache_dir,
+                'entries': len(entries),
+                'bytes': sum(e[1] for e in entries),
+                'max_bytes': self.max_bytes,
+                'code_version': code_version(),
+                }
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='inspect or clear the diff result cache')
+    arg_parser.add_argument('--cache-dir', default=CACHE_DIR)
+    arg_parser.add_argument('--clear', action='store_true')
+    arg_parser.add_argument('--stats', action='store_true')
+    args = arg_parser.parse_args()
+
+    cache = DiffCache(args.cache_dir)
+    if args.clear:
+        cache.clear()
+    print(json.dumps(cache.stats(), indent=2))
@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+'''
+Registry of the diff handle config of every collected command
+
+The registry is a json file (diff_config.json next to this module by default)
+    {command: {'grouping': [column, ...], 'index': [column, ...], 'check': [column, ...]
+               [, 'overflow': column]}}
+overflow names the column whose values may hold a ',' (a TextFSM List value such as
+the OUTGOING_INF of show ip mfib): the fields the backup split off it are folded back
+into it instead of into the last column (difftable.table_rows).
+A spec is validated once against the column schema of its command, either the
+Value names of the TextFSM template or the header row of the first table seen,
+and compiled into a DiffSpec holding every column position the diff engines need,
+so the diff itself never looks a column up by name.
+
+Usage:
+    registry = DiffRegistry()
+    spec = registry.compile('show ip route', table[0])
+    ./diffconfig.py --template-dir ~/template          # check the registry against the templates
+    ./diffconfig.py carcore3_backup_20170928110800.json  # check it against a backup
+'''
+from __future__ import print_function
+
+import os
+import json
+import argparse
+
+import eosjson
+
+REGISTRY_FILE = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'diff_config.json')
+SPEC_FIELDS = ('grouping', 'index', 'check')
+OPTIONAL_FIELDS = ('overflow',)
+INDICATOR = 'DIFF_RESULT'
+
+
+class DiffSpec(object):
+    '''
+    a diff handle config compiled against one column schema
+
+    positions are into
+        column          the table rows
+        value_column    the value tuple of a grouped row (column minus the key)
+        merged_column   the pandas merge layout [row index, key..., value_L..., value_R..., DIFF_RESULT]
+    '''
+    __slots__ = ('command', 'column', 'grouping', 'index', 'check', 'overflow', 'overflow_pos',
+                 'key_pos', 'value_pos', 'value_column', 'check_pos',
+                 'merged_column', 'left_pos', 'right_pos', 'indicator_pos')
+
+    def __init__(self, command, column, diff_conf):
+        self.command = command
+        self.column = tuple(column)
+        self.grouping = list(diff_conf['grouping'])
+        self.index = list(diff_conf['index'])
+        self.check = list(diff_conf['check'])
+        self.overflow = diff_conf.get('overflow')
+        # None folds the split off fields into the last column, as difftable.table_rows does
+        self.overflow_pos = self.column.index(self.overflow) if self.overflow else None
+
+        self.key_pos = [self.column.index(c) for c in self.grouping]
+        self.value_pos = [i for i in range(len(self.column)) if i not in self.key_pos]
+        self.value_column = [self.column[i] for i in self.value_pos]
+        self.check_pos = [self.value_column.index(c) for c in self.check]
+
+        width = len(self.value_column)
+        offset = 1 + len(self.grouping)
+        self.merged_column = ([''] + self.grouping + [c + '_L' for c in self.value_column] +
+                              [c + '_R' for c in self.value_column] + [INDICATOR])
+        self.left_pos = [offset + p for p in self.check_pos]
+        self.right_pos = [offset + width + p for p in self.check_pos]
+        self.indicator_pos = offset + 2 * width
+
+    def config(self):
+        config = {'grouping': self.grouping, 'index': self.index, 'check': self.check}
+        if self.overflow:
+            config['overflow'] = self.overflow
+        return config
+
+    def __repr__(self):
+        return 'DiffSpec(%r, %r)' % (self.command, self.config())
+
+
+def check_spec(command, column, diff_conf):
+    '''
+    return a list of the problems of diff_conf against the column schema, empty if it is fine
+    '''
+    problems = []
+    for field in SPEC_FIELDS:
+        if not isinstance(diff_conf.get(field), list):
+            problems.append("%s: '%s' must be a list of column names" % (command, field))
+    if problems:
+        return problems
+    for field in SPEC_FIELDS:
+        unknown = [c for c in diff_conf[field] if c not in column]
+        if unknown:
+            problems.append("%s: %s %s not in %s" % (command, field, unknown, list(column)))
+    overflow = diff_conf.get('overflow')
+    if overflow is not None and overflow not in column:
+        problems.append("%s: overflow %s not in %s" % (command, overflow, list(column)))
+    if not diff_conf['grouping']:
+        problems.append("%s: empty grouping" % command)
+    overlap = [c for c in diff_conf['check'] if c in diff_conf['grouping']]
+    if overlap:
+        problems.append("%s: check %s is part of the grouping key" % (command, overlap))
+    return problems
+
+
+def compile_spec(command, column, diff_conf):
+    '''
+    return the DiffSpec of diff_conf for the column schema, None (and say why) if it doesn't fit
+    '''
+    problems = check_spec(command, column, diff_conf)
+    if problems:
+        for p in problems:
+            print("diff_conf %s" % p)
+        return None
+    return DiffSpec(command, column, diff_conf)
+
+
+def load_registry(registry_file=REGISTRY_FILE):
+    with open(registry_file) as f:
+        registry = json.load(f)
+    if not isinstance(registry, dict):
+        raise ValueError('%s: expect {command: diff_conf}' % registry_file)
+    for command, diff_conf in registry.items():
+        if not isinstance(diff_conf, dict) or not set(SPEC_FIELDS) <= set(diff_conf) <= set(SPEC_FIELDS + OPTIONAL_FIELDS):
+            raise ValueError('%s: %s needs exactly %s (and optionally %s)' %
+                             (registry_file, command, list(SPEC_FIELDS), list(OPTIONAL_FIELDS)))
+    return registry
+
+
+def template_columns(template_dir, index_file, command):
+    '''
+    return the Value names of the TextFSM template(s) clitable picks for command, None if none
+    '''
+    import clitable
+    import textfsm
+    cli_table = clitable.CliTable(index_file, template_dir)
+    row = cli_table.index.GetRowMatch({'Command': command, 'Vendor': 'Arista'})
+    if not row:
+        return None
+    column = []
+    for name in cli_table.index.index[row]['Template'].split(':'):
+        with open(os.path.join(template_dir, name)) as f:
+            for c in textfsm.TextFSM(f).header:
+                if c not in column:
+                    column.append(c)
+    return column
+
+
+class DiffRegistry(object):
+    '''
+    the registry plus the DiffSpec compiled for every (command, column schema) seen so far
+    '''
+    def __init__(self, registry_file=REGISTRY_FILE, config=None):
+        self.registry_file = registry_file
+        self.config = config if config is not None else load_registry(registry_file)
+        self.compiled = {}
+
+    def get(self, command):
+        return self.config.get(command)
+
+    def compile(self, command, column):
+        '''
+        return the DiffSpec of command for this header row, None if there is no config or it doesn't fit
+        a schema is only validated the first time it is seen, the answer is kept either way
+        '''
+        key = (command, tuple(column))
+        if key in self.compiled:
+            return self.compiled[key]
+        diff_conf = self.config.get(command)
+        spec = compile_spec(command, column, diff_conf) if diff_conf else None
+        self.compiled[key] = spec
+        return spec
+
+    def check_templates(self, template_dir, index_file):
+        '''
+        compile every spec against its template, return {command: problems} of those which don't fit
+        '''
+        result = {}
+        for command in sorted(self.config):
+            column = template_columns(template_dir, index_file, command)
+            if column is None and command in eosjson.NORMALIZER:
+                # only ever a table when backed up as eos json
+                column = eosjson.NORMALIZER[command][0]
+            if column is None:
+                result[command] = ['%s: no template' % command]
+                continue
+            problems = check_spec(command, column, self.config[command])
+            if problems:
+                result[command] = problems
+            else:
+                self.compile(command, column)
+        return result
+
+    def check_snapshot(self, snapshot):
+        '''
+        same as check_templates with the header rows of a loaded backup json
+        '''
+        result = {}
+        for r in snapshot:
+            command = r['command']
+            if command not in self.config:
+                continue
+            if r.get('encoding') != 'list':
+                result[command] = ['%s: not a parsed table (%s)' % (command, r.get('encoding'))]
+                continue
+            problems = check_spec(command, r['result'][0], self.config[command])
+            if problems:
+                result[command] = problems
+            else:
+                self.compile(command, r['result'][0])
+        return result
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='check the diff config registry')
+    arg_parser.add_argument('snapshot', nargs='*', help='backup json to check the registry against')
+    arg_parser.add_argument('--registry', default=REGISTRY_FILE)
+    arg_parser.add_argument('--template-dir', default=None)
+    arg_parser.add_argument('--index-file', default='index')
+    args = arg_parser.parse_args()
+
+    registry = DiffRegistry(args.registry)
+    problems = {}
+    if args.template_dir:
+        problems.update(registry.check_templates(args.template_dir, args.index_file))
+    from difftable import load_snapshot
+    for snapshot in args.snapshot:
+        problems.update(registry.check_snapshot(load_snapshot(snapshot)))
+    for command in sorted(registry.config):
+        print("%-30s %s" % (command, '; '.join(problems.get(command, ['ok']))))
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+'''
+Helpers shared by the diff engines to work on the TextFSM tables in a backup json
+
+A table is what AristaStateBackup.execute_parser returns: first row is the column
+names, every other row is one TextFSM record split on ',' (so a value containing
+',' spills over into extra fields) and the last row is [''].
+'''
+from __future__ import print_function
+
+import gc
+import os
+import re
+import json
+import time
+
+from datetime import datetime
+from contextlib import contextmanager
+
+from operator import itemgetter
+
+import eosjson
+
+from diffconfig import load_registry
+
+# default diff handle config of every command, see diffconfig.py
+DIFF_HANDLE_CONFIG = load_registry()
+
+
+# file names AristaStateBackup gives its backups
+BACKUP_FILE = re.compile(r'(?P<device>.+)_backup_(?P<timestamp>\d{14})\.json$')
+
+
+def backup_name(file_name):
+    '''
+    return (device, timestamp YYYYmmddHHMMSS) of a backup json file name, None if it isn't one
+    '''
+    m = BACKUP_FILE.match(os.path.basename(file_name))
+    if not m:
+        return None
+    return m.group('device'), m.group('timestamp')
+
+
+def backup_time(file_name):
+    '''
+    epoch seconds of the timestamp in a backup file name, None if it isn't one
+    '''
+    name = backup_name(file_name)
+    if not name:
+        return None
+    return time.mktime(datetime.strptime(name[1], '%Y%m%d%H%M%S').timetuple())
+
+
+def load_snapshot(snapshot):
+    '''
+    return the list of command results of a backup, snapshot is a file name or already loaded
+
+    eos json results are normalized into tables (eosjson.py), ages counted up to the backup time
+    '''
+    if isinstance(snapshot, list):
+        return eosjson.normalize_snapshot(snapshot)
+    with open(snapshot) as f:
+        return eosjson.normalize_snapshot(json.load(f), backup_time(snapshot))
+
+
+def fold_row(row, width, overflow=None):
+    '''
+    row with exactly width fields: the fields beyond the width folded back, with the ','
+    they were split on, into the column at position overflow (the last one by default)
+    '''
+    if overflow is None:
+        overflow = width - 1
+    end = overflow + len(row) - width + 1
+    return row[:overflow] + [','.join(row[overflow:end])] + row[end:]
+
+
+def table_rows(data, overflow=None):
+    '''
+    yield the data rows of a table with exactly len(header) fields
+
+    rows shorter than the header (the trailing ['']) are dropped, like groupby drops
+    rows with a null key; fields beyond the header width are folded back into the
+    overflow column (see overflow_pos), the last one by default
+    '''
+    width = len(data[0])
+    for row in data[1:]:
+        if len(row) == width:
+            yield row
+        elif len(row) > width:
+            yield fold_row(row, width, overflow)
+
+
+def overflow_pos(command, column, config=None):
+    '''
+    position in column of the column the diff handle config of command names to take
+    the fields a ',' inside a value split off, None for the last column
+    '''
+    name = ((config or DIFF_HANDLE_CONFIG).get(command) or {}).get('overflow')
+    column = [c.strip() for c in column]
+    return column.index(name) if name in column else None
+
+
+def key_config(commands, config=None):
+    '''
+    {command: {'grouping', 'overflow'}} of the diff handle config of commands, what the
+    sidecars of a backup (snapstats.py, snapfilter.py) were made with
+    '''
+    config = config or DIFF_HANDLE_CONFIG
+    return dict((command, {'grouping': list((config.get(command) or {}).get('grouping', [])),
+                           'overflow': (config.get(command) or {}).get('overflow')})
+                for command in commands)
+
+
+def stripped_rows(data, overflow=None):
+    '''
+    table_rows with the spaces around every field stripped
+
+    the older backups split the ', ' separated records on ',' only, so every column
+    after the first starts with a space, in the header (' NETWORK') and in the rows
+    '''
+    for row in table_rows(data, overflow):
+        yield [v.strip() for v in row]
+
+
+def stripped_column(data):
+    return [c.strip() for c in data[0]]
+
+
+@contextmanager
+def gc_paused():
+    '''
+    hold off the cyclic garbage collector while building millions of small tuples/sets
+
+    none of them can form a cycle, but each allocation counts towards a collection
+    which then has to walk the whole (large) heap, roughly doubling the build time
+    '''
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def tuple_getter(positions):
+    '''
+    itemgetter that always returns a tuple, even for a single position
+    '''
+    if len(positions) == 1:
+        pos = positions[0]
+        return lambda row: (row[pos],)
+    return itemgetter(*positions)
+
+
+def group_table(data, grouping, overflow=None):
+    '''
+    group a table on the grouping columns the way diff_generic does with
+    DataFrame.groupby(grouping).agg(set)
+
+    return (value_column, {key tuple: tuple of frozenset, one per value column})
+    '''
+    header = data[0]
+    key_pos = [header.index(c) for c in grouping]
+    value_pos = [i for i in range(len(header)) if i not in key_pos]
+    return [header[i] for i in value_pos], group_rows(table_rows(data, overflow), key_pos, value_pos)
+
+
+def group_rows(rows, key_pos, value_pos):
+    '''
+    group_table on precomputed positions (see diffconfig.DiffSpec)
+    return {key tuple: tuple of frozenset, one per value position}
+    '''
+    get_key = tuple_getter(key_pos)
+    get_value = tuple_getter(value_pos)
+    grouped = {}
+    with gc_paused():
+        for row in rows:
+            key = get_key(row)
+            group = grouped.get(key)
+            if group is None:
+                grouped[key] = [get_value(row)]
+            else:
+                group.append(get_value(row))
+        for key, group in grouped.items():
+            grouped[key] = tuple([frozenset(v) for v in zip(*group)])
+    return grouped
+
+
+def diff_grouped(first, second, check_pos):
+    '''
+    compare two grouped tables from group_table
+
+    return {'new': [key, ...], 'missing': [key, ...], 'changed': [key, ...]} where, as in
+    get_diffs, new is only in first ('left_only'), missing only in second ('right_only')
+    and changed differs in a check_pos column
+    '''
+    diff = {'new': [],
+            'missing': [],
+            'changed': [],
+            }
+    for key, values in second.items():
+        old = first.get(key)
+        if old is None:
+            diff['missing'].append(key)
+        elif old is not values and old != values:
+            if [old[i] for i in check_pos] != [values[i] for i in check_pos]:
+                diff['changed'].append(key)
+    diff['new'] = [key for key in first if key not in second]
+    for keys in diff.values():
+        keys.sort()
+    return diff
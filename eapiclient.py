@@ -0,0 +1,567 @@
+#!/usr/bin/env python
+'''
+asyncio eAPI client: chunked, pipelined, per chunk retried runCmds
+
+AristaCli.get_result sends the whole command list in one blocking node.enable
+call, so one huge command (show ip bgp of a full table) holds up all the others
+and a single timeout fails the lot. EapiClient instead
+    - cuts the command list into chunks sized on the output each command produced
+      last time (commands never seen count DEFAULT_COST bytes), so a big command
+      ends up alone in its request while the small ones share one
+    - keeps max_in_flight requests per device going, each on its own keep-alive
+      connection
+    - retries a failed chunk command by command, so only the command which really
+      fails is reported as failed (a command error is not retried)
+    - hands the results back as each chunk completes (stream) or all at once in
+      command order (enable, same result layout as pyeapi node.enable)
+
+Only the standard library is used: a minimal HTTP/1.1 client on asyncio streams.
+FakeEapiServer serves the sections of a backup .txt file as runCmds answers, with
+optional latency and failures, to exercise the client without a switch:
+    ./eapiclient.py --fake carcore3_backup_20170928110800.txt --delay-per-kb 0.002 --fail-requests 2
+
+Usage:
+    client = EapiClient('carcore3', username='herry', password=password)
+    result = client.enable(COMMAND_LIST, encoding='text')
+
+    async for index, r in client.stream(COMMAND_LIST, encoding='json'):
+        print(r['command'])
+'''
+from __future__ import print_function
+
+import ssl
+import json
+import time
+import base64
+import getpass
+import asyncio
+import argparse
+
+from collections import deque
+
+EAPI_PATH = '/command-api'
+# bytes of output assumed for a command we have no answer of yet
+DEFAULT_COST = 16 * 1024
+# output bytes a chunk is filled up to, and most commands in one
+CHUNK_COST = 512 * 1024
+MAX_CHUNK = 16
+# eAPI error codes of a command which is wrong, not of a request which went wrong
+COMMAND_ERROR = (1000, 1002, 1003, 1004)
+# seconds an unused keep-alive connection is kept, below the eAPI server's own timeout
+IDLE_TIMEOUT = 60
+
+
+class EapiError(Exception):
+    '''
+    Raised for an eAPI error answer or a non 200 HTTP status
+    '''
+    def __init__(self, code, message, data=None):
+        Exception.__init__(self, '%s: %s' % (code, message))
+        self.code = code
+        self.data = data
+
+
+async def read_message(reader):
+    '''
+    read one HTTP/1.1 request or response, return (start line, {header: value}, body)
+    '''
+    start_line = await reader.readline()
+    if not start_line:
+        raise ConnectionError('connection closed')
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        body = []
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if not size:
+                # trailers up to the blank line
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                break
+            body.append(await reader.readexactly(size))
+            await reader.readline()
+        body = b''.join(body)
+    else:
+        body = await reader.readexactly(int(headers.get('content-length', 0)))
+    return start_line.decode('latin-1').strip(), headers, body
+
+
+def write_message(writer, start_line, headers, body):
+    head = [start_line] + ['%s: %s' % (name, value) for name, value in headers]
+    head.append('Content-Length: %d' % len(body))
+    writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+
+
+class Connection(object):
+    '''
+    one keep-alive connection, opened on first use and again after a failure
+    an idle one is kept by the client for the next call made on the same event loop
+    '''
+    def __init__(self, client):
+        self.client = client
+        self.reader = None
+        self.writer = None
+        self.loop = None
+        self.last_used = 0
+        self.busy = False
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.open_connection(self.client.host, self.client.port,
+                                                                 ssl=self.client.ssl_context)
+        self.loop = asyncio.get_event_loop()
+        self.client.connections += 1
+
+    async def send(self, body):
+        write_message(self.writer, 'POST %s HTTP/1.1' % EAPI_PATH, self.client.headers, body)
+        await self.writer.drain()
+        return await read_message(self.reader)
+
+    async def request(self, body):
+        self.busy = True
+        if self.writer is None:
+            await self.open()
+            start_line, headers, body = await self.send(body)
+        else:
+            try:
+                start_line, headers, body = await self.send(body)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # the switch closed it while it was idle, not a failure of the request
+                self.close()
+                await self.open()
+                start_line, headers, body = await self.send(body)
+        self.busy = False
+        self.last_used = time.time()
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        return int(start_line.split()[1]), body
+
+    def usable(self, idle_timeout):
+        return (self.writer is not None and not self.busy and self.loop is asyncio.get_event_loop() and
+                time.time() - self.last_used < idle_timeout)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+        self.busy = False
+
+
+class Job(object):
+    '''
+    the commands of one stream call still to run, shared by the worker coroutines
+    self.pending --> deque of [command index, attempt, alone]
+    '''
+    def __init__(self, commands, encoding):
+        self.commands = commands
+        self.encoding = encoding
+        self.pending = deque([i, 0, False] for i in range(len(commands)))
+        self.results = asyncio.Queue()
+        self.done = 0
+        self.wakeup = asyncio.Event()
+
+    def finished(self):
+        return self.done == len(self.commands)
+
+    def emit(self, index, result, error=None):
+        r = {'command': self.commands[index], 'result': result, 'encoding': self.encoding}
+        if self.encoding == 'json' and isinstance(result, dict) and list(result) == ['output']:
+            # no json for this command, eAPI hands back the text
+            r['encoding'] = 'text'
+        if error is not None:
+            r['error'] = error
+        self.results.put_nowait((index, r))
+        self.done += 1
+        if self.finished():
+            self.wakeup.set()
+
+
+class EapiClient(object):
+    def __init__(self, host, username='', password='', transport='https', port=None, max_in_flight=4,
+                 chunk_cost=CHUNK_COST, max_chunk=MAX_CHUNK, timeout=300, retries=2, backoff=1.0,
+                 verify=False, idle_timeout=IDLE_TIMEOUT):
+        self.host = host
+        self.transport = transport
+        self.port = port or (443 if transport == 'https' else 80)
+        self.max_in_flight = max_in_flight
+        self.chunk_cost = chunk_cost
+        self.max_chunk = max_chunk
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self.ssl_context = None
+        if transport == 'https':
+            self.ssl_context = ssl.create_default_context()
+            if not verify:
+                # switches come with a self-signed certificate
+                self.ssl_context.check_hostname = False
+                self.ssl_context.verify_mode = ssl.CERT_NONE
+        auth = base64.b64encode(('%s:%s' % (username, password)).encode()).decode()
+        self.headers = [('Host', self.host),
+                        ('Content-Type', 'application/json'),
+                        ('Authorization', 'Basic %s' % auth),
+                        ('Connection', 'keep-alive'),
+                        ]
+        # learnt output bytes of every command, drives the chunking
+        self.cost = {}
+        self.request_id = 0
+        self.connections = 0
+        self.requests = 0
+        # keep-alive connections between calls, and the loop enable() runs them on
+        self.idle = []
+        self.loop = None
+
+    async def run_cmds(self, connection, commands, encoding):
+        '''
+        one runCmds request, return the results of commands (without the leading enable)
+        '''
+        self.request_id += 1
+        self.requests += 1
+        body = json.dumps({'jsonrpc': '2.0',
+                           'method': 'runCmds',
+                           'params': {'version': 1, 'cmds': ['enable'] + commands, 'format': encoding},
+                           'id': str(self.request_id),
+                           }).encode()
+        status, body = await connection.request(body)
+        if status != 200:
+            raise EapiError(status, 'HTTP status %d' % status)
+        response = json.loads(body.decode())
+        if 'error' in response:
+            error = response['error']
+            raise EapiError(error.get('code'), error.get('message'), error.get('data'))
+        result = response['result'][1:]
+        # learn the cost: text output length, json answers share the body out evenly
+        for c, r in zip(commands, result):
+            if isinstance(r, dict) and list(r) == ['output']:
+                self.cost[c] = len(r['output'])
+            else:
+                self.cost[c] = len(body) // len(commands)
+        return result
+
+    def get_cost(self, command):
+        return self.cost.get(command, DEFAULT_COST)
+
+    def take(self, job):
+        '''
+        pop the next chunk of job.pending: a retried command alone, otherwise up to max_chunk
+        commands and chunk_cost bytes of expected output, less when that is needed to keep
+        max_in_flight requests busy with what is left
+        '''
+        if not job.pending:
+            return []
+        chunk = [job.pending.popleft()]
+        if chunk[0][2]:
+            return chunk
+        left = sum(self.get_cost(job.commands[item[0]]) for item in job.pending)
+        limit = min(self.chunk_cost, left // self.max_in_flight)
+        cost = self.get_cost(job.commands[chunk[0][0]])
+        while job.pending and len(chunk) < self.max_chunk and not job.pending[0][2]:
+            next_cost = self.get_cost(job.commands[job.pending[0][0]])
+            if cost + next_cost > limit:
+                break
+            cost += next_cost
+            chunk.append(job.pending.popleft())
+        return chunk
+
+    def failed(self, job, chunk, error):
+        '''
+        put the commands of a failed chunk back to be sent alone, give up on a command after
+        self.retries attempts or straight away for a command error
+        return the seconds to wait before the retry
+        '''
+        if len(chunk) > 1:
+            for item in reversed(chunk):
+                job.pending.appendleft([item[0], item[1], True])
+            return 0
+        index, attempt, _ = chunk[0]
+        if attempt >= self.retries or (isinstance(error, EapiError) and error.code in COMMAND_ERROR):
+            print("%s: '%s' failed: %s" % (self.host, job.commands[index], error))
+            job.emit(index, None, str(error))
+            return 0
+        job.pending.appendleft([index, attempt + 1, True])
+        return self.backoff * (attempt + 1)
+
+    def get_connection(self):
+        while self.idle:
+            connection = self.idle.pop()
+            if connection.usable(self.idle_timeout):
+                return connection
+            connection.close()
+        return Connection(self)
+
+    def release(self, connection):
+        if connection.busy:
+            # cancelled half way through a request
+            connection.close()
+        elif connection.writer is not None:
+            self.idle.append(connection)
+
+    def evict_idle(self):
+        '''
+        close the idle connections unused for idle_timeout, return how many are left
+        '''
+        now = time.time()
+        for connection in [c for c in self.idle if now - c.last_used >= self.idle_timeout]:
+            connection.close()
+            self.idle.remove(connection)
+        return len(self.idle)
+
+    def close_idle(self):
+        for connection in self.idle:
+            connection.close()
+        self.idle = []
+
+    def close(self):
+        self.close_idle()
+        if self.loop is not None:
+            # let the transports finish closing
+            self.loop.run_until_complete(asyncio.sleep(0))
+            self.loop.close()
+            self.loop = None
+
+    def give_up(self, job, chunk, error):
+        print("%s: %s failed: %r" % (self.host, [job.commands[item[0]] for item in chunk], error))
+        for item in chunk:
+            job.emit(item[0], None, 'unexpected error: %r' % (error,))
+        job.wakeup.set()
+
+    async def worker(self, job):
+        connection = self.get_connection()
+        try:
+            while not job.finished():
+                chunk = self.take(job)
+                if not chunk:
+                    # the rest is in flight, a failure may hand some back
+                    job.wakeup.clear()
+                    await job.wakeup.wait()
+                    continue
+                commands = [job.commands[item[0]] for item in chunk]
+                try:
+                    result = await asyncio.wait_for(self.run_cmds(connection, commands, job.encoding),
+                                                    self.timeout)
+                    if len(result) != len(commands):
+                        raise ValueError('%d results for %d commands' % (len(result), len(commands)))
+                except (EapiError, OSError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+                    if not isinstance(e, EapiError) or e.code not in COMMAND_ERROR:
+                        connection.close()
+                    delay = self.failed(job, chunk, e)
+                    job.wakeup.set()
+                    if delay:
+                        await asyncio.sleep(delay)
+                    continue
+                except Exception as e:
+                    # a reply (or a bug) nothing above expects: the commands get an error
+                    # instead of leaving stream() waiting for results no worker will send
+                    connection.close()
+                    self.give_up(job, chunk, e)
+                    continue
+                emitted = 0
+                try:
+                    for item, r in zip(chunk, result):
+                        job.emit(item[0], r)
+                        emitted += 1
+                except Exception as e:
+                    self.give_up(job, chunk[emitted:], e)
+        finally:
+            self.release(connection)
+
+    async def stream(self, commands, encoding='json'):
+        '''
+        async generator of (command index, {'command', 'result', 'encoding'[, 'error']}) in completion order
+        a command which could not be run has result None and the reason in 'error', a
+        worker which dies anyway has its exception raised here
+        '''
+        job = Job(list(commands), encoding)
+        # biggest first, the small ones fill in around them
+        job.pending = deque(sorted(job.pending, key=lambda item: -self.get_cost(job.commands[item[0]])))
+        if not job.commands:
+            return
+        workers = [asyncio.ensure_future(self.worker(job))
+                   for _ in range(min(self.max_in_flight, len(job.commands)))]
+        try:
+            for _ in range(len(job.commands)):
+                yield await self.next_result(job, workers)
+        finally:
+            for w in workers:
+                w.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    @staticmethod
+    async def next_result(job, workers):
+        '''
+        the next result of job, raising the exception of a worker which died instead of waiting forever
+        '''
+        if not job.results.empty():
+            return job.results.get_nowait()
+        get = asyncio.ensure_future(job.results.get())
+        try:
+            while True:
+                running = [w for w in workers if not w.done()]
+                done, _ = await asyncio.wait([get] + running, return_when=asyncio.FIRST_COMPLETED)
+                if get in done:
+                    return get.result()
+                for w in done:
+                    if not w.cancelled() and w.exception() is not None:
+                        raise w.exception()
+                if not [w for w in workers if not w.done()]:
+                    raise RuntimeError('every worker stopped with %d results missing' %
+                                       (len(job.commands) - job.done))
+        finally:
+            get.cancel()
+
+    async def enable_async(self, commands, encoding='json'):
+        result = [None] * len(commands)
+        async for index, r in self.stream(commands, encoding):
+            result[index] = r
+        return result
+
+    def enable(self, commands, encoding='json'):
+        '''
+        blocking call with the result layout of pyeapi node.enable, in command order
+        the client keeps its event loop, and so its keep-alive connections, until close()
+        '''
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        return self.loop.run_until_complete(self.enable_async(commands, encoding))
+
+
+class FakeEapiServer(object):
+    '''
+    answers runCmds from {command: text output}, over plain http
+
+    delay_per_kb --> seconds of latency per KB of output of a request
+    fail_requests --> answer the first that many requests with HTTP 500
+    fail_commands --> commands answered with an eAPI command error
+    '''
+    def __init__(self, outputs, host='127.0.0.1', port=0, delay_per_kb=0.0, fail_requests=0, fail_commands=()):
+        self.outputs = outputs
+        self.host = host
+        self.port = port
+        self.delay_per_kb = delay_per_kb
+        self.fail_requests = fail_requests
+        self.fail_commands = set(fail_commands)
+        self.server = None
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.connections = 0
+
+    @classmethod
+    def from_backup(cls, txt_file, **kwargs):
+        import cliparser
+        with open(txt_file) as f:
+            outputs = dict(cliparser.iter_sections(f, cliparser.BACKUP_SECTION_DELIMITER,
+                                                   cliparser.BACKUP_SECTION_END))
+        return cls(outputs, **kwargs)
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    def run_cmds(self, request):
+        '''
+        return (json-rpc answer, bytes of output)
+        '''
+        result = []
+        size = 0
+        for command in request['params']['cmds']:
+            if command == 'enable':
+                result.append({})
+                continue
+            if command in self.fail_commands or command not in self.outputs:
+                message = "CLI command %d of %d '%s' failed: invalid command" % (
+                    len(result) + 1, len(request['params']['cmds']), command)
+                return {'jsonrpc': '2.0', 'id': request['id'],
+                        'error': {'code': 1002, 'message': message,
+                                  'data': result + [{'errors': ['Invalid input']}]}}, size
+            result.append({'output': self.outputs[command]})
+            size += len(self.outputs[command])
+        return {'jsonrpc': '2.0', 'id': request['id'], 'result': result}, size
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    _, _, body = await read_message(reader)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    break
+                self.requests += 1
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                try:
+                    if self.requests <= self.fail_requests:
+                        status, answer = 'HTTP/1.1 500 Internal Server Error', b'{}'
+                    else:
+                        response, size = self.run_cmds(json.loads(body.decode()))
+                        await asyncio.sleep(self.delay_per_kb * size / 1024.0)
+                        status, answer = 'HTTP/1.1 200 OK', json.dumps(response).encode()
+                finally:
+                    self.in_flight -= 1
+                write_message(writer, status, [('Content-Type', 'application/json')], answer)
+                await writer.drain()
+        finally:
+            writer.close()
+
+
+async def run_fake(args, commands):
+    server = FakeEapiServer.from_backup(args.fake, delay_per_kb=args.delay_per_kb,
+                                       fail_requests=args.fail_requests, fail_commands=args.fail_command or ())
+    await server.start()
+    client = EapiClient(server.host, transport='http', port=server.port, max_in_flight=args.max_in_flight,
+                        backoff=0.1)
+    try:
+        for run in range(args.runs):
+            start = time.time()
+            async for index, r in client.stream(commands or sorted(server.outputs), args.encoding):
+                size = len(r['result']['output']) if r['result'] else 0
+                print("%8.3fs %-30s %8d bytes%s" % (time.time() - start, r['command'], size,
+                                                    ' ERROR ' + r['error'] if 'error' in r else ''))
+            print("run %d: %.3fs\n" % (run + 1, time.time() - start))
+    finally:
+        client.close_idle()
+        # let the server see the connections go before it stops
+        await asyncio.sleep(0.01)
+        await server.stop()
+    print("client requests %d connections %d, server max in flight %d" %
+          (client.requests, client.connections, server.max_in_flight))
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='run commands with the async eAPI client')
+    arg_parser.add_argument('device', nargs='?', help='switch to talk to, or use --fake')
+    arg_parser.add_argument('--command', action='append', help='command to run, default all of --fake')
+    arg_parser.add_argument('--username', default=getpass.getuser())
+    arg_parser.add_argument('--encoding', choices=['json', 'text'], default='text')
+    arg_parser.add_argument('--max-in-flight', type=int, default=4)
+    arg_parser.add_argument('--fake', default=None, help='backup .txt file to serve from a local fake eAPI server')
+    arg_parser.add_argument('--delay-per-kb', type=float, default=0.0, help='fake server latency per KB')
+    arg_parser.add_argument('--fail-requests', type=int, default=0, help='fake server fails the first N requests')
+    arg_parser.add_argument('--fail-command', action='append', help='fake server rejects this command')
+    arg_parser.add_argument('--runs', type=int, default=2, help='fake runs, later ones chunk on learnt sizes')
+    args = arg_parser.parse_args()
+
+    if args.fake:
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(run_fake(args, args.command))
+        loop.close()
+    elif args.device and args.command:
+        password = getpass.getpass('Please input your password: ')
+        client = EapiClient(args.device, username=args.username, password=password,
+                            max_in_flight=args.max_in_flight)
+        for r in client.enable(args.command, args.encoding):
+            print("--------------- %s -------------" % r['command'])
+            print(r['result'] if 'error' not in r else r['error'])
+    else:
+        arg_parser.error('give a device and --command, or --fake')
@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+'''
+EOS json output flattened into the tables of the TextFSM templates
+
+A backup with encoding='json' keeps the eAPI json of every command supporting it,
+so the device does no text formatting and nothing is parsed with regexes, but the
+diff tools only know the parsed tables (header row of the template Value names,
+one row per record). A normalizer turns the json of one command into that table,
+with the columns of its template and the values written the way the show command
+prints them (prefix split in NETWORK / MASK, 'B I' protocol codes, dotted MAC
+addresses, Et7 ports ...), so a table from json diffs like one from text:
+    show ip route               one row per next hop, as the template makes one row
+                                per 'via' line of an ECMP route; a route 'directly
+                                connected' to an interface (connected or interface
+                                static) has 'connected' as its NEXT_HOP
+    show ip bgp                 one row per path
+    show ip arp, show mac address-table, show lldp neighbors detail,
+    show ip pim neighbor, show ip pim interface
+    show interfaces status, show ip interface brief
+                                no template here, the columns are the usual ones
+An age in the last column (the LAST_MOVE of the MAC table) is written as the text
+table holds it once folded: the template value '201 days, 0:51:52' is split on ', '
+by the backup and joined again on ',' (difftable.table_rows), so '201 days,0:51:52'.
+Backups keep the normalized table (encoding 'list', parser 'eos'); json stored
+raw by an older backup is normalized when it is loaded (difftable.load_snapshot).
+A command without a normalizer keeps its json as it is.
+
+Usage:
+    table = normalize('show ip arp', eapi_json)     # [header, row, ..., ['']]
+    normalize_snapshot(json.load(f))                # every eos json result of a backup
+
+    ./eosjson.py carcore3_backup_20171001120000.json       # tables of the eos json results
+    ./eosjson.py --command 'show ip route' route.json       # one command's eAPI json
+'''
+from __future__ import print_function
+
+import sys
+import json
+import time
+import argparse
+
+from datetime import timedelta
+
+ROUTE_COLUMN = ['PROTOCOL', 'NETWORK', 'MASK', 'DISTANCE', 'METRIC', 'DIRECT', 'NEXT_HOP', 'INTERFACE']
+BGP_COLUMN = ['STATUS', 'PATH_SELECTION', 'ROUTE_SOURCE', 'NETWORK', 'NEXT_HOP', 'METRIC', 'LOCAL_PREF',
+              'WEIGHT', 'AS_PATH', 'ORIGIN', 'OTHERS']
+ARP_COLUMN = ['ADDRESS', 'AGE', 'MAC_ADDRESS', 'INTERFACE']
+MAC_COLUMN = ['MAC_ADDRESS', 'TYPE', 'VLAN', 'DESTINATION_PORT', 'MOVES', 'LAST_MOVE']
+LLDP_COLUMN = ['DEST_HOST', 'SYSTEM_ID', 'MGMT_ADDRESS', 'PLATFORM_VERSION', 'REMOTE_PORT', 'LOCAL_PORT',
+               'NEIGH_COUNT', 'AGE']
+PIM_NEIGHBOR_COLUMN = ['NEIGHBOR', 'INTERFACE', 'UP_TIME', 'EXPIRES', 'MODE']
+PIM_INTERFACE_COLUMN = ['ADDRESS', 'INTERFACE', 'MODE', 'NEIG_COUNT', 'HELLO_INTVL', 'DR_PRI', 'DR_ADDR',
+                        'PKT_Q', 'PKT_D']
+INTERFACE_STATUS_COLUMN = ['PORT', 'NAME', 'STATUS', 'VLAN', 'DUPLEX', 'SPEED', 'TYPE']
+IP_INTERFACE_COLUMN = ['INTERFACE', 'ADDRESS', 'MASK', 'STATUS', 'PROTOCOL', 'MTU']
+
+# routeType of the json --> protocol code of the text
+ROUTE_TYPE = {
+    'connected': 'C',
+    'static': 'S',
+    'kernel': 'K',
+    'ospfIntraArea': 'O',
+    'ospfInterArea': 'O IA',
+    'ospfExternalType1': 'O E1',
+    'ospfExternalType2': 'O E2',
+    'ospfNssaExternalType1': 'O N1',
+    'ospfNssaExternalType2': 'O N2',
+    'iBGP': 'B I',
+    'eBGP': 'B E',
+    'bgpAggregate': 'A B',
+    'ospfAggregate': 'A O',
+    'rip': 'R',
+    'isisLevel1': 'I L1',
+    'isisLevel2': 'I L2',
+    'dynamicPolicy': 'DP',
+    'martian': 'M',
+}
+BGP_ORIGIN = {'Igp': 'i', 'Egp': 'e', 'Incomplete': '?'}
+# long interface names --> the short ones of the mac address table
+SHORT_PORT = [('Ethernet', 'Et'), ('Port-Channel', 'Po'), ('Vxlan', 'Vx'), ('Management', 'Ma')]
+DUPLEX = {'duplexFull': 'full', 'duplexHalf': 'half', 'duplexUnknown': 'unconf'}
+
+
+def text(value):
+    '''
+    a json value as a table field, None / missing as ''
+    '''
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+
+def default_vrf(result, name):
+    '''
+    the entry of the default VRF of result[name], or result itself with the older flat output
+    '''
+    if 'vrfs' in result:
+        return result['vrfs'].get('default', {}).get(name, {})
+    return result.get(name, {})
+
+
+def split_prefix(prefix):
+    network, _, mask = prefix.partition('/')
+    return network, mask
+
+
+def dotted_mac(mac):
+    '''
+    00:1c:73:00:00:01 --> 001c.7300.0001 as the text tables print it
+    '''
+    digits = mac.replace(':', '').replace('.', '').replace('-', '').lower()
+    if len(digits) != 12:
+        return mac
+    return '.'.join(digits[i:i + 4] for i in range(0, 12, 4))
+
+
+def short_port(interface):
+    for long_name, short_name in SHORT_PORT:
+        if interface.startswith(long_name):
+            return short_name + interface[len(long_name):]
+    return interface
+
+
+def duration(seconds):
+    '''
+    seconds --> '201 days, 0:51:52' like EOS prints an age
+    '''
+    if seconds is None:
+        return ''
+    return str(timedelta(seconds=max(int(seconds), 0)))
+
+
+def since(timestamp, now):
+    return duration(now - timestamp) if timestamp else ''
+
+
+def folded(value):
+    '''
+    a value holding ', ' as the text table has it in its last column, split and folded on ','
+    '''
+    return value.replace(', ', ',')
+
+
+def route_rows(result, now):
+    for prefix, route in sorted(default_vrf(result, 'routes').items()):
+        network, mask = split_prefix(prefix)
+        protocol = ROUTE_TYPE.get(route.get('routeType'), text(route.get('routeType')))
+        connected = route.get('directlyConnected') or route.get('routeType') == 'connected'
+        vias = route.get('vias') or [{}]
+        for via in vias:
+            if connected or (via.get('interface') and not via.get('nexthopAddr')):
+                # 'is directly connected, <interface>': no distance nor metric, the template
+                # takes 'connected' as the next hop
+                yield [protocol, network, mask, '', '', 'directly', 'connected', text(via.get('interface'))]
+            else:
+                yield [protocol, network, mask, text(route.get('preference')), text(route.get('metric')), '',
+                       text(via.get('nexthopAddr')), text(via.get('interface'))]
+
+
+def bgp_rows(result, now):
+    for prefix, entry in sorted(default_vrf(result, 'bgpRouteEntries').items()):
+        for path in entry.get('bgpRoutePaths', []):
+            route_type = path.get('routeType', {})
+            as_path = path.get('asPathEntry', {}).get('asPath') or ''
+            origin = BGP_ORIGIN.get(route_type.get('origin'), '')
+            # the json path ends with the origin code like the text line does, the table has it apart
+            words = as_path.split()
+            if words and words[-1] in ('i', 'e', '?'):
+                words = words[:-1]
+            status = 's' if route_type.get('suppressed') else '*' if route_type.get('valid') else ''
+            selection = ('E' if route_type.get('ecmpHead') else 'e' if route_type.get('ecmp') else
+                         'c' if route_type.get('ecmpContributor') else '')
+            source = '>' if route_type.get('active') else '#' if route_type.get('notInstalled') else ''
+            yield [status, selection, source, prefix, text(path.get('nextHop')), text(path.get('med')),
+                   text(path.get('localPreference')), text(path.get('weight')), ' '.join(words), origin, '']
+
+
+def arp_rows(result, now):
+    for neighbor in result.get('ipV4Neighbors', []):
+        age = neighbor.get('age')
+        yield [text(neighbor.get('address')), 'N/A' if age is None else duration(age),
+               dotted_mac(text(neighbor.get('hwAddress'))), text(neighbor.get('interface'))]
+
+
+def mac_rows(result, now):
+    for table in ('unicastTable', 'multicastTable'):
+        for entry in result.get(table, {}).get('tableEntries', []):
+            interfaces = entry['interfaces'] if 'interfaces' in entry else [entry.get('interface')]
+            for interface in interfaces:
+                yield [dotted_mac(text(entry.get('macAddress'))), text(entry.get('entryType')).upper(),
+                       text(entry.get('vlanId')), short_port(text(interface)), text(entry.get('moves')),
+                       folded(since(entry.get('lastMove'), now))]
+
+
+def lldp_rows(result, now):
+    for local_port, neighbors in sorted(result.get('lldpNeighbors', {}).items()):
+        info = neighbors.get('lldpNeighborInfo', [])
+        for neighbor in info:
+            remote = neighbor.get('neighborInterfaceInfo', {})
+            remote_port = remote.get('interfaceId_v2') or text(remote.get('interfaceId')).strip('"')
+            addresses = neighbor.get('managementAddresses') or [{}]
+            last_contact = neighbor.get('lastContactTime')
+            yield [text(neighbor.get('systemName')), text(neighbor.get('chassisId')),
+                   text(addresses[0].get('address')), text(neighbor.get('systemDescription')), remote_port,
+                   local_port, str(len(info)),
+                   '%d seconds' % max(now - last_contact, 0) if last_contact else '']
+
+
+def pim_neighbor_rows(result, now):
+    # per interface in the VRF output, or one flat {address: neighbor} of older EOS
+    interfaces = default_vrf(result, 'interfaces')
+    if interfaces:
+        neighbors = [(address, name, neighbor) for name, interface in interfaces.items()
+                     for address, neighbor in interface.get('neighbors', {}).items()]
+    else:
+        neighbors = [(address, neighbor.get('interface'), neighbor)
+                     for address, neighbor in result.get('neighbors', {}).items()]
+    for address, interface, neighbor in sorted(neighbors, key=lambda x: (x[0], text(x[1]))):
+        mode = neighbor.get('mode')
+        if isinstance(mode, dict):
+            mode = mode.get('mode')
+        expires = (neighbor.get('lastRefreshTime', 0) + neighbor['holdTime'] - now
+                   if 'holdTime' in neighbor else None)
+        yield [address, text(interface), since(neighbor.get('creationTime'), now), duration(expires),
+               text(mode).lower()]
+
+
+def pim_interface_rows(result, now):
+    for name, interface in sorted(default_vrf(result, 'interfaces').items()):
+        yield [text(interface.get('address')), name, text(interface.get('mode')).lower(),
+               text(interface.get('neighborCount')), text(interface.get('helloInterval')),
+               text(interface.get('drPriority')), text(interface.get('designatedRouter')),
+               text(interface.get('pktQueueLen')), text(interface.get('pktDropCount'))]
+
+
+def interface_status_rows(result, now):
+    for name, interface in sorted(result.get('interfaceStatuses', {}).items()):
+        vlan = interface.get('vlanInformation', {})
+        if vlan.get('interfaceMode') == 'routed' or vlan.get('interfaceForwardingModel') == 'routed':
+            vlan_text = 'routed'
+        elif vlan.get('interfaceMode') == 'trunk':
+            vlan_text = 'trunk'
+        else:
+            vlan_text = text(vlan.get('vlanId'))
+        bandwidth = interface.get('bandwidth')
+        speed = ('%dG' % (bandwidth // 1000000000) if bandwidth and bandwidth % 1000000000 == 0 else
+                 '%dM' % (bandwidth // 1000000) if bandwidth else 'auto')
+        yield [name, text(interface.get('description')), text(interface.get('linkStatus')), vlan_text,
+               DUPLEX.get(interface.get('duplex'), text(interface.get('duplex'))), speed,
+               text(interface.get('interfaceType'))]
+
+
+def ip_interface_rows(result, now):
+    for name, interface in sorted(result.get('interfaces', {}).items()):
+        address = interface.get('interfaceAddress', {})
+        # 'ipAddr' in recent EOS, 'primaryIp' before
+        ip = address.get('ipAddr') or address.get('primaryIp') or {}
+        yield [name, text(ip.get('address')), text(ip.get('maskLen')), text(interface.get('interfaceStatus')),
+               text(interface.get('lineProtocolStatus')), text(interface.get('mtu'))]
+
+
+# command --> (template columns, rows of its json)
+NORMALIZER = {
+    'show ip route': (ROUTE_COLUMN, route_rows),
+    'show ip bgp': (BGP_COLUMN, bgp_rows),
+    'show ip arp': (ARP_COLUMN, arp_rows),
+    'show mac address-table': (MAC_COLUMN, mac_rows),
+    'show lldp neighbors detail': (LLDP_COLUMN, lldp_rows),
+    'show ip pim neighbor': (PIM_NEIGHBOR_COLUMN, pim_neighbor_rows),
+    'show ip pim interface': (PIM_INTERFACE_COLUMN, pim_interface_rows),
+    'show interfaces status': (INTERFACE_STATUS_COLUMN, interface_status_rows),
+    'show ip interface brief': (IP_INTERFACE_COLUMN, ip_interface_rows),
+}
+
+
+def has_normalizer(command):
+    return command in NORMALIZER
+
+
+def normalize(command, result, now=None):
+    '''
+    return the table of the eAPI json result of command, None without a normalizer
+
+    ages and up times are counted up to now (epoch seconds, the current time by default)
+    '''
+    if command not in NORMALIZER:
+        return None
+    column, rows = NORMALIZER[command]
+    now = time.time() if now is None else now
+    return [list(column)] + list(rows(result, now)) + [['']]
+
+
+def normalize_result(r, now=None):
+    '''
+    turn one command result of a backup with eos json into a table in place, return True if it did
+    '''
+    if r.get('encoding') != 'json' or not isinstance(r.get('result'), dict):
+        return False
+    table = normalize(r['command'], r['result'], now)
+    if table is None:
+        return False
+    r['result'] = table
+    r['encoding'] = 'list'
+    r['parser'] = 'eos'
+    return True
+
+
+def normalize_snapshot(data, now=None):
+    '''
+    normalize every eos json result of a loaded backup in place
+    '''
+    for r in data:
+        normalize_result(r, now)
+    return data
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='flatten EOS json output into the template tables')
+    arg_parser.add_argument('file', help='backup json, or eAPI json of one command with --command')
+    arg_parser.add_argument('--command', help='the command the eAPI json file is the output of')
+    args = arg_parser.parse_args()
+
+    with open(args.file) as f:
+        data = json.load(f)
+    if args.command:
+        table = normalize(args.command, data)
+        if table is None:
+            print("no normalizer for %s, only %s" % (args.command, sorted(NORMALIZER)))
+            sys.exit(1)
+        json.dump(table, sys.stdout, indent=2)
+        print()
+    else:
+        for r in data:
+            if normalize_result(r):
+                print("%-30s %6d rows" % (r['command'], len(r['result']) - 2))
+            else:
+                print("%-30s %s" % (r['command'], r.get('encoding')))
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+'''
+External memory diff: snapshots stored sorted on the diff key, diffed as two streams
+
+diff_generic holds both tables, both grouped frames and the merged table at once,
+3-4x the snapshot size; the fastdiff engines still hold both tables. Here every
+parsed table of a snapshot is written once, sorted on the grouping columns of its
+diff config, as one json row per line:
+    <backup>.sorted/index.json      {command: {'column', 'grouping', 'overflow', 'file', 'rows'}}
+    <backup>.sorted/<n>.jsonl       the folded rows (difftable.table_rows) in key order
+and a diff reads the two files of a command line by line, groups rows on the fly
+and merge-joins the groups (fastdiff.group_sorted / merge_join / iter_classify),
+yielding each result as soon as it is known. Memory is the rows of one key per side,
+whatever the table size. Tables bigger than chunk_rows are sorted in sorted runs
+spilled to temporary files and merged, so writing the sorted files is bounded too
+(apart from the json.load of the backup itself); a stored file sorted on other
+columns than the current registry's grouping is re-sorted the same way, and the files
+of rows folded into another overflow column than the registry's are written again.
+
+Usage:
+    sort_snapshot('carcore3_backup_20170928005037.json')
+    for kind, row in stream_diff('carcore3_backup_20170928005037.json',
+                                 'carcore3_backup_20170928110800.json', 'show ip route'):
+        print(kind, row)
+
+    ./extdiff.py sort carcore3_backup_*.json
+    ./extdiff.py diff carcore3_backup_20170928005037.json carcore3_backup_20170928110800.json
+'''
+from __future__ import print_function
+
+import os
+import sys
+import json
+import heapq
+import argparse
+import tempfile
+
+from difftable import load_snapshot, table_rows, tuple_getter, overflow_pos
+from diffconfig import DiffRegistry, check_spec
+from fastdiff import group_sorted, merge_join, iter_classify, normalize_row
+
+CHUNK_ROWS = 200000
+SORTED_SUFFIX = '.sorted'
+
+
+def sorted_dir(snapshot):
+    return snapshot + SORTED_SUFFIX
+
+
+def read_rows(file_name):
+    with open(file_name) as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def write_rows(rows, file_name):
+    count = 0
+    with open(file_name, 'w') as f:
+        for row in rows:
+            f.write(json.dumps(row))
+            f.write('\n')
+            count += 1
+    return count
+
+
+def external_sort(rows, key_pos, chunk_rows=CHUNK_ROWS, tmp_dir=None):
+    '''
+    yield rows sorted on key_pos, holding at most chunk_rows of them in memory
+
+    full chunks are sorted and spilled to temporary files, which are merged at the end
+    '''
+    get_key = tuple_getter(key_pos)
+    runs = []
+    chunk = []
+    try:
+        for row in rows:
+            chunk.append(list(row))
+            if len(chunk) >= chunk_rows:
+                chunk.sort(key=get_key)
+                fd, run = tempfile.mkstemp(suffix='.jsonl', dir=tmp_dir)
+                os.close(fd)
+                runs.append(run)
+                write_rows(chunk, run)
+                chunk = []
+        chunk.sort(key=get_key)
+        if not runs:
+            for row in chunk:
+                yield row
+            return
+        streams = [read_rows(run) for run in runs] + [iter(chunk)]
+        for row in heapq.merge(*streams, key=get_key):
+            yield row
+    finally:
+        for run in runs:
+            os.remove(run)
+
+
+def key_columns(registry, command, column):
+    '''
+    return the grouping of command if its diff config fits the column schema, else None
+    '''
+    diff_conf = registry.get(command)
+    if not diff_conf or check_spec(command, column, diff_conf):
+        return None
+    return list(diff_conf['grouping'])
+
+
+def sort_snapshot(snapshot, registry=None, chunk_rows=CHUNK_ROWS):
+    '''
+    write the parsed tables of a backup json with a diff config as files sorted on their grouping
+    return the index {command: {'column', 'grouping', 'overflow', 'file', 'rows'}}
+    '''
+    registry = registry or DiffRegistry()
+    out_dir = sorted_dir(snapshot)
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+    data = load_snapshot(snapshot)
+    index = {}
+    for n, r in enumerate(data):
+        if r.get('encoding') != 'list':
+            continue
+        column = r['result'][0]
+        grouping = key_columns(registry, r['command'], column)
+        if grouping is None:
+            continue
+        name = '%d.jsonl' % n
+        rows = table_rows(r['result'], overflow_pos(r['command'], column, registry.config))
+        rows = external_sort(rows, [column.index(c) for c in grouping], chunk_rows, out_dir)
+        index[r['command']] = {'column': column, 'grouping': grouping,
+                               'overflow': registry.get(r['command']).get('overflow'), 'file': name,
+                               'rows': write_rows(rows, os.path.join(out_dir, name))}
+        # the loaded table is not needed any more
+        r['result'] = None
+    # the index goes last, it is what marks the sorted snapshot as complete
+    with open(os.path.join(out_dir, 'index.json'), 'w') as f:
+        json.dump(index, f, indent=2)
+    return index
+
+
+def load_index(snapshot, registry=None):
+    '''
+    return the index of the sorted files of a snapshot, sorting the snapshot first if needed
+    '''
+    registry = registry or DiffRegistry()
+    index_file = os.path.join(sorted_dir(snapshot), 'index.json')
+    if not os.path.exists(index_file) or os.path.getmtime(index_file) < os.path.getmtime(snapshot):
+        return sort_snapshot(snapshot, registry)
+    with open(index_file) as f:
+        index = json.load(f)
+    # the rows were folded for another overflow column (or before there was one)
+    if any(entry.get('overflow', '') != (registry.get(command) or {}).get('overflow')
+           for command, entry in index.items()):
+        return sort_snapshot(snapshot, registry)
+    return index
+
+
+def sorted_rows(snapshot, entry, grouping, chunk_rows=CHUNK_ROWS):
+    '''
+    stream the rows of one command, sorted on grouping
+    '''
+    rows = read_rows(os.path.join(sorted_dir(snapshot), entry['file']))
+    if entry['grouping'] == grouping:
+        return rows
+    column = entry['column']
+    return external_sort(rows, [column.index(c) for c in grouping], chunk_rows, sorted_dir(snapshot))
+
+
+def stream_diff(first, second, command, registry=None, chunk_rows=CHUNK_ROWS):
+    '''
+    yield ('new' / 'missing' / 'changed', merged row) of command between two snapshots, in key order
+
+    the rows are the ones sort_merge_diff returns (same row index too), 'new' being
+    the keys only in first as everywhere else
+    '''
+    registry = registry or DiffRegistry()
+    entry_1 = load_index(first, registry).get(command)
+    entry_2 = load_index(second, registry).get(command)
+    if entry_1 is None or entry_2 is None:
+        print("%s: not a sorted table of both snapshots" % command)
+        return
+    if entry_1['column'] != entry_2['column']:
+        print('Column Name is not matching for those two data:\n data 1:%s \n data 2: %s' %
+              (entry_1['column'], entry_2['column']))
+        return
+    spec = registry.compile(command, entry_1['column'])
+    if spec is None:
+        return
+    left = group_sorted(sorted_rows(first, entry_1, spec.grouping, chunk_rows), spec.key_pos, spec.value_pos)
+    right = group_sorted(sorted_rows(second, entry_2, spec.grouping, chunk_rows), spec.key_pos, spec.value_pos)
+    for result in iter_classify(merge_join(left, right), spec.check_pos, len(spec.value_pos)):
+        yield result
+
+
+def stream_diff_all(first, second, registry=None, chunk_rows=CHUNK_ROWS):
+    '''
+    yield (command, kind, merged row) of every command sorted in both snapshots
+    '''
+    registry = registry or DiffRegistry()
+    index_1 = load_index(first, registry)
+    index_2 = load_index(second, registry)
+    for command in sorted(set(index_1) & set(index_2)):
+        for kind, row in stream_diff(first, second, command, registry, chunk_rows):
+            yield command, kind, row
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='diff backups sorted on disk, with bounded memory')
+    sub_parser = arg_parser.add_subparsers(dest='action')
+    sub_parser.required = True
+    sort_parser = sub_parser.add_parser('sort', help='write the sorted tables of backups')
+    sort_parser.add_argument('snapshot', nargs='+')
+    diff_parser = sub_parser.add_parser('diff', help='stream the diff of two backups as json lines')
+    diff_parser.add_argument('first')
+    diff_parser.add_argument('second')
+    diff_parser.add_argument('--command', action='append', default=None, help='only these commands')
+    for p in (sort_parser, diff_parser):
+        p.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help='rows sorted in memory at once')
+    args = arg_parser.parse_args()
+
+    registry = DiffRegistry()
+    if args.action == 'sort':
+        for snapshot in args.snapshot:
+            index = sort_snapshot(snapshot, registry, args.chunk_rows)
+            print("%s: %d tables, %d rows" % (sorted_dir(snapshot), len(index),
+                                             sum(e['rows'] for e in index.values())))
+    else:
+        if args.command:
+            results = ((command, kind, row) for command in args.command
+                       for kind, row in stream_diff(args.first, args.second, command, registry, args.chunk_rows))
+        else:
+            results = stream_diff_all(args.first, args.second, registry, args.chunk_rows)
+        for command, kind, row in results:
+            sys.stdout.write(json.dumps({'command': command, 'kind': kind, 'row': normalize_row(row)}) + '\n')
@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+'''
+pandas free sort-merge / hash diff engine
+
+Drop-in for AristaStateDiff.diff_generic: takes the same two tables and diff_conf
+and returns the same {'new': [...], 'missing': [...], 'changed': [...]} with rows
+in the layout of the pandas merge
+    [row index, key columns..., value columns _L..., value columns _R..., DIFF_RESULT]
+where a value column holds the set of values of the group and NaN on the side the
+key is absent from. As in get_diffs, 'new' are the keys only in the first table
+('left_only') and 'missing' the keys only in the second one ('right_only').
+
+Both tables are sorted on the key tuple, grouped on the fly and walked once with a
+linear merge join; hash_diff does the same with dicts instead of sorting. A table is
+either the list of lists from the backup json or a NumPy structured array made by
+to_structured(), numpy is only imported for the latter.
+
+Usage:
+    diff = sort_merge_diff(data_1, data_2, {'grouping': ['NETWORK', 'MASK'],
+                                            'index': ['NETWORK', 'MASK'],
+                                            'check': ['NEXT_HOP', 'INTERFACE']})
+'''
+from __future__ import print_function
+
+import math
+
+from difftable import table_rows, group_rows, tuple_getter, gc_paused
+from diffconfig import DiffSpec, INDICATOR, compile_spec
+
+NAN = float('nan')
+
+
+def get_spec(column_1, column_2, diff_conf):
+    '''
+    check the two header rows match and return the DiffSpec of diff_conf for them
+
+    diff_conf is a DiffSpec already compiled for this header (nothing left to check)
+    or a plain diff handle config dict, compiled here
+    '''
+    if list(column_1) != list(column_2):
+        print('Column Name is not matching for those two data:\n data 1:%s \n data 2: %s' %
+              (column_1, column_2))
+        return None
+    if isinstance(diff_conf, DiffSpec) and list(diff_conf.column) == list(column_1):
+        spec = diff_conf
+    else:
+        if isinstance(diff_conf, DiffSpec):
+            diff_conf = diff_conf.config()
+        spec = compile_spec('', column_1, diff_conf)
+        if spec is None:
+            return None
+    if spec.grouping != spec.index:
+        print("grouping %s and index %s must be the same for this engine" % (spec.grouping, spec.index))
+        return None
+    return spec
+
+
+def diff_columns(column, diff_conf):
+    '''
+    header row of the merged table, with the leading '' diff_generic puts above the row index
+    '''
+    return DiffSpec('', column, diff_conf).merged_column
+
+
+def group_sorted(rows, key_pos, value_pos):
+    '''
+    yield (key, tuple of frozenset per value column) from rows already sorted on key_pos
+    '''
+    get_key = tuple_getter(key_pos)
+    get_value = tuple_getter(value_pos)
+    key = None
+    group = []
+    for row in rows:
+        k = get_key(row)
+        if k != key:
+            if group:
+                yield key, tuple([frozenset(v) for v in zip(*group)])
+            key = k
+            group = []
+        group.append(get_value(row))
+    if group:
+        yield key, tuple([frozenset(v) for v in zip(*group)])
+
+
+def merge_join(left, right):
+    '''
+    full outer merge join of two (key, values) iterators sorted on key
+    yield (key, left values or None, right values or None) in key order
+    '''
+    left = iter(left)
+    right = iter(right)
+    l = next(left, None)
+    r = next(right, None)
+    while l is not None or r is not None:
+        if r is None or (l is not None and l[0] < r[0]):
+            yield l[0], l[1], None
+            l = next(left, None)
+        elif l is None or r[0] < l[0]:
+            yield r[0], None, r[1]
+            r = next(right, None)
+        else:
+            yield l[0], l[1], r[1]
+            l = next(left, None)
+            r = next(right, None)
+
+
+def iter_classify(joined, check_pos, width):
+    '''
+    yield ('new' / 'missing' / 'changed', merged row) from the (key, left, right) stream of a join
+    '''
+    missing_side = (NAN,) * width
+    for i, (key, left, right) in enumerate(joined):
+        if right is None:
+            yield 'new', [i] + list(key) + [set(v) for v in left] + list(missing_side) + ['left_only']
+        elif left is None:
+            yield 'missing', [i] + list(key) + list(missing_side) + [set(v) for v in right] + ['right_only']
+        elif left != right and [left[p] for p in check_pos] != [right[p] for p in check_pos]:
+            yield 'changed', [i] + list(key) + [set(v) for v in left] + [set(v) for v in right] + ['both']
+
+
+def classify(joined, check_pos, width):
+    '''
+    turn the (key, left, right) stream of a join into the get_diffs result
+    '''
+    diff = {'new': [],
+            'missing': [],
+            'changed': [],
+            }
+    for kind, row in iter_classify(joined, check_pos, width):
+        diff[kind].append(row)
+    return diff
+
+
+def get_column(data):
+    '''
+    the column names of a list table or a structured array
+    '''
+    if hasattr(data, 'dtype'):
+        return list(data.dtype.names)
+    return list(data[0])
+
+
+def get_rows(data, overflow=None):
+    '''
+    the rows of a list table (folded into the overflow column) or a structured array
+    '''
+    if hasattr(data, 'dtype'):
+        return data
+    return list(table_rows(data, overflow))
+
+
+def sort_rows(rows, spec):
+    '''
+    sort rows of a list table or a structured array on the key columns of spec
+    structured arrays are sorted by numpy and handed back as a list of tuples
+    '''
+    if hasattr(rows, 'dtype'):
+        return rows[rows.argsort(order=spec.grouping, kind='mergesort')].tolist()
+    return sorted(rows, key=tuple_getter(spec.key_pos))
+
+
+def sort_merge_diff(data_1, data_2, diff_conf):
+    spec = get_spec(get_column(data_1), get_column(data_2), diff_conf)
+    if spec is None:
+        return None
+    rows_1 = get_rows(data_1, spec.overflow_pos)
+    rows_2 = get_rows(data_2, spec.overflow_pos)
+
+    with gc_paused():
+        left = group_sorted(sort_rows(rows_1, spec), spec.key_pos, spec.value_pos)
+        right = group_sorted(sort_rows(rows_2, spec), spec.key_pos, spec.value_pos)
+        return classify(merge_join(left, right), spec.check_pos, len(spec.value_pos))
+
+
+def hash_diff(data_1, data_2, diff_conf):
+    '''
+    same result as sort_merge_diff, grouping with dicts and only sorting the key union
+    '''
+    if hasattr(data_1, 'dtype'):
+        data_1 = [list(data_1.dtype.names)] + data_1.tolist()
+    if hasattr(data_2, 'dtype'):
+        data_2 = [list(data_2.dtype.names)] + data_2.tolist()
+    spec = get_spec(data_1[0], data_2[0], diff_conf)
+    if spec is None:
+        return None
+    grouped_1 = group_rows(table_rows(data_1, spec.overflow_pos), spec.key_pos, spec.value_pos)
+    grouped_2 = group_rows(table_rows(data_2, spec.overflow_pos), spec.key_pos, spec.value_pos)
+    keys = sorted(set(grouped_1).union(grouped_2))
+    joined = ((k, grouped_1.get(k), grouped_2.get(k)) for k in keys)
+    with gc_paused():
+        return classify(joined, spec.check_pos, len(spec.value_pos))
+
+
+def to_structured(data, overflow=None):
+    '''
+    convert a list table into a NumPy structured array with one unicode field per column
+    overflow is the position of the column the rows are folded into (DiffSpec.overflow_pos)
+    '''
+    import numpy as np
+    column = list(data[0])
+    rows = [tuple(row) for row in table_rows(data, overflow)]
+    width = [max([len(row[i]) for row in rows] or [1]) or 1 for i in range(len(column))]
+    dtype = [(c, 'U%d' % w) for c, w in zip(column, width)]
+    return np.array(rows, dtype=dtype)
+
+
+def normalize_diff(diff):
+    '''
+    make a diff comparable across engines: sets become sorted lists, NaN/None become None
+    '''
+    if diff is None:
+        return None
+    return dict((kind, [normalize_row(row) for row in rows]) for kind, rows in diff.items())
+
+
+def normalize_row(row):
+    '''
+    one merged row of a diff with sets as sorted lists and NaN/None as None, e.g. for json
+    '''
+    return [sorted(v) if isinstance(v, (set, frozenset)) else
+            None if v is None or (isinstance(v, float) and math.isnan(v)) else v
+            for v in row]
+
+
+def same_diff(diff_1, diff_2):
+    return normalize_diff(diff_1) == normalize_diff(diff_2)
+
+
+ENGINE = {'merge': sort_merge_diff,
+          'hash': hash_diff,
+          }
@@ -0,0 +1,364 @@
+#!/usr/bin/env python
+'''
+TextFSM with a fast path for the rule matching and the record building
+
+TextFSM checks a line by trying the regex of every rule of the current state in
+turn, then assigns every named group through _GetValue (a walk of the Value list)
+and AssignVar / option callbacks, and builds a record through more callbacks per
+Value. For a template such as arista_show_ip_route the regex match is a few percent
+of the parse, the rest is that per Value bookkeeping. FastTextFSM keeps the
+template, the states and the operations of TextFSM and only changes how a line
+reaches its rule and how the record is held:
+    - the rules of a state are joined in one alternation, each rule in its own
+      group with its named groups renamed, so one match finds the first rule
+      which matches (same order, same groups as the rule tried on its own), and
+      a Continue rule resumes with the alternation of the rules after it
+    - a rule starting with a literal character (after '^') can only match lines
+      starting with it, so the alternation tried on a line only has the rules
+      which can match its first character, and a line no rule can match costs
+      one dict lookup
+    - the current record is one list indexed by Value position and the group
+      numbers of every rule are resolved once, Filldown / Required handled inline
+The rules are never reordered (e.g. most recently matched first): two rules can
+match the same line with other actions, and TextFSM semantics is the first one.
+
+A template the fast path cannot follow exactly is left to TextFSM: a Value with
+an option other than Key, Required and Filldown (List, Fillup, custom option
+classes) turns it off for the whole template, a state with backreferences, global
+inline flags or conditional groups is matched rule by rule.
+
+Usage:
+    fsm = FastTextFSM(open('arista_show_ip_route.template'))
+    fsm.ParseText(text)                   # same records as textfsm.TextFSM
+
+    ./fastfsm.py arista_show_ip_route.template show_ip_route.txt   # check and time against TextFSM
+'''
+from __future__ import print_function
+
+import re
+import sys
+import time
+import argparse
+
+import textfsm
+
+FAST_OPTIONS = ('Key', 'Required', 'Filldown')
+LITERAL_END = set('*?{')
+SPECIAL = set('.^$*+?{}[]\\|()')
+
+
+def rename_groups(pattern, prefix):
+    '''
+    return (pattern with every (?P<name> renamed (?P<prefix + name>, True if it has a top level '|')
+
+    raise ValueError for what does not survive being put in an alternation:
+    backreferences, (?P=name), conditional groups, global inline flags
+    '''
+    result = []
+    depth = 0
+    alternation = False
+    i = 0
+    n = len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '\\':
+            if i + 1 < n and pattern[i + 1].isdigit():
+                raise ValueError('backreference')
+            result.append(pattern[i:i + 2])
+            i += 2
+            continue
+        if c == '[':
+            # a ']' first in the class (after an optional '^') is a literal
+            j = i + 1
+            if j < n and pattern[j] == '^':
+                j += 1
+            if j < n and pattern[j] == ']':
+                j += 1
+            while j < n and pattern[j] != ']':
+                j += 2 if pattern[j] == '\\' else 1
+            result.append(pattern[i:j + 1])
+            i = j + 1
+            continue
+        if c == '(':
+            depth += 1
+            if pattern.startswith('(?P<', i):
+                result.append('(?P<' + prefix)
+                i += 4
+                continue
+            if pattern.startswith('(?P=', i) or pattern.startswith('(?(', i):
+                raise ValueError('backreference')
+            if re.match(r'\(\?[aiLmsux-]+\)', pattern[i:]):
+                raise ValueError('global flag')
+        elif c == ')':
+            depth -= 1
+        elif c == '|' and depth == 0:
+            alternation = True
+        result.append(c)
+        i += 1
+    return ''.join(result), alternation
+
+
+def literal_prefix(pattern):
+    '''
+    the character every line matched by pattern starts with, '' if there is none
+    '''
+    try:
+        alternation = rename_groups(pattern, '')[1]
+    except ValueError:
+        return ''
+    if alternation:
+        return ''
+    i = 1 if pattern.startswith('^') else 0
+    if i >= len(pattern):
+        return ''
+    c = pattern[i]
+    if c == '\\':
+        # an escaped punctuation is a literal, \s \d \A ... are not
+        if i + 1 >= len(pattern) or pattern[i + 1].isalnum():
+            return ''
+        c = pattern[i + 1]
+        i += 1
+    elif c in SPECIAL:
+        return ''
+    if pattern[i + 1:i + 2] in LITERAL_END:
+        return ''
+    return c
+
+
+class FastRule(object):
+    '''
+    a TextFSM rule with the Value positions of its named groups and its operations resolved
+    '''
+    def __init__(self, rule, position, value_pos):
+        self.rule = rule
+        self.position = position
+        self.prefix = literal_prefix(rule.regex)
+        self.regex = rule.regex_obj.regex
+        assign = sorted((value_pos[name], group) for name, group in self.regex.groupindex.items()
+                        if name in value_pos)
+        # the Values assigned as runs of consecutive positions, each set as one slice of the record
+        self.runs = []
+        for pos, group in assign:
+            if self.runs and self.runs[-1][1] == pos:
+                self.runs[-1][1] += 1
+                self.runs[-1][2].append(group)
+            else:
+                self.runs.append([pos, pos + 1, [group]])
+        # the plain '-> Record' / '-> Next' rules, the others go through TextFSM._Operations
+        self.simple = rule.line_op in ('', 'Next') and rule.record_op in ('', 'NoRecord', 'Record')
+        self.record = rule.record_op == 'Record'
+
+    def action(self, offset):
+        '''
+        (rule, [(first Value position, end position, group numbers)]) of the rule wrapped at group offset of an alternation
+        '''
+        return (self, [(first, end, tuple(offset + group for group in groups)) for first, end, groups in self.runs])
+
+
+class FastState(object):
+    '''
+    the rules of one state and the alternations matching them, built as lines need them
+    '''
+    def __init__(self, rules, value_pos):
+        self.rules = [FastRule(rule, n, value_pos) for n, rule in enumerate(rules)]
+        self.prefixes = set(r.prefix for r in self.rules if r.prefix)
+        self.combined = True
+        for r in self.rules:
+            try:
+                rename_groups(r.rule.regex, 'g')
+            except ValueError:
+                self.combined = False
+        self.matchers = {}
+
+    def matcher(self, start, first):
+        '''
+        (match function, {group: action}) of the rules from start which can match a line
+        starting with first, None if there is none
+
+        with combined regexes the keys are the groups wrapping every alternative, else
+        the rules are tried one by one and the keys are their positions
+        '''
+        if first not in self.prefixes:
+            first = ''
+        key = (start, first)
+        if key in self.matchers:
+            return self.matchers[key]
+        candidates = [r for r in self.rules[start:] if not r.prefix or r.prefix == first]
+        result = None
+        if candidates and self.combined:
+            patterns = []
+            actions = {}
+            group = 1
+            for r in candidates:
+                patterns.append('(%s)' % rename_groups(r.rule.regex, 'g%d_' % r.position)[0])
+                actions[group] = r.action(group)
+                group += 1 + r.regex.groups
+            try:
+                result = (re.compile('|'.join(patterns)).match, actions)
+            except (re.error, OverflowError, AssertionError):
+                self.combined = False
+        if candidates and not self.combined:
+            result = (self.match_rules(candidates), dict((r.position, r.action(0)) for r in candidates))
+        self.matchers[key] = result
+        return result
+
+    @staticmethod
+    def match_rules(candidates):
+        def match(line):
+            for r in candidates:
+                m = r.regex.match(line)
+                if m is not None:
+                    return RuleMatch(m, r.position)
+            return None
+        return match
+
+
+class RuleMatch(object):
+    '''
+    the match of one rule tried on its own, with lastindex giving the rule like an alternation
+    '''
+    __slots__ = ('group', 'lastindex')
+
+    def __init__(self, m, position):
+        self.group = m.group
+        self.lastindex = position
+
+
+def fast_values(fsm):
+    '''
+    True if every Value only has options the fast record handles exactly
+    '''
+    options = textfsm.TextFSMOptions
+    for value in fsm.values:
+        for option in value.options:
+            if option.name not in FAST_OPTIONS or type(option) is not getattr(options, option.name):
+                return False
+    return bool(fsm.values)
+
+
+class FastTextFSM(textfsm.TextFSM):
+    '''
+    textfsm.TextFSM giving the same records and errors, with the matching and records of the module docstring
+    '''
+    def __init__(self, template, options_class=textfsm.TextFSMOptions):
+        # TextFSM.__init__ calls Reset, which builds the fast states once the template is parsed
+        self._fast = None
+        super(FastTextFSM, self).__init__(template, options_class)
+
+    def _build(self):
+        self._fast = False
+        if not fast_values(self):
+            return
+        value_pos = dict((value.name, n) for n, value in enumerate(self.values))
+        self._fast_states = dict((name, FastState(rules, value_pos)) for name, rules in self.states.items())
+        self._required = [n for n, value in enumerate(self.values) if 'Required' in value.OptionNames()]
+        # a Filldown value keeps its last assigned value on Clear, the others go back to None
+        self._cleared = [n for n, value in enumerate(self.values) if 'Filldown' not in value.OptionNames()]
+        self._filldown = len(self._cleared) < len(self.values)
+        self._blank = [None] * len(self.values)
+        self._record = list(self._blank)
+        self._fast = True
+
+    def Reset(self):
+        if self._fast is None:
+            self._build()
+        if self._fast:
+            self._fast_state = self._fast_states['Start']
+        super(FastTextFSM, self).Reset()
+
+    def _CheckLine(self, line):
+        if not self._fast:
+            return super(FastTextFSM, self)._CheckLine(line)
+        record = self._record
+        state = self._fast_state
+        key = (0, line[:1] if line[:1] in state.prefixes else '')
+        while True:
+            found = state.matchers[key] if key in state.matchers else state.matcher(*key)
+            if found is None:
+                return
+            m = found[0](line)
+            if m is None:
+                return
+            # the alternative which matched is the last group closed
+            r, runs = found[1][m.lastindex]
+            for pos, end, groups in runs:
+                if end - pos > 1:
+                    record[pos:end] = m.group(*groups)
+                else:
+                    record[pos] = m.group(groups[0])
+            rule = r.rule
+            if r.simple:
+                if r.record:
+                    self._AppendRecord()
+            elif not self._Operations(rule, line):
+                # Continue, the rules after this one are checked on the same line
+                key = (r.position + 1, key[1])
+                continue
+            if rule.new_state:
+                if rule.new_state not in ('End', 'EOF'):
+                    self._cur_state = self.states[rule.new_state]
+                    self._fast_state = self._fast_states[rule.new_state]
+                self._cur_state_name = rule.new_state
+            return
+
+    def _AppendRecord(self):
+        if not self._fast:
+            return super(FastTextFSM, self)._AppendRecord()
+        record = self._record
+        for pos in self._required:
+            if not record[pos]:
+                self._ClearRecord()
+                return
+        if record.count(None) == len(record):
+            return
+        self._result.append(['' if v is None else v for v in record] if None in record else record[:])
+        self._ClearRecord()
+
+    def _ClearRecord(self):
+        if not self._fast:
+            return super(FastTextFSM, self)._ClearRecord()
+        if self._filldown:
+            record = self._record
+            for pos in self._cleared:
+                record[pos] = None
+        else:
+            self._record[:] = self._blank
+
+    def _ClearAllRecord(self):
+        if not self._fast:
+            return super(FastTextFSM, self)._ClearAllRecord()
+        self._record[:] = self._blank
+
+
+def verify(template_file, text):
+    '''
+    parse text with textfsm.TextFSM and FastTextFSM, return (same records and error, stock seconds, fast seconds)
+    '''
+    results = []
+    for fsm_class in (textfsm.TextFSM, FastTextFSM):
+        with open(template_file) as f:
+            fsm = fsm_class(f)
+        start = time.time()
+        try:
+            result = fsm.ParseText(text)
+        except textfsm.TextFSMError as e:
+            result = ('error', str(e))
+        results.append((result, time.time() - start))
+    return results[0][0] == results[1][0], results[0][1], results[1][1]
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='check and time FastTextFSM against textfsm.TextFSM')
+    arg_parser.add_argument('template')
+    arg_parser.add_argument('text', nargs='+')
+    args = arg_parser.parse_args()
+
+    failed = 0
+    for text_file in args.text:
+        with open(text_file) as f:
+            text = f.read()
+        same, stock, fast = verify(args.template, text)
+        failed += not same
+        print("%-50s same: %-5s TextFSM %.3fs, fast %.3fs, %.1fx" %
+              (text_file, same, stock, fast, stock / fast if fast else 0))
+    sys.exit(1 if failed else 0)
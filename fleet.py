@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+'''
+Fleet wide change analytics over the before/after snapshots of many devices
+
+AristaStateDiff answers "what changed on this switch". After a change touching the
+whole fleet the questions are across devices:
+    which switches lost routes, and which prefixes are gone from where
+    which MACs moved to another device or port
+    which LLDP adjacencies between our own switches are not seen from both ends
+Rather than running N pairwise diffs, the before and after snapshot of every device
+are loaded in parallel (one process per snapshot, only the columns used below are
+sent back) into one long table per command with a device and a side column, and the
+questions are answered with pandas joins / group-bys over the whole fleet at once.
+
+Snapshots are found by their backup file name <device>_backup_<YYYYmmddHHMMSS>.json.
+For every device 'after' is the newest snapshot (or the newest one at or before
+--after) and 'before' the newest one at or before --before (or the one preceding 'after').
+
+Usage:
+    fleet = Fleet.from_dir('/backup', before='20170928000000')
+    fleet.lost_routes()
+    fleet.mac_moves()
+    fleet.lldp_asymmetry()
+    ./fleet.py /backup --before 20170928000000 --query lost-routes
+'''
+from __future__ import print_function
+
+import os
+import glob
+import argparse
+
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from difftable import load_snapshot, table_rows, backup_name, overflow_pos
+
+SIDE = ('before', 'after')
+
+ROUTE_COMMAND = 'show ip route'
+MAC_COMMAND = 'show mac address-table'
+LLDP_COMMAND = 'show lldp neighbors detail'
+# the columns kept of every command, the rest never leaves the loading process
+FLEET_COLUMNS = {ROUTE_COMMAND: ['NETWORK', 'MASK', 'NEXT_HOP', 'INTERFACE'],
+                 MAC_COMMAND: ['MAC_ADDRESS', 'VLAN', 'DESTINATION_PORT', 'TYPE'],
+                 LLDP_COMMAND: ['LOCAL_PORT', 'DEST_HOST', 'REMOTE_PORT'],
+                 }
+# long interface names of LLDP to the short ones of the mac address-table
+INTERFACE_ABBREVIATION = [('Ethernet', 'Et'), ('Port-Channel', 'Po')]
+
+
+def find_snapshots(paths):
+    '''
+    return {device: [(timestamp, file name), ...] oldest first} of the backup json files
+    paths are files or directories, a directory is searched for *_backup_*.json
+    '''
+    result = {}
+    for path in paths:
+        files = glob.glob(os.path.join(path, '*_backup_*.json')) if os.path.isdir(path) else [path]
+        for file_name in files:
+            name = backup_name(file_name)
+            if name and os.path.getsize(file_name):
+                result.setdefault(name[0], []).append((name[1], file_name))
+    for snapshots in result.values():
+        snapshots.sort()
+    return result
+
+
+def pick_pair(snapshots, before=None, after=None):
+    '''
+    return (before file, after file) of one device, None if it has no such pair
+    '''
+    after_list = [s for s in snapshots if after is None or s[0] <= after]
+    if not after_list:
+        return None
+    after_snapshot = after_list[-1]
+    if before is None:
+        before_list = [s for s in snapshots if s[0] < after_snapshot[0]]
+    else:
+        before_list = [s for s in snapshots if s[0] <= before and s[0] < after_snapshot[0]]
+    if not before_list:
+        return None
+    return before_list[-1][1], after_snapshot[1]
+
+
+def load_tables(file_name, fleet_columns=FLEET_COLUMNS):
+    '''
+    return {command: rows of the fleet_columns} of one snapshot, run in a worker process
+    '''
+    result = {}
+    for r in load_snapshot(file_name):
+        columns = fleet_columns.get(r['command'])
+        if not columns or r.get('encoding') != 'list':
+            continue
+        header = r['result'][0]
+        if not set(columns).issubset(header):
+            print("%s: %s columns %s not in %s, skip it" % (file_name, r['command'], columns, header))
+            continue
+        pos = [header.index(c) for c in columns]
+        result[r['command']] = [[row[i] for i in pos] for row in table_rows(r['result'], overflow_pos(r['command'], header))]
+    return result
+
+
+def short_hostname(name):
+    return name.split('.')[0]
+
+
+def short_interface(name):
+    for long_name, short_name in INTERFACE_ABBREVIATION:
+        if name.startswith(long_name):
+            return short_name + name[len(long_name):]
+    return name
+
+
+class Fleet(object):
+    '''
+    self.pairs --> {device: (before file, after file)}
+    self.tables --> {command: DataFrame of FLEET_COLUMNS plus 'device' and 'side'}
+    '''
+    def __init__(self, pairs, workers=None):
+        self.pairs = pairs
+        self.workers = workers
+        self.tables = {}
+        self.load()
+
+    @classmethod
+    def from_dir(cls, paths, before=None, after=None, workers=None):
+        if isinstance(paths, str):
+            paths = [paths]
+        pairs = {}
+        for device, snapshots in sorted(find_snapshots(paths).items()):
+            pair = pick_pair(snapshots, before, after)
+            if pair:
+                pairs[device] = pair
+            else:
+                print("%s: no before/after pair of snapshots, skip it" % device)
+        return cls(pairs, workers=workers)
+
+    def load(self):
+        jobs = [(device, side, self.pairs[device][i]) for device in sorted(self.pairs) for i, side in enumerate(SIDE)]
+        frames = dict((command, []) for command in FLEET_COLUMNS)
+        with ProcessPoolExecutor(self.workers) as executor:
+            loaded = executor.map(load_tables, [job[2] for job in jobs])
+            for (device, side, _), tables in zip(jobs, loaded):
+                for command, rows in tables.items():
+                    frame = pd.DataFrame(rows, columns=FLEET_COLUMNS[command])
+                    frame['device'] = device
+                    frame['side'] = side
+                    frames[command].append(frame)
+        for command, columns in FLEET_COLUMNS.items():
+            if frames[command]:
+                table = pd.concat(frames[command], ignore_index=True)
+            else:
+                table = pd.DataFrame(columns=columns + ['device', 'side'])
+            table['device'] = table['device'].astype('category')
+            table['side'] = table['side'].astype('category')
+            self.tables[command] = table
+
+    def side(self, command, side):
+        table = self.tables[command]
+        return table[table['side'] == side].drop(columns='side')
+
+    def prefix_index(self, side='after'):
+        '''
+        return DataFrame NETWORK, MASK --> DEVICES (frozenset of devices carrying the prefix)
+        '''
+        routes = self.side(ROUTE_COMMAND, side)[['NETWORK', 'MASK', 'device']].drop_duplicates()
+        index = routes.groupby(['NETWORK', 'MASK'], observed=True)['device'].agg(lambda d: frozenset(d.astype(str)))
+        return index.rename('DEVICES').reset_index()
+
+    def mac_index(self, side='after', edge_only=False):
+        '''
+        return DataFrame MAC_ADDRESS, VLAN, device, DESTINATION_PORT of every MAC of the fleet
+        with edge_only the ports facing another switch of the fleet (per LLDP) are left out
+        '''
+        macs = self.side(MAC_COMMAND, side)[['MAC_ADDRESS', 'VLAN', 'device', 'DESTINATION_PORT']]
+        if edge_only:
+            infra = self.infra_ports()
+            macs = macs.merge(infra, how='left', on=['device', 'DESTINATION_PORT'], indicator=True)
+            macs = macs[macs['_merge'] == 'left_only'].drop(columns='_merge')
+        return macs.drop_duplicates().reset_index(drop=True)
+
+    def lldp_edges(self, side='after'):
+        '''
+        return DataFrame device, LOCAL_PORT, NEIGHBOR, REMOTE_PORT of the adjacencies between fleet devices
+        '''
+        lldp = self.side(LLDP_COMMAND, side)
+        edges = pd.DataFrame({'device': lldp['device'].astype(str),
+                              'LOCAL_PORT': lldp['LOCAL_PORT'],
+                              'NEIGHBOR': lldp['DEST_HOST'].map(short_hostname),
+                              'REMOTE_PORT': lldp['REMOTE_PORT']})
+        return edges[edges['NEIGHBOR'].isin(self.pairs)].drop_duplicates().reset_index(drop=True)
+
+    def infra_ports(self):
+        '''
+        return DataFrame device, DESTINATION_PORT of the ports with a fleet device behind them, either side
+        '''
+        edges = pd.concat([self.lldp_edges(side) for side in SIDE])
+        infra = pd.DataFrame({'device': edges['device'],
+                              'DESTINATION_PORT': edges['LOCAL_PORT'].map(short_interface)})
+        infra['device'] = infra['device'].astype(self.tables[MAC_COMMAND]['device'].dtype)
+        return infra.drop_duplicates()
+
+    def lost_routes(self):
+        '''
+        return DataFrame device, NETWORK, MASK of the prefixes a device had before and not after
+        '''
+        before = self.side(ROUTE_COMMAND, 'before')[['device', 'NETWORK', 'MASK']].drop_duplicates()
+        after = self.side(ROUTE_COMMAND, 'after')[['device', 'NETWORK', 'MASK']].drop_duplicates()
+        joined = before.merge(after, how='left', on=['device', 'NETWORK', 'MASK'], indicator=True)
+        lost = joined[joined['_merge'] == 'left_only'].drop(columns='_merge')
+        return lost.sort_values(['device', 'NETWORK', 'MASK']).reset_index(drop=True)
+
+    def lost_routes_by_device(self):
+        '''
+        return Series device --> number of prefixes lost, devices which lost nothing left out
+        '''
+        counts = self.lost_routes().groupby('device', observed=True).size()
+        return counts[counts > 0].sort_values(ascending=False)
+
+    def lost_prefixes(self):
+        '''
+        return DataFrame NETWORK, MASK, DEVICES_before, DEVICES_after of the prefixes carried by fewer devices
+        '''
+        joined = self.prefix_index('before').merge(self.prefix_index('after'), how='left', on=['NETWORK', 'MASK'],
+                                                    suffixes=['_before', '_after'])
+        joined['DEVICES_after'] = joined['DEVICES_after'].map(lambda d: d if isinstance(d, frozenset) else frozenset())
+        shrunk = joined['DEVICES_before'].map(len) > joined['DEVICES_after'].map(len)
+        return joined[shrunk].reset_index(drop=True)
+
+    def mac_moves(self, edge_only=False):
+        '''
+        return DataFrame MAC_ADDRESS, VLAN, LOCATION_before, LOCATION_after of the MACs seen on both
+        sides whose set of 'device:port' locations changed
+        '''
+        location = {}
+        for side in SIDE:
+            macs = self.mac_index(side, edge_only=edge_only)
+            macs = macs.assign(LOCATION=macs['device'].astype(str) + ':' + macs['DESTINATION_PORT'])
+            location[side] = macs.groupby(['MAC_ADDRESS', 'VLAN'])['LOCATION'].agg(frozenset).reset_index()
+        joined = location['before'].merge(location['after'], how='inner', on=['MAC_ADDRESS', 'VLAN'],
+                                          suffixes=['_before', '_after'])
+        moved = joined['LOCATION_before'] != joined['LOCATION_after']
+        return joined[moved].sort_values(['MAC_ADDRESS', 'VLAN']).reset_index(drop=True)
+
+    def lldp_asymmetry(self, side='after'):
+        '''
+        return DataFrame device, LOCAL_PORT, NEIGHBOR, REMOTE_PORT of the adjacencies between fleet
+        devices the neighbor does not report back on the same pair of ports
+        '''
+        edges = self.lldp_edges(side)
+        reverse = edges.rename(columns={'device': 'NEIGHBOR', 'NEIGHBOR': 'device',
+                                        'LOCAL_PORT': 'REMOTE_PORT', 'REMOTE_PORT': 'LOCAL_PORT'})
+        joined = edges.merge(reverse, how='left', on=['device', 'LOCAL_PORT', 'NEIGHBOR', 'REMOTE_PORT'],
+                             indicator=True)
+        return joined[joined['_merge'] == 'left_only'].drop(columns='_merge').reset_index(drop=True)
+
+
+QUERY = {'lost-routes': lambda fleet, args: fleet.lost_routes(),
+         'lost-routes-by-device': lambda fleet, args: fleet.lost_routes_by_device(),
+         'lost-prefixes': lambda fleet, args: fleet.lost_prefixes(),
+         'mac-moves': lambda fleet, args: fleet.mac_moves(edge_only=args.edge_only),
+         'lldp-asymmetry': lambda fleet, args: fleet.lldp_asymmetry(),
+         }
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='fleet wide change analytics over backup snapshots')
+    arg_parser.add_argument('path', nargs='+', help='backup json files or directories holding them')
+    arg_parser.add_argument('--before', default=None, help='YYYYmmddHHMMSS, newest snapshot at or before it')
+    arg_parser.add_argument('--after', default=None, help='YYYYmmddHHMMSS, newest snapshot at or before it')
+    arg_parser.add_argument('--workers', type=int, default=None, help='loading processes, default cpu count')
+    arg_parser.add_argument('--query', action='append', choices=sorted(QUERY), default=None)
+    arg_parser.add_argument('--edge-only', action='store_true', help='ignore MACs learnt from fleet devices')
+    args = arg_parser.parse_args()
+
+    fleet = Fleet.from_dir(args.path, before=args.before, after=args.after, workers=args.workers)
+    for device in sorted(fleet.pairs):
+        print("%s: %s -> %s" % ((device,) + fleet.pairs[device]))
+    with pd.option_context('display.width', 200, 'display.max_rows', 200, 'display.max_colwidth', 80):
+        for query in args.query or sorted(QUERY):
+            print("\n===== %s =====" % query)
+            print(QUERY[query](fleet, args))
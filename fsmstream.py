@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+'''
+Line streaming TextFSM runner
+
+ParseCmd / ParseText take the whole section as one string, split it into a list of
+lines and return every record at the end, so a multi hundred MB 'show ip bgp' is
+held as the string, its line list and the full result at the same time. iter_records
+feeds a TextFSM the lines of an iterator one at a time (e.g. a section of
+cliparser.iter_section_lines, or an open file) and yields every record as soon as
+the FSM appends it, so memory stays at one line plus one record.
+
+The records and the errors are the ones of ParseText:
+    - the same rules on the same lines (each line is split with splitlines() like
+      the whole text would have been, and checked as ParseText checks it)
+    - nothing more is read once the FSM reaches End / EOF, the implicit EOF record
+      is appended as ParseText(eof=True) does
+    - a TextFSMError is raised where ParseText would raise it, the records before
+      it having been yielded already
+A template with a Fillup value changes records already appended when a later line
+sets the value, so those records are only handed out at the end.
+
+Usage:
+    fsm = textfsm.TextFSM(open('arista_show_ip_route.template'))
+    with open('show_ip_route.txt') as f:
+        for record in iter_records(fsm, f):
+            print(record)
+
+    ./fsmstream.py arista_show_ip_route.template show_ip_route.txt    # check against ParseText
+'''
+from __future__ import print_function
+
+import sys
+import time
+import argparse
+
+
+def has_fillup(fsm):
+    return any('Fillup' in value.OptionNames() for value in fsm.values)
+
+
+def iter_records(fsm, lines):
+    '''
+    yield the records TextFSM fsm finds in lines, as ParseText would return them
+
+    the fsm is Reset() first, so a compiled template can be reused for every section
+    '''
+    fsm.Reset()
+    hold = has_fillup(fsm)
+    check_line = fsm._CheckLine
+    for line in lines:
+        # what ParseText(line, eof=False) does, without a call and a list per line
+        for part in line.splitlines():
+            check_line(part)
+            if fsm._cur_state_name in ('End', 'EOF'):
+                break
+        if fsm._result and not hold:
+            records, fsm._result = fsm._result, []
+            for record in records:
+                yield record
+        if fsm._cur_state_name in ('End', 'EOF'):
+            break
+    # no line left, only the implicit EOF record of a whole ParseText
+    records = fsm.ParseText('', eof=True)
+    fsm._result = []
+    for record in records:
+        yield record
+
+
+if __name__ == '__main__':
+    import textfsm
+
+    arg_parser = argparse.ArgumentParser(description='check iter_records against TextFSM ParseText')
+    arg_parser.add_argument('template')
+    arg_parser.add_argument('text')
+    args = arg_parser.parse_args()
+
+    with open(args.template) as f:
+        fsm = textfsm.TextFSM(f)
+    start = time.time()
+    with open(args.text) as f:
+        streamed = list(iter_records(fsm, f))
+    stream_time = time.time() - start
+    start = time.time()
+    with open(args.text) as f:
+        fsm.Reset()
+        expected = fsm.ParseText(f.read())
+    print("%d records, streamed %.3fs, ParseText %.3fs, same: %s" %
+          (len(expected), stream_time, time.time() - start, streamed == expected))
+    sys.exit(0 if streamed == expected else 1)
@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+'''
+Time-series history of every diff key of a device over many snapshots
+
+Ingesting a sequence of backups builds, per device / command / diff key (prefix,
+MAC, ARP entry, neighbor ... see diff_config.json), the intervals during which the
+key was present with the same check column values:
+    [start, end)    start = timestamp of the first snapshot it was seen with these values
+                    end   = timestamp of the first snapshot it was gone or had other
+                            values, NULL while it is still there
+The intervals live in a sqlite database, so point-in-time and range queries never
+read the raw snapshots again. Only the open intervals of a device are compared with
+a new snapshot, so adding one is an incremental update; snapshots of a device have
+to be ingested in time order.
+
+Usage:
+    history = History('carcore3.history')
+    history.ingest('carcore3_backup_20170928005037.json')
+    history.key_history('carcore3', 'show ip route', ['10.2.242.0', '26'])
+    history.at('carcore3', 'show ip route', '20170928010000')
+
+    ./history.py --db carcore3.history ingest carcore3_backup_*.json
+    ./history.py --db carcore3.history key carcore3 'show ip route' 10.2.242.0 26
+    ./history.py --db carcore3.history at carcore3 'show ip route' 20170928010000
+    ./history.py --db carcore3.history range carcore3 'show ip route' 20170928000000 20170929000000
+'''
+from __future__ import print_function
+
+import json
+import pprint
+import sqlite3
+import argparse
+
+from difftable import load_snapshot, stripped_rows, stripped_column, group_rows, backup_name
+from diffconfig import DiffRegistry
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS snapshot (
+    device TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    file TEXT,
+    PRIMARY KEY (device, timestamp)
+);
+CREATE TABLE IF NOT EXISTS columns (
+    device TEXT NOT NULL,
+    command TEXT NOT NULL,
+    key_column TEXT NOT NULL,
+    check_column TEXT NOT NULL,
+    PRIMARY KEY (device, command)
+);
+CREATE TABLE IF NOT EXISTS interval (
+    device TEXT NOT NULL,
+    command TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    start_ts TEXT NOT NULL,
+    end_ts TEXT
+);
+CREATE INDEX IF NOT EXISTS interval_key ON interval (device, command, key, start_ts);
+CREATE INDEX IF NOT EXISTS interval_time ON interval (device, command, start_ts, end_ts);
+CREATE INDEX IF NOT EXISTS interval_open ON interval (device, command, end_ts);
+'''
+
+
+def encode(values):
+    '''
+    key tuple or tuple of value sets to the json text stored in the database
+    '''
+    return json.dumps([sorted(v) if isinstance(v, (set, frozenset)) else v for v in values])
+
+
+class History(object):
+    def __init__(self, db_file, registry=None):
+        self.db_file = db_file
+        self.registry = registry or DiffRegistry()
+        self.db = sqlite3.connect(db_file)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def last_timestamp(self, device):
+        row = self.db.execute('SELECT MAX(timestamp) FROM snapshot WHERE device = ?', (device,)).fetchone()
+        return row[0]
+
+    def ingest(self, snapshot, device=None, timestamp=None):
+        '''
+        add one snapshot, device and timestamp default to the ones in the backup file name
+        return False (and say why) if it is not newer than the last snapshot of the device or
+        has no table to take, in which case it is not recorded and can be ingested again
+
+        column names and values are stripped (difftable.stripped_rows), the older backups
+        split on ',' keep the ' ' after it
+        '''
+        if device is None or timestamp is None:
+            name = backup_name(snapshot)
+            if not name:
+                print("%s: not a <device>_backup_<timestamp>.json name, give device and timestamp" % snapshot)
+                return False
+            device = device or name[0]
+            timestamp = timestamp or name[1]
+        last = self.last_timestamp(device)
+        if last is not None and timestamp <= last:
+            print("%s: %s is not newer than %s, skip it" % (device, timestamp, last))
+            return False
+
+        try:
+            data = load_snapshot(snapshot)
+        except ValueError as e:
+            print("%s: can't load it (%s), skip it" % (snapshot, e))
+            return False
+
+        tables = []
+        for r in data:
+            command = r['command']
+            if r.get('encoding') != 'list' or not self.registry.get(command):
+                continue
+            spec = self.registry.compile(command, stripped_column(r['result']))
+            if spec is None:
+                continue
+            grouped = group_rows(stripped_rows(r['result'], spec.overflow_pos), spec.key_pos, spec.value_pos)
+            current = dict((encode(key), encode([values[p] for p in spec.check_pos]))
+                           for key, values in grouped.items())
+            tables.append((command, spec, current))
+        if not tables:
+            print("%s: no table of the diff config in it, skip it" % snapshot)
+            return False
+
+        with self.db:
+            self.db.execute('INSERT INTO snapshot VALUES (?, ?, ?)',
+                            (device, timestamp, snapshot if isinstance(snapshot, str) else None))
+            for command, spec, current in tables:
+                self.db.execute('INSERT OR REPLACE INTO columns VALUES (?, ?, ?, ?)',
+                                (device, command, json.dumps(spec.grouping), json.dumps(spec.check)))
+                self.update(device, command, timestamp, current)
+        return True
+
+    def update(self, device, command, timestamp, current):
+        '''
+        close the open intervals which are gone or changed in current {key: value}, open the new ones
+        '''
+        open_interval = self.db.execute('SELECT rowid, key, value FROM interval '
+                                        'WHERE device = ? AND command = ? AND end_ts IS NULL', (device, command))
+        closed = []
+        kept = set()
+        for rowid, key, value in open_interval:
+            if current.get(key) == value:
+                kept.add(key)
+            else:
+                closed.append((timestamp, rowid))
+        self.db.executemany('UPDATE interval SET end_ts = ? WHERE rowid = ?', closed)
+        self.db.executemany('INSERT INTO interval VALUES (?, ?, ?, ?, ?, NULL)',
+                            ((device, command, key, value, timestamp)
+                             for key, value in current.items() if key not in kept))
+
+    def devices(self):
+        return [row[0] for row in self.db.execute('SELECT DISTINCT device FROM snapshot ORDER BY device')]
+
+    def snapshots(self, device):
+        return self.db.execute('SELECT timestamp, file FROM snapshot WHERE device = ? ORDER BY timestamp',
+                               (device,)).fetchall()
+
+    def columns(self, device, command):
+        '''
+        return (key columns, check columns) of a command
+        '''
+        row = self.db.execute('SELECT key_column, check_column FROM columns WHERE device = ? AND command = ?',
+                              (device, command)).fetchone()
+        return (json.loads(row[0]), json.loads(row[1])) if row else (None, None)
+
+    def at(self, device, command, timestamp):
+        '''
+        return {key tuple: check values} of the command as of the last snapshot at or before timestamp
+        '''
+        rows = self.db.execute('SELECT key, value FROM interval WHERE device = ? AND command = ? '
+                               'AND start_ts <= ? AND (end_ts IS NULL OR end_ts > ?)',
+                               (device, command, timestamp, timestamp))
+        return dict((tuple(json.loads(key)), json.loads(value)) for key, value in rows)
+
+    def range(self, device, command, start, end):
+        '''
+        return [(key tuple, check values, start, end)] of the intervals overlapping [start, end)
+        '''
+        rows = self.db.execute('SELECT key, value, start_ts, end_ts FROM interval WHERE device = ? AND command = ? '
+                               'AND start_ts < ? AND (end_ts IS NULL OR end_ts > ?) ORDER BY key, start_ts',
+                               (device, command, end, start))
+        return [(tuple(json.loads(k)), json.loads(v), s, e) for k, v, s, e in rows]
+
+    def changes(self, device, command, start, end):
+        '''
+        return [(key tuple, check values, start, end)] of the intervals opened or closed within [start, end)
+        '''
+        rows = self.db.execute('SELECT key, value, start_ts, end_ts FROM interval WHERE device = ? AND command = ? '
+                               'AND ((start_ts >= ? AND start_ts < ?) OR (end_ts >= ? AND end_ts < ?)) ORDER BY key, start_ts',
+                               (device, command, start, end, start, end))
+        return [(tuple(json.loads(k)), json.loads(v), s, e) for k, v, s, e in rows]
+
+    def key_history(self, device, command, key):
+        '''
+        return [(check values, start, end)] of one key, oldest first
+        '''
+        rows = self.db.execute('SELECT value, start_ts, end_ts FROM interval WHERE device = ? AND command = ? '
+                               'AND key = ? ORDER BY start_ts', (device, command, encode(key)))
+        return [(json.loads(v), s, e) for v, s, e in rows]
+
+    def first_gone(self, device, command, key):
+        '''
+        return the timestamp of the first snapshot the key was missing from after being seen, None if never
+        '''
+        history = self.key_history(device, command, key)
+        for (_, _, end), following in zip(history, history[1:] + [None]):
+            if end is not None and (following is None or following[1] != end):
+                return end
+        return None
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='history of every diff key over many snapshots')
+    arg_parser.add_argument('--db', required=True, help='sqlite history database')
+    sub_parser = arg_parser.add_subparsers(dest='query')
+    sub_parser.required = True
+    ingest = sub_parser.add_parser('ingest', help='add snapshots, oldest first')
+    ingest.add_argument('snapshot', nargs='+')
+    key = sub_parser.add_parser('key', help='intervals of one key')
+    key.add_argument('device')
+    key.add_argument('command')
+    key.add_argument('key', nargs='+', help='values of the key columns')
+    at = sub_parser.add_parser('at', help='table as of a timestamp')
+    at.add_argument('device')
+    at.add_argument('command')
+    at.add_argument('timestamp')
+    time_range = sub_parser.add_parser('range', help='intervals overlapping [start, end)')
+    time_range.add_argument('device')
+    time_range.add_argument('command')
+    time_range.add_argument('start')
+    time_range.add_argument('end')
+    time_range.add_argument('--changes', action='store_true', help='only the intervals opened or closed in it')
+    args = arg_parser.parse_args()
+
+    history = History(args.db)
+    if args.query == 'ingest':
+        # file names sort by timestamp within a device
+        for snapshot in sorted(args.snapshot, key=lambda s: backup_name(s) or ('', s)):
+            if history.ingest(snapshot):
+                print("ingested %s" % snapshot)
+    elif args.query == 'key':
+        pprint.pprint(history.key_history(args.device, args.command, args.key), width=200)
+        print("first gone: %s" % history.first_gone(args.device, args.command, args.key))
+    elif args.query == 'at':
+        pprint.pprint(history.at(args.device, args.command, args.timestamp), width=200)
+    else:
+        query = history.changes if args.changes else history.range
+        pprint.pprint(query(args.device, args.command, args.start, args.end), width=200)
+    history.close()
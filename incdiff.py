@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+'''
+Incremental diff of a running sequence of snapshots against an indexed state
+
+AristaStateDiff(first, second) reloads and merges two full snapshots for every
+comparison. IncrementalDiff keeps the grouped tables of the pre-change baseline and
+of the last snapshot seen, indexed by the diff key, and for every new snapshot only
+reports the keys that changed since the previous one. The keys which differ from
+the baseline are tracked on the way so the cumulative drift is available at any
+time without another full comparison.
+
+The changes follow the convention of AristaStateDiff.get_diffs (and fastdiff), with
+the earlier snapshot as the first table: 'new' are the keys only in the earlier
+snapshot (gone from the later one), 'missing' the keys only in the later snapshot
+(added by it) and 'changed' the keys whose check columns differ.
+
+Usage:
+    inc = IncrementalDiff(state_file='change-1234.state')
+    inc.apply('carcore3_backup_20170927103453.json')   # first one is the baseline
+    delta = inc.apply('carcore3_backup_20170927104650.json')
+    drift = inc.get_drift()
+
+With a state_file the state is saved after every apply and picked up again by the
+next run, so a cron job can feed one snapshot per invocation:
+    ./incdiff.py --state change-1234.state carcore3_backup_20170928110800.json
+'''
+from __future__ import print_function
+
+import os
+import pprint
+import pickle
+import argparse
+
+from difftable import DIFF_HANDLE_CONFIG, load_snapshot, table_rows, group_rows, diff_grouped
+from diffconfig import DiffRegistry
+
+
+class IncrementalDiff(object):
+    '''
+    Internal data structures, all keyed by command:
+    self.baseline --> {key: values} grouped table of the first snapshot
+    self.current --> {key: values} grouped table of the last snapshot
+    self.columns --> value column names of the grouped table
+    self.check_pos --> position of the check columns in values
+    self.drift --> set of keys where current differs from baseline
+    self.snapshots --> names of all snapshots applied, in order
+    '''
+    def __init__(self, diff_handle_config=None, state_file=None):
+        self.diff_handle_config = diff_handle_config or DIFF_HANDLE_CONFIG
+        self.registry = DiffRegistry(config=self.diff_handle_config)
+        self.state_file = state_file
+        self.baseline = {}
+        self.current = {}
+        self.columns = {}
+        self.check_pos = {}
+        self.drift = {}
+        self.snapshots = []
+        if state_file and os.path.exists(state_file):
+            self.load()
+
+    def get_diff_handle_config(self, command):
+        if command in self.diff_handle_config:
+            return self.diff_handle_config[command]
+        return None
+
+    def apply(self, snapshot, name=None):
+        '''
+        apply one snapshot (file name or loaded backup list)
+
+        return {command: {'new': [(key, old values, None)], 'missing': [(key, None, new values)],
+                          'changed': [(key, old values, new values)]}}
+        with the changes since the previous snapshot (new: only in the previous one,
+        missing: only in this one); empty for the baseline
+        '''
+        if name is None:
+            name = snapshot if not isinstance(snapshot, list) else 'snapshot-%d' % len(self.snapshots)
+        delta = {}
+        for r in load_snapshot(snapshot):
+            command = r['command']
+            if command not in self.diff_handle_config or r.get('encoding') != 'list':
+                continue
+            spec = self.registry.compile(command, r['result'][0])
+            if spec is None:
+                continue
+            columns = spec.value_column
+            grouped = group_rows(table_rows(r['result'], spec.overflow_pos), spec.key_pos, spec.value_pos)
+            if command not in self.current:
+                # first time we see this command, it becomes the baseline
+                self.baseline[command] = grouped
+                self.current[command] = grouped
+                self.columns[command] = columns
+                self.check_pos[command] = spec.check_pos
+                self.drift[command] = set()
+                continue
+            if columns != self.columns[command]:
+                print("Column Name changed for %s: %s -> %s, skip it" % (command, self.columns[command], columns))
+                continue
+            delta[command] = self.update(command, grouped)
+        self.snapshots.append(name)
+        if self.state_file:
+            self.save()
+        return delta
+
+    def update(self, command, grouped):
+        '''
+        replace the current table of command and bring the drift set up to date
+        only keys that changed since the last snapshot are looked at
+        '''
+        previous = self.current[command]
+        check_pos = self.check_pos[command]
+        keys = diff_grouped(previous, grouped, check_pos)
+        delta = {'new': [(k, previous[k], None) for k in keys['new']],
+                 'missing': [(k, None, grouped[k]) for k in keys['missing']],
+                 'changed': [(k, previous[k], grouped[k]) for k in keys['changed']],
+                 }
+        self.current[command] = grouped
+
+        baseline = self.baseline[command]
+        drift = self.drift[command]
+        for key in keys['new'] + keys['missing'] + keys['changed']:
+            old = baseline.get(key)
+            new = grouped.get(key)
+            if old is None and new is None:
+                drift.discard(key)
+            elif old is None or new is None or \
+                    [old[i] for i in check_pos] != [new[i] for i in check_pos]:
+                drift.add(key)
+            else:
+                drift.discard(key)
+        return delta
+
+    def get_drift(self, command=None):
+        '''
+        return the cumulative difference between the baseline and the last snapshot
+        in the same shape apply returns, new being the keys only in the baseline
+        '''
+        drift = {}
+        for cmd in ([command] if command else sorted(self.drift)):
+            baseline = self.baseline[cmd]
+            current = self.current[cmd]
+            diff = {'new': [], 'missing': [], 'changed': []}
+            for key in sorted(self.drift[cmd]):
+                old = baseline.get(key)
+                new = current.get(key)
+                if new is None:
+                    diff['new'].append((key, old, None))
+                elif old is None:
+                    diff['missing'].append((key, None, new))
+                else:
+                    diff['changed'].append((key, old, new))
+            drift[cmd] = diff
+        return drift
+
+    def reset_baseline(self):
+        '''
+        make the last snapshot the new baseline, e.g. once a change is signed off
+        '''
+        self.baseline = dict(self.current)
+        for cmd in self.drift:
+            self.drift[cmd] = set()
+        if self.state_file:
+            self.save()
+
+    def save(self):
+        state = {'diff_handle_config': self.diff_handle_config,
+                 'baseline': self.baseline,
+                 'current': self.current,
+                 'columns': self.columns,
+                 'check_pos': self.check_pos,
+                 'drift': self.drift,
+                 'snapshots': self.snapshots,
+                 }
+        # write aside and rename so an interrupted run never leaves half a state behind
+        with open(self.state_file + '.tmp', 'wb') as f:
+            pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+        os.rename(self.state_file + '.tmp', self.state_file)
+
+    def load(self):
+        with open(self.state_file, 'rb') as f:
+            state = pickle.load(f)
+        for k, v in state.items():
+            setattr(self, k, v)
+        self.registry = DiffRegistry(config=self.diff_handle_config)
+
+    def format_diff(self, diff):
+        '''
+        turn the frozenset values into readable {column: sorted values} dicts
+        '''
+        result = {}
+        for cmd, changes in diff.items():
+            columns = self.columns[cmd]
+            readable = lambda v: None if v is None else dict((c, sorted(s)) for c, s in zip(columns, v))
+            result[cmd] = dict((kind, [(k, readable(old), readable(new)) for k, old, new in rows])
+                               for kind, rows in changes.items())
+        return result
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='diff snapshots incrementally against a baseline')
+    arg_parser.add_argument('--state', default=None, help='state file to resume from and save to')
+    arg_parser.add_argument('--drift', action='store_true', help='print the drift from the baseline at the end')
+    arg_parser.add_argument('--reset', action='store_true', help='make the last snapshot the new baseline')
+    arg_parser.add_argument('snapshot', nargs='*')
+    args = arg_parser.parse_args()
+
+    inc = IncrementalDiff(state_file=args.state)
+    for snapshot in args.snapshot:
+        delta = inc.apply(snapshot)
+        if len(inc.snapshots) == 1:
+            print("baseline %s" % snapshot)
+            continue
+        print("changes in %s since %s" % (snapshot, inc.snapshots[-2]))
+        pprint.pprint(inc.format_diff(delta), width=2000)
+    if args.drift:
+        print("drift since baseline %s" % (inc.snapshots[0] if inc.snapshots else None))
+        pprint.pprint(inc.format_diff(inc.get_drift()), width=2000)
+    if args.reset:
+        inc.reset_baseline()
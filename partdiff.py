@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+'''
+Diff of every command of a snapshot pair spread over worker processes
+
+AristaStateDiff.diff_state diffs one command after the other on one core, and a
+snapshot pair is dominated by its one or two big tables (show ip route, show ip
+bgp). parallel_diff runs the commands in a ProcessPoolExecutor, biggest first, and
+cuts a table bigger than partition_rows into one partition per worker on a hash of
+its grouping key, so wall time is about the biggest partition instead of the sum:
+    - both tables of a command are split with the same key hash, a key and all its
+      rows land in the same partition on both sides, so each partition diffs alone
+    - a worker diffs its partition with a fastdiff engine (the pandas engine gives
+      the same results, fastdiff.same_diff) and sends back the diff and the sorted
+      keys of the partition
+    - the merge gives every row the index it has in the unpartitioned diff, its
+      position in the sorted keys of both tables (the sum of its bisect in the
+      sorted keys of every partition), and sorts the rows on it
+The results are the ones of the sequential diff, whatever the number of workers
+and the order the partitions finish in.
+
+The same partitions bound the memory of one big diff: diff_buckets cuts both
+tables in K hash buckets and diffs them one after the other, so the grouped rows,
+sets and merged rows of the engine only exist for 1/K of the table at a time. With
+a spill_dir the buckets (and their sorted keys) go to temporary files as the rows
+are split and are read back one bucket at a time; diff_snapshots does it for whole
+backups, each one loaded, spilled and dropped before the next, so the peak is one
+loaded backup or one bucket, whichever is bigger.
+
+Usage:
+    diff = parallel_diff([(command, table_1, table_2, spec), ...], workers=4)
+    diff = diff_buckets(table_1, table_2, spec, 16, spill_dir='/tmp')
+    diff_result = diff_snapshots(first, second, buckets=16, spill_dir='/tmp')
+
+    ./partdiff.py carcore3_backup_20170928005037.json carcore3_backup_20170928110800.json --workers 4
+    ./partdiff.py carcore3_backup_20170928005037.json carcore3_backup_20170928110800.json --buckets 16
+'''
+from __future__ import print_function
+
+import os
+import time
+import json
+import shutil
+import argparse
+import tempfile
+
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+
+import fastdiff
+
+from difftable import load_snapshot, table_rows, tuple_getter
+from diffconfig import DiffRegistry
+from extdiff import read_rows, write_rows
+
+PARTITION_ROWS = 50000
+
+
+def split_rows(rows, key_pos, parts):
+    '''
+    split rows into parts lists on the hash of their key
+
+    hash() of str differs between processes, the rows of both tables are split in the same one
+    '''
+    get_key = tuple_getter(key_pos)
+    buckets = [[] for _ in range(parts)]
+    for row in rows:
+        buckets[hash(get_key(row)) % parts].append(row)
+    return buckets
+
+
+def spill_rows(rows, key_pos, parts, file_names):
+    '''
+    split rows like split_rows straight into one json lines file per bucket
+    '''
+    get_key = tuple_getter(key_pos)
+    files = [open(name, 'w') for name in file_names]
+    try:
+        for row in rows:
+            f = files[hash(get_key(row)) % parts]
+            f.write(json.dumps(list(row)))
+            f.write('\n')
+    finally:
+        for f in files:
+            f.close()
+
+
+def sorted_keys(rows_1, rows_2, key_pos):
+    get_key = tuple_getter(key_pos)
+    return sorted(set(map(get_key, rows_1)).union(map(get_key, rows_2)))
+
+
+def read_keys(file_name):
+    return [tuple(key) for key in read_rows(file_name)]
+
+
+def diff_part(job):
+    '''
+    worker: return (diff of the rows of a partition, its sorted keys or None)
+    '''
+    engine, column, rows_1, rows_2, diff_conf, with_keys = job
+    diff = fastdiff.ENGINE[engine]([column] + rows_1, [column] + rows_2, diff_conf)
+    keys = None
+    if with_keys and diff is not None:
+        keys = sorted_keys(rows_1, rows_2, [column.index(c) for c in diff_conf['grouping']])
+    return diff, keys
+
+
+def merge_parts(diffs, key_lists, key_width):
+    '''
+    the diff of a whole table from the diffs of its partitions and their sorted keys
+
+    a row index is the position of its key in the sorted keys of the whole table, as
+    the unpartitioned diff numbers it: the sum over the partitions of their keys
+    before it. key_lists may be an iterator making the sorted keys of one partition
+    at a time, only the keys of the diff rows are kept
+    '''
+    if any(diff is None for diff in diffs):
+        return None
+    wanted = sorted(set(tuple(row[1:1 + key_width]) for diff in diffs for rows in diff.values() for row in rows))
+    rank = [0] * len(wanted)
+    if wanted:
+        for keys in key_lists:
+            for n, key in enumerate(wanted):
+                rank[n] += bisect_left(keys, key)
+    rank = dict(zip(wanted, rank))
+    merged = {}
+    for kind in diffs[0]:
+        rows = [[rank[tuple(row[1:1 + key_width])]] + list(row[1:]) for diff in diffs for row in diff[kind]]
+        rows.sort(key=lambda row: row[0])
+        merged[kind] = rows
+    return merged
+
+
+def make_jobs(command, data_1, data_2, spec, engine, parts):
+    '''
+    the worker jobs of one command, one per partition
+    rows go as plain tuples, the compact rows of rowschema are classes made at run time
+    '''
+    column = list(spec.column)
+    rows_1 = [tuple(row) for row in table_rows(data_1, spec.overflow_pos)]
+    rows_2 = [tuple(row) for row in table_rows(data_2, spec.overflow_pos)]
+    if parts == 1:
+        return [(engine, column, rows_1, rows_2, spec.config(), False)]
+    return [(engine, column, part_1, part_2, spec.config(), True)
+            for part_1, part_2 in zip(split_rows(rows_1, spec.key_pos, parts),
+                                      split_rows(rows_2, spec.key_pos, parts))]
+
+
+def parallel_diff(commands, engine='merge', workers=None, partition_rows=PARTITION_ROWS, buckets=None):
+    '''
+    commands is a list of (command, table_1, table_2, DiffSpec), return {command: diff}
+
+    the tables of a command with more than partition_rows rows on a side are cut in
+    one partition per worker (workers None is the cpu count), or in buckets partitions
+    '''
+    engine = engine if engine in fastdiff.ENGINE else 'merge'
+    workers = workers or os.cpu_count() or 1
+    split = buckets or workers
+    jobs = []
+    for command, data_1, data_2, spec in commands:
+        size = max(len(data_1), len(data_2))
+        parts = split if split > 1 and size > partition_rows else 1
+        for job in make_jobs(command, data_1, data_2, spec, engine, parts):
+            jobs.append((command, job))
+
+    results = dict((command, []) for command, _, _, _ in commands)
+    with ProcessPoolExecutor(workers) as executor:
+        # biggest jobs first, so a big table doesn't start last
+        order = sorted(range(len(jobs)), key=lambda n: -(len(jobs[n][1][2]) + len(jobs[n][1][3])))
+        futures = dict((n, executor.submit(diff_part, jobs[n][1])) for n in order)
+        # collected in job order, not completion order
+        for n, (command, job) in enumerate(jobs):
+            results[command].append(futures[n].result())
+
+    diff_result = {}
+    for command, _, _, spec in commands:
+        parts = results[command]
+        diff_result[command] = (parts[0][0] if len(parts) == 1 else
+                                merge_parts([diff for diff, _ in parts], [keys for _, keys in parts], len(spec.grouping)))
+    return diff_result
+
+
+def diff_buckets(data_1, data_2, spec, buckets, diff_table=None, spill_dir=None):
+    '''
+    diff two tables bucket by bucket, same result as diff_table on the whole tables
+
+    diff_table(table_1, table_2, diff_conf) is the engine, fastdiff.sort_merge_diff by
+    default; with a spill_dir the buckets are written to a temporary directory in it
+    '''
+    diff_table = diff_table or fastdiff.sort_merge_diff
+    column = list(spec.column)
+    if spill_dir is None:
+        # the buckets only hold references to the rows of the tables
+        parts = list(zip(split_rows(table_rows(data_1, spec.overflow_pos), spec.key_pos, buckets),
+                         split_rows(table_rows(data_2, spec.overflow_pos), spec.key_pos, buckets)))
+        diffs = [diff_table([column] + rows_1, [column] + rows_2, spec) for rows_1, rows_2 in parts]
+        # the keys of a bucket are sorted again once the diff rows are known, one bucket at a time
+        key_lists = (sorted_keys(rows_1, rows_2, spec.key_pos) for rows_1, rows_2 in parts)
+        return merge_parts(diffs, key_lists, len(spec.grouping))
+
+    work_dir = tempfile.mkdtemp(prefix='partdiff.', dir=spill_dir)
+    try:
+        files_1 = [os.path.join(work_dir, '1.%d.jsonl' % n) for n in range(buckets)]
+        files_2 = [os.path.join(work_dir, '2.%d.jsonl' % n) for n in range(buckets)]
+        spill_rows(table_rows(data_1, spec.overflow_pos), spec.key_pos, buckets, files_1)
+        spill_rows(table_rows(data_2, spec.overflow_pos), spec.key_pos, buckets, files_2)
+        return diff_spilled(column, spec, files_1, files_2, diff_table, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def diff_spilled(column, spec, files_1, files_2, diff_table, work_dir):
+    '''
+    diff the spilled buckets of a table, holding one bucket and the diff rows in memory
+    '''
+    diffs = []
+    key_files = []
+    for n, (file_1, file_2) in enumerate(zip(files_1, files_2)):
+        rows_1 = list(read_rows(file_1))
+        rows_2 = list(read_rows(file_2))
+        diffs.append(diff_table([column] + rows_1, [column] + rows_2, spec))
+        key_files.append(os.path.join(work_dir, 'keys.%d.jsonl' % n))
+        write_rows(sorted_keys(rows_1, rows_2, spec.key_pos), key_files[-1])
+        del rows_1, rows_2
+    return merge_parts(diffs, (read_keys(key_file) for key_file in key_files), len(spec.grouping))
+
+
+def diff_snapshots(first, second, buckets, spill_dir=None, registry=None, diff_table=None):
+    '''
+    {command: diff} of two backup files, every table diffed in buckets spilled to disk
+
+    the first backup is loaded, its tables spilled and dropped before the second is
+    loaded, so only one of them is in memory at a time
+    '''
+    registry = registry or DiffRegistry()
+    diff_table = diff_table or fastdiff.sort_merge_diff
+    work_dir = tempfile.mkdtemp(prefix='partdiff.', dir=spill_dir)
+    try:
+        spilled = []
+        for side, snapshot in enumerate((first, second)):
+            tables = {}
+            for r in load_snapshot(snapshot):
+                if r.get('encoding') != 'list' or not registry.get(r['command']):
+                    continue
+                files = [os.path.join(work_dir, '%d.%d.%d.jsonl' % (side, len(tables), n)) for n in range(buckets)]
+                column = r['result'][0]
+                spec = registry.compile(r['command'], column)
+                if spec is None:
+                    continue
+                spill_rows(table_rows(r['result'], spec.overflow_pos), spec.key_pos, buckets, files)
+                tables[r['command']] = (column, spec, files)
+            spilled.append(tables)
+
+        diff_result = {}
+        for command in sorted(set(spilled[0]) & set(spilled[1])):
+            column, spec, files_1 = spilled[0][command]
+            column_2, _, files_2 = spilled[1][command]
+            if list(column) != list(column_2):
+                print('Column Name is not matching for those two data:\n data 1:%s \n data 2: %s' %
+                      (column, column_2))
+                continue
+            command_dir = tempfile.mkdtemp(dir=work_dir)
+            diff_result[command] = diff_spilled(list(column), spec, files_1, files_2, diff_table, command_dir)
+        return diff_result
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    from aristacli import AristaStateDiff
+    from rowschema import measure
+
+    arg_parser = argparse.ArgumentParser(description='check and time the parallel / bucketed diff of two backups '
+                                                     'against the sequential one')
+    arg_parser.add_argument('first')
+    arg_parser.add_argument('second')
+    arg_parser.add_argument('--engine', choices=sorted(fastdiff.ENGINE), default='merge')
+    arg_parser.add_argument('--workers', type=int, default=None, help='worker processes, default cpu count')
+    arg_parser.add_argument('--partition-rows', type=int, default=PARTITION_ROWS,
+                            help='tables bigger than this are cut in one partition per worker')
+    arg_parser.add_argument('--buckets', type=int, default=None,
+                            help='diff_snapshots in this many buckets instead, and compare peak memory')
+    arg_parser.add_argument('--spill-dir', default=None, help='directory of the spilled buckets')
+    args = arg_parser.parse_args()
+
+    def diff_sequential():
+        return AristaStateDiff(args.first, args.second, engine=args.engine, verbose=False).diff_result
+
+    if args.buckets:
+        def diff_bucketed():
+            return diff_snapshots(args.first, args.second, args.buckets, args.spill_dir,
+                                  diff_table=fastdiff.ENGINE[args.engine])
+        sequential, sequential_peak, _ = measure(diff_sequential)
+        start = time.time()
+        partitioned, partitioned_peak, _ = measure(diff_bucketed)
+        print("sequential peak %.1fMB, %d buckets peak %.1fMB in %.3fs" %
+              (sequential_peak / 1048576.0, args.buckets, partitioned_peak / 1048576.0, time.time() - start))
+    else:
+        start = time.time()
+        sequential = diff_sequential()
+        sequential_time = time.time() - start
+        start = time.time()
+        partitioned = AristaStateDiff(args.first, args.second, engine=args.engine, verbose=False,
+                                      workers=args.workers or os.cpu_count(),
+                                      partition_rows=args.partition_rows).diff_result
+        print("sequential %.3fs, parallel %.3fs" % (sequential_time, time.time() - start))
+    same = sorted(sequential) == sorted(partitioned) and all(fastdiff.same_diff(sequential[c], partitioned[c])
+                                                             for c in sequential)
+    print("%d commands, same: %s" % (len(sequential), same))
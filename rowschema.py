@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+'''
+Compact rows for parsed tables: one namedtuple class per column schema, interned values
+
+A table as parsed (execute_parser, the backup json) is a list of lists of str: every
+row pays for a list with spare capacity and every field for its own str object,
+although a table repeats the same few values (next hops, interfaces, VLANs, ports)
+over and over. compact_table keeps the table layout every consumer expects
+    [header, row, ..., trailing rows shorter than the header]
+but each full row becomes an instance of the namedtuple generated for the header
+(the Value names of the template, no per instance __dict__) holding interned str,
+folded like difftable.table_rows so a value split on ',' is whole again (into the
+overflow column of the diff handle config of the command, when given). The rows
+still index and compare like tuples, so the diff engines, group_rows and pandas
+take them unchanged, and json.dump writes them as lists.
+
+Usage:
+    data = load_compact('carcore3_backup_20170928110800.json')
+    table = compact_table(data[0]['result'])
+    table[1].NETWORK
+
+    ./rowschema.py carcore3_backup_20170928005037.json carcore3_backup_20170928110800.json
+'''
+from __future__ import print_function
+
+import re
+import sys
+import json
+import argparse
+import keyword
+
+from collections import namedtuple
+
+from difftable import load_snapshot, fold_row, overflow_pos
+
+try:
+    intern = sys.intern
+except AttributeError:
+    pass
+
+SCHEMA = {}
+
+
+def field_name(column):
+    '''
+    python identifier of a column name, e.g. ' LOCAL_AS' --> 'LOCAL_AS'
+    '''
+    name = re.sub(r'\W', '_', column.strip())
+    if not name or name[0].isdigit() or keyword.iskeyword(name):
+        name = 'F_' + name
+    return name
+
+
+class RowSchema(object):
+    '''
+    the namedtuple class of a column schema and the way to make compact rows of it
+    '''
+    def __init__(self, column):
+        self.column = tuple(column)
+        fields = [field_name(c) for c in self.column]
+        # rename=True turns duplicates into _<position>
+        self.row = namedtuple('Row', fields, rename=True)
+        self.width = len(self.column)
+
+    def make(self, values):
+        return self.row._make([intern(str(v)) for v in values])
+
+    def from_row(self, row, overflow=None):
+        '''
+        compact row of a table row, None if it is shorter than the schema
+        the fields beyond the schema are folded into the column at position overflow
+        '''
+        if len(row) == self.width:
+            return self.make(row)
+        if len(row) > self.width:
+            return self.make(fold_row(list(row), self.width, overflow))
+        return None
+
+    def from_record(self, record):
+        '''
+        compact row of a TextFSM record, list values written as format_table does
+        '''
+        return self.make(str([str(v) for v in value]) if isinstance(value, list) else value for value in record)
+
+
+def get_schema(column):
+    '''
+    the RowSchema of a header row or list of template Value names, one per schema
+    '''
+    key = tuple(column)
+    schema = SCHEMA.get(key)
+    if schema is None:
+        schema = SCHEMA[key] = RowSchema(key)
+    return schema
+
+
+def compact_table(table, command=None):
+    '''
+    the table with every full width row compacted, shorter rows (the trailing ['']) left as they are
+    '''
+    if not table or isinstance(table[0], dict):
+        return table
+    schema = get_schema(table[0])
+    overflow = overflow_pos(command, table[0])
+    result = [list(table[0])]
+    for row in table[1:]:
+        compact = schema.from_row(row, overflow)
+        result.append(row if compact is None else compact)
+    return result
+
+
+def compact_records(header, records):
+    '''
+    compact table of the header and records of a TextFSM run, without the split / join of format_table
+    '''
+    schema = get_schema(header)
+    return [list(header)] + [schema.from_record(record) for record in records] + [['']]
+
+
+def compact_snapshot(data):
+    '''
+    compact every parsed table of a loaded backup json in place, one command at a time
+    so the lists of a table are freed before the next one is compacted
+    '''
+    for r in data:
+        if r.get('encoding') == 'list' and isinstance(r.get('result'), list):
+            r['result'] = compact_table(r['result'], r['command'])
+    return data
+
+
+def load_compact(snapshot):
+    return compact_snapshot(load_snapshot(snapshot))
+
+
+def measure(func):
+    '''
+    return (result, peak bytes allocated by func, bytes still held by its result)
+    '''
+    import gc
+    import tracemalloc
+    gc.collect()
+    tracemalloc.start()
+    result = func()
+    gc.collect()
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak, held
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='peak / held memory of backups loaded as lists or compact rows')
+    arg_parser.add_argument('snapshot', nargs='+')
+    arg_parser.add_argument('--scale', type=int, default=1, help='load every snapshot this many times')
+    args = arg_parser.parse_args()
+
+    def load_all(loader):
+        return [loader(s) for s in args.snapshot for _ in range(args.scale)]
+
+    def load_list(snapshot):
+        with open(snapshot) as f:
+            return json.load(f)
+
+    lists, list_peak, list_held = measure(lambda: load_all(load_list))
+    del lists
+    compact, compact_peak, compact_held = measure(lambda: load_all(load_compact))
+    del compact
+    print("%-10s %12s %12s" % ('rows', 'peak', 'held'))
+    print("%-10s %11.1fMB %11.1fMB" % ('lists', list_peak / 1048576.0, list_held / 1048576.0))
+    print("%-10s %11.1fMB %11.1fMB" % ('compact', compact_peak / 1048576.0, compact_held / 1048576.0))
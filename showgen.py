@@ -0,0 +1,421 @@
+#!/usr/bin/env python
+'''
+Synthetic EOS show output generator for scale testing of the parsers and diffs
+
+Generates 'show ip route', 'show ip bgp', 'show mac address-table', 'show ip arp'
+and 'show lldp neighbors detail' at any size, in the same two files AristaStateBackup
+writes: <device>_backup_<timestamp>.txt with the raw text and .json with the
+TextFSM tables (header row, rows split on ',', trailing ['']).
+
+Usage:
+    gen = ShowGenerator('gencore1', routes=1000000, bgp=500000, seed=1)
+    gen.write_snapshot('gencore1_backup_20170101000000')
+    # change 0.1% of all rows, then write the next snapshot
+    gen.churn(0.001)
+    gen.write_snapshot('gencore1_backup_20170101000100')
+
+or from the shell:
+    ./showgen.py --device gencore1 --routes 1000000 --snapshots 5 --churn 0.001 --out-dir /tmp/gen
+'''
+from __future__ import print_function
+
+import os
+import json
+import random
+import argparse
+
+from datetime import datetime, timedelta
+
+ROUTE_COLUMN = ['PROTOCOL', 'NETWORK', 'MASK', 'DISTANCE', 'METRIC', 'DIRECT', 'NEXT_HOP', 'INTERFACE']
+BGP_COLUMN = ['STATUS', 'PATH_SELECTION', 'ROUTE_SOURCE', 'NETWORK', 'NEXT_HOP', 'METRIC', 'LOCAL_PREF',
+              'WEIGHT', 'AS_PATH', 'ORIGIN', 'OTHERS']
+MAC_COLUMN = ['MAC_ADDRESS', 'TYPE', 'VLAN', 'DESTINATION_PORT', 'MOVES', 'LAST_MOVE']
+# there is no ARP template in the fixtures, this is the table a template for the text below would give
+ARP_COLUMN = ['ADDRESS', 'AGE', 'MAC_ADDRESS', 'INTERFACE', 'PORT']
+LLDP_COLUMN = ['DEST_HOST', 'SYSTEM_ID', 'MGMT_ADDRESS', 'PLATFORM_VERSION', 'REMOTE_PORT', 'LOCAL_PORT',
+               'NEIGH_COUNT', 'AGE']
+
+COMMAND_LIST = ['show ip route',
+                'show ip bgp',
+                'show mac address-table',
+                'show ip arp',
+                'show lldp neighbors detail',
+                ]
+
+ROUTE_HEADER = '''Codes: C - connected, S - static, K - kernel,
+       O - OSPF, IA - OSPF inter area, E1 - OSPF external type 1,
+       E2 - OSPF external type 2, N1 - OSPF NSSA external type 1,
+       N2 - OSPF NSSA external type2, B I - iBGP, B E - eBGP,
+       R - RIP, I - ISIS, A B - BGP Aggregate, A O - OSPF Summary,
+       NG - Nexthop Group Static Route
+
+Gateway of last resort:
+'''
+
+BGP_HEADER = '''BGP routing table information for VRF default
+Router identifier %s, local AS number %s
+Route status codes: s - suppressed, * - valid, > - active, E - ECMP head, e - ECMP
+                    S - Stale
+Origin codes: i - IGP, e - EGP, ? - incomplete
+AS Path Attributes: Or-ID - Originator ID, C-LST - Cluster List, LL Nexthop - Link Local Nexthop
+
+      Network             Next Hop         Metric  LocPref Weight Path
+'''
+
+MAC_HEADER = '''          Mac Address Table
+------------------------------------------------------------------
+
+Vlan    Mac Address       Type        Ports      Moves   Last Move
+----    -----------       ----        -----      -----   ---------
+'''
+
+MAC_FOOTER = '''Total Mac Addresses for this criterion: %d
+
+          Multicast Mac Address Table
+------------------------------------------------------------------
+
+Vlan    Mac Address       Type        Ports
+----    -----------       ----        -----
+Total Mac Addresses for this criterion: 0
+'''
+
+ARP_HEADER = 'Address         Age (min)  Hardware Addr   Interface\n'
+
+LLDP_ENTRY = '''Interface %(LOCAL_PORT)s detected %(NEIGH_COUNT)s LLDP neighbors:
+
+  Neighbor %(SYSTEM_ID)s/%(REMOTE_PORT)s, age %(AGE)s
+  Discovered 20 days, 18:05:29 ago; Last changed 20 days, 18:05:29 ago
+    - Chassis ID type: MAC address (4)
+      Chassis ID     : %(SYSTEM_ID)s
+    - Port ID type: Interface name (5)
+      Port ID     : "%(REMOTE_PORT)s"
+    - Time To Live: 120 seconds
+    - Port Description: "proc1"
+    - System Name: "%(DEST_HOST)s"
+    - System Description: "%(PLATFORM_VERSION)s"
+    - System Capabilities : Bridge, WLAN Access Point, Router, Station Only
+      Enabled Capabilities: Station Only
+    - Management Address Subtype: IPv4 (1)
+      Management Address        : %(MGMT_ADDRESS)s
+      Interface Number Subtype  : ifIndex (2)
+      Interface Number          : 2
+      OID String                :
+    - IEEE802.1/IEEE802.3 Link Aggregation
+      Link Aggregation Status: Capable, Disabled (0x01)
+      Port ID                : 0
+    - IEEE802.3 MAC/PHY Configuration/Status
+      Auto-negotiation       : Supported, Disabled
+      Advertised Capabilities: Other
+      Operational MAU Type   : 10GBASE-LR (35)
+
+'''
+
+# (protocol, distance, weight) roughly the mix of an edge router carrying a full table
+ROUTE_PROTOCOL = [('B E', '20', 70), ('B I', '200', 15), ('O', '110', 8), ('O E1', '110', 2),
+                  ('O E2', '110', 2), ('C', '', 2), ('S', '', 1)]
+PLATFORM = ['Arista Networks EOS version 4.13.10M running on an Arista Networks DCS-7150S-64-CL',
+            'Debian GNU/Linux 8 (jessie) Linux 4.4.57.hrt #1 SMP Mon Mar 27 10:17:52 EDT 2017 x86_64']
+
+
+def int2ip(value):
+    return '.'.join(str((value >> shift) & 0xff) for shift in (24, 16, 8, 0))
+
+
+def ip2int(address):
+    value = 0
+    for octet in address.split('.'):
+        value = (value << 8) + int(octet)
+    return value
+
+
+def int2mac(value):
+    return '%04x.%04x.%04x' % ((value >> 32) & 0xffff, (value >> 16) & 0xffff, value & 0xffff)
+
+
+class ShowGenerator(object):
+    '''
+    Keeps one table per command as {key: [rows]} and renders it as EOS text or as
+    the TextFSM table AristaStateBackup stores. churn() mutates the tables in place so
+    consecutive snapshots differ in a controlled number of rows.
+    '''
+    def __init__(self, device='gencore1', routes=1000, bgp=None, macs=500, arps=500, lldp=48,
+                 ecmp=0.1, seed=0):
+        self.device = device
+        self.random = random.Random(seed)
+        self.router_id = '10.255.%d.%d' % (self.random.randint(0, 255), self.random.randint(1, 254))
+        self.local_as = str(self.random.randint(64512, 65534))
+        self.ecmp = ecmp
+        self.route_protocol = [p for p in ROUTE_PROTOCOL for _ in range(p[2])]
+        self.interfaces = ['Ethernet%d' % i for i in range(1, 49)] + \
+                          ['Port-Channel%d' % i for i in range(1, 9)] + \
+                          ['Vlan%d' % v for v in (101, 102, 661, 680, 902)]
+        self.vlans = [101, 102, 110, 225, 661, 680, 902, 1442]
+        self.next_hops = ['10.%d.253.%d' % (self.random.randint(0, 31), 2 + 4 * i) for i in range(16)]
+        self.used_network = set()
+        self.used_mac = set()
+        self.used_address = set()
+
+        self.route = {}
+        self.bgp = {}
+        self.mac = {}
+        self.arp = {}
+        self.lldp = {}
+        for _ in range(routes):
+            self.add_route()
+        for _ in range(routes if bgp is None else bgp):
+            self.add_bgp()
+        for _ in range(macs):
+            self.add_mac()
+        for _ in range(arps):
+            self.add_arp()
+        for intf in self.interfaces[:min(lldp, 48)]:
+            self.add_lldp(intf)
+
+    def new_network(self):
+        while True:
+            mask = self.random.choice((16, 20, 22, 24, 24, 24, 24, 26, 28, 30, 32))
+            network = self.random.getrandbits(32) & (0xffffffff << (32 - mask)) & 0xffffffff
+            # stay out of multicast / reserved space
+            if 0x01000000 <= network < 0xe0000000 and (network, mask) not in self.used_network:
+                self.used_network.add((network, mask))
+                return network, mask
+
+    def route_rows(self, network, mask):
+        proto, distance, _ = self.random.choice(self.route_protocol)
+        if not distance:
+            intf = self.random.choice(self.interfaces) if proto == 'C' else 'Null0'
+            return [[proto, int2ip(network), str(mask), '', '', 'directly', 'connected', intf]]
+        metric = '0' if proto.startswith('B') else str(self.random.randint(10, 20000))
+        paths = 2 if self.random.random() < self.ecmp else 1
+        return [[proto, int2ip(network), str(mask), distance, metric, '', next_hop,
+                 self.random.choice(self.interfaces)]
+                for next_hop in self.random.sample(self.next_hops, paths)]
+
+    def add_route(self):
+        network, mask = self.new_network()
+        self.route[(network, mask)] = self.route_rows(network, mask)
+
+    def bgp_path(self, prefix, active):
+        as_path = ' '.join(str(self.random.randint(1, 65000)) for _ in range(self.random.randint(0, 6)))
+        others = self.random.choice(['  ', ' Or-ID: %s C-LST: %s  ' % (self.random.choice(self.next_hops),
+                                                                        self.router_id)])
+        return ['*', ' ', '>' if active else ' ', prefix, self.random.choice(self.next_hops), '0',
+                self.random.choice(['100', '500', '750', '1000']), '0', as_path,
+                self.random.choice(['i', 'i', '?', 'e']), others]
+
+    def add_bgp(self):
+        network, mask = self.new_network()
+        prefix = '%s/%d' % (int2ip(network), mask)
+        self.bgp[(network, mask)] = [self.bgp_path(prefix, i == 0)
+                                     for i in range(self.random.choice((1, 2, 2, 3)))]
+
+    def new_mac(self):
+        while True:
+            mac = self.random.getrandbits(48) & 0xfeffffffffff
+            if mac not in self.used_mac:
+                self.used_mac.add(mac)
+                return int2mac(mac)
+
+    def last_move(self):
+        days = self.random.randint(0, 300)
+        clock = '%d:%02d:%02d' % (self.random.randint(0, 23), self.random.randint(0, 59),
+                                  self.random.randint(0, 59))
+        return ['%d days' % days, clock] if days else [clock]
+
+    def add_mac(self):
+        vlan = str(self.random.choice(self.vlans))
+        mac = self.new_mac()
+        port = self.random.choice(['Et%d' % i for i in range(1, 49)] + ['Po%d' % i for i in range(1, 9)])
+        self.mac[(vlan, mac)] = [[mac, 'DYNAMIC', vlan, port, '1'] + self.last_move()]
+
+    def add_arp(self):
+        while True:
+            address = '10.%d.%d.%d' % (self.random.randint(0, 255), self.random.randint(0, 255),
+                                       self.random.randint(1, 254))
+            if address not in self.used_address:
+                self.used_address.add(address)
+                break
+        if self.random.random() < 0.2:
+            # routed port, no separate layer 2 port
+            intf, port = 'Ethernet%d' % self.random.randint(1, 48), ''
+        else:
+            intf = 'Vlan%d' % self.random.choice(self.vlans)
+            port = self.random.choice(['not learned', 'Port-Channel10', 'Ethernet%d' % self.random.randint(1, 48)])
+        self.arp[address] = [[address, '0', self.new_mac(), intf, port]]
+
+    def add_lldp(self, intf):
+        host = 'gen%s%d.example.com' % (self.random.choice(['core', 'trade', 'quip', 'data']),
+                                        self.random.randint(1, 999))
+        self.lldp[intf] = [[host, int2mac(self.random.getrandbits(48)), '10.30.81.%d' % self.random.randint(1, 254),
+                            self.random.choice(PLATFORM), self.random.choice(['sfc0', 'eth0', 'Ethernet46']),
+                            intf, '1', '%d seconds' % self.random.randint(1, 30)]]
+
+    def churn(self, rate):
+        '''
+        remove, add and modify about rate * len(table) keys of every table, a third each
+        '''
+        for table, add, modify in ((self.route, self.add_route, self.modify_route),
+                                   (self.bgp, self.add_bgp, self.modify_bgp),
+                                   (self.mac, self.add_mac, self.modify_mac),
+                                   (self.arp, self.add_arp, self.modify_arp)):
+            count = int(round(len(table) * rate / 3.0))
+            if not count:
+                continue
+            keys = self.random.sample(sorted(table), min(len(table), 2 * count))
+            for key in keys[:count]:
+                del table[key]
+            for key in keys[count:]:
+                modify(key)
+            for _ in range(count):
+                add()
+        count = int(round(len(self.lldp) * rate))
+        for intf in self.random.sample(sorted(self.lldp), min(len(self.lldp), count)):
+            self.add_lldp(intf)
+
+    def modify_route(self, key):
+        rows = self.route[key]
+        if rows[0][5] != 'directly':
+            for row in rows:
+                row[6] = self.random.choice(self.next_hops)
+
+    def modify_bgp(self, key):
+        for row in self.bgp[key]:
+            row[6] = self.random.choice(['100', '500', '750', '1000'])
+
+    def modify_mac(self, key):
+        row = self.mac[key][0]
+        self.mac[key] = [row[:3] + ['Et%d' % self.random.randint(1, 48), str(int(row[4]) + 1)] +
+                         self.last_move()]
+
+    def modify_arp(self, key):
+        self.arp[key][0][2] = self.new_mac()
+
+    def sorted_keys(self, table):
+        '''
+        keys of table in the order EOS prints them
+        '''
+        if table is self.mac:
+            return sorted(table, key=lambda k: (int(k[0]), k[1]))
+        if table is self.arp:
+            return sorted(table, key=ip2int)
+        if table is self.lldp:
+            return [i for i in self.interfaces if i in table]
+        return sorted(table)
+
+    def text_show_ip_route(self):
+        yield ROUTE_HEADER
+        for key in self.sorted_keys(self.route):
+            rows = self.route[key]
+            proto, network, mask = rows[0][:3]
+            head = ' %-7s%s/%s ' % (proto, network, mask)
+            if rows[0][5] == 'directly':
+                yield '%sis directly connected, %s\n' % (head, rows[0][7])
+                continue
+            head = '%s[%s/%s] ' % (head, rows[0][3], rows[0][4])
+            yield '%svia %s, %s\n' % (head, rows[0][6], rows[0][7])
+            for row in rows[1:]:
+                yield '%svia %s, %s\n' % (' ' * len(head), row[6], row[7])
+        yield '\n'
+
+    def text_show_ip_bgp(self):
+        yield BGP_HEADER % (self.router_id, self.local_as)
+        for key in self.sorted_keys(self.bgp):
+            for row in self.bgp[key]:
+                path = row[8] + ' ' if row[8] else ''
+                yield ' %s%s%s  %-19s %-16s %-7s %-7s %-6s %s%s%s\n' % (
+                    row[0], row[1], row[2], row[3], row[4], row[5], row[6], row[7], path, row[9], row[10])
+
+    def text_show_mac_address_table(self):
+        yield MAC_HEADER
+        for key in self.sorted_keys(self.mac):
+            row = self.mac[key][0]
+            yield '%4s    %s    %-11s %-10s %-7s %s ago\n' % (row[2], row[0], row[1], row[3], row[4],
+                                                             ', '.join(row[5:]))
+        yield MAC_FOOTER % len(self.mac)
+
+    def text_show_ip_arp(self):
+        yield ARP_HEADER
+        for key in self.sorted_keys(self.arp):
+            row = self.arp[key][0]
+            intf = '%s, %s' % (row[3], row[4]) if row[4] else row[3]
+            yield '%-15s %9s  %s  %s\n' % (row[0], row[1], row[2], intf)
+
+    def text_show_lldp_neighbors_detail(self):
+        for intf in self.sorted_keys(self.lldp):
+            yield LLDP_ENTRY % dict(zip(LLDP_COLUMN, self.lldp[intf][0]))
+
+    def tables(self):
+        '''
+        return [(command, column, {key: rows}, text generator)] in COMMAND_LIST order
+        '''
+        return [('show ip route', ROUTE_COLUMN, self.route, self.text_show_ip_route),
+                ('show ip bgp', BGP_COLUMN, self.bgp, self.text_show_ip_bgp),
+                ('show mac address-table', MAC_COLUMN, self.mac, self.text_show_mac_address_table),
+                ('show ip arp', ARP_COLUMN, self.arp, self.text_show_ip_arp),
+                ('show lldp neighbors detail', LLDP_COLUMN, self.lldp, self.text_show_lldp_neighbors_detail),
+                ]
+
+    def get_text(self, command):
+        for cmd, _, _, text in self.tables():
+            if cmd == command:
+                return ''.join(text())
+        return None
+
+    def get_table(self, command):
+        '''
+        return the TextFSM table the way AristaStateBackup.execute_parser returns it
+        '''
+        for cmd, column, table, text in self.tables():
+            if cmd == command:
+                result = [list(column)]
+                for key in self.sorted_keys(table):
+                    result.extend(list(row) for row in table[key])
+                result.append([''])
+                return result
+        return None
+
+    def get_snapshot(self):
+        '''
+        return the list AristaStateBackup.get_status dumps into the .json backup
+        '''
+        return [{'command': cmd, 'result': self.get_table(cmd), 'encoding': 'list', 'parser': 'google'}
+                for cmd, _, _, _ in self.tables()]
+
+    def write_snapshot(self, backup_file_name, indent=2):
+        with open(backup_file_name + '.txt', 'w') as f:
+            for cmd, _, _, text in self.tables():
+                f.write("--------------- %s -------------\n" % cmd)
+                for chunk in text():
+                    f.write(chunk)
+                f.write("--------------------------------\n")
+        with open(backup_file_name + '.json', 'w') as f:
+            json.dump(self.get_snapshot(), f, indent=indent)
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='generate synthetic EOS backup snapshots')
+    arg_parser.add_argument('--device', default='gencore1')
+    arg_parser.add_argument('--routes', type=int, default=10000)
+    arg_parser.add_argument('--bgp', type=int, default=None, help='BGP prefixes, default same as --routes')
+    arg_parser.add_argument('--macs', type=int, default=1000)
+    arg_parser.add_argument('--arps', type=int, default=1000)
+    arg_parser.add_argument('--lldp', type=int, default=48)
+    arg_parser.add_argument('--ecmp', type=float, default=0.1, help='share of routes with two next hops')
+    arg_parser.add_argument('--snapshots', type=int, default=2)
+    arg_parser.add_argument('--churn', type=float, default=0.01, help='share of rows changed per snapshot')
+    arg_parser.add_argument('--interval', type=int, default=60, help='seconds between snapshot timestamps')
+    arg_parser.add_argument('--seed', type=int, default=0)
+    arg_parser.add_argument('--compact', action='store_true', help='write the json without indent')
+    arg_parser.add_argument('--out-dir', default='.')
+    args = arg_parser.parse_args()
+
+    gen = ShowGenerator(args.device, routes=args.routes, bgp=args.bgp, macs=args.macs, arps=args.arps,
+                        lldp=args.lldp, ecmp=args.ecmp, seed=args.seed)
+    timestamp = datetime(2017, 1, 1)
+    for i in range(args.snapshots):
+        if i:
+            gen.churn(args.churn)
+        name = os.path.join(args.out_dir, '%s_backup_%s' % (args.device, timestamp.strftime('%Y%m%d%H%M%S')))
+        gen.write_snapshot(name, indent=None if args.compact else 2)
+        print("wrote %s.txt/.json" % name)
+        timestamp += timedelta(seconds=args.interval)
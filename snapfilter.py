@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+'''
+Bloom filter sidecars of the key columns of a backup, for "which snapshots have X" queries
+
+Finding the snapshots holding a MAC or a prefix meant loading every backup json
+whole. AristaStateBackup now also writes, next to each backup, one Bloom filter per
+key column (the grouping columns of the diff handle config, plus FILTER_COLUMNS) of
+every parsed table:
+    <device>_backup_<timestamp>.bloom.json
+        {'device', 'timestamp',
+         'filters': {command: {column: {'bits', 'hashes', 'items', 'data'}}},
+         'config': {command: {'grouping', 'overflow'}}}
+with data the bit array in base64. A filter sized for its number of distinct values
+and FALSE_POSITIVE_RATE says "not there" for sure, and "maybe there" wrongly for
+about 1% of the values absent from the table. query checks the filters of every
+snapshot first and only opens the snapshots whose filters may hold the value,
+where the rows are matched exactly; for a value present in a few snapshots out of
+hundreds, that is a few backups loaded instead of all of them.
+
+Values are matched as the table holds them (the strings of the TextFSM template or
+of eosjson.py: dotted MACs, NETWORK and MASK in their own columns), with the spaces
+around them and around the column names stripped, as the older backups split on
+',' keep the ' ' after it. A query on a column no command keeps a filter of is an
+error (filterable_columns lists them), it would otherwise find nothing. A backup
+without a sidecar, or with one older than the backup or than FILTER_VERSION, gets
+it made the first time it is queried, as does one made with another grouping or
+overflow column of diff_config.json (the sidecar keeps them in 'config', a newly keyed
+column would otherwise find nothing in it). The snapshots of a deltastore.DeltaStore
+directory are queried the same way, with their sidecars in the store directory.
+
+Usage:
+    bloom = BloomFilter.for_items(['001c.7300.0001', ...])
+    '001c.7300.0001' in bloom
+    for device, timestamp, command, rows in query(['/backup'], 'MAC_ADDRESS', '001c.7300.0001'):
+        print(device, timestamp, command, rows)
+
+    ./snapfilter.py write carcore3_backup_*.json
+    ./snapfilter.py query /backup --column MAC_ADDRESS --value 001c.7300.0001
+    ./snapfilter.py query /backup --column NETWORK --value 10.30.0.0 --command 'show ip route'
+'''
+from __future__ import print_function
+
+import os
+import glob
+import json
+import math
+import base64
+import hashlib
+import argparse
+
+from deltastore import load_backup, stored_backups, stored_file
+from difftable import DIFF_HANDLE_CONFIG, backup_name, stripped_rows, stripped_column, overflow_pos, key_config
+
+FILTER_SUFFIX = '.bloom.json'
+# sidecars of an older version are made again (2: stripped columns and values,
+# 3: rows folded into the overflow column of the diff handle config)
+FILTER_VERSION = 3
+FALSE_POSITIVE_RATE = 0.01
+
+# columns filtered on besides the diff key
+FILTER_COLUMNS = {'show ip arp': ['MAC_ADDRESS'],
+                  'show lldp neighbors detail': ['DEST_HOST'],
+                  }
+
+
+class BloomFilter(object):
+    '''
+    a bit array of bits bits set at hashes positions per item (double hashing of one sha1)
+    '''
+    def __init__(self, bits, hashes, data=None, items=0):
+        self.bits = bits
+        self.hashes = hashes
+        self.items = items
+        self.data = bytearray((bits + 7) // 8) if data is None else bytearray(data)
+
+    @classmethod
+    def for_items(cls, items, false_positive_rate=FALSE_POSITIVE_RATE):
+        '''
+        the filter of a collection of distinct str, sized for their number
+        '''
+        n = max(len(items), 1)
+        bits = max(int(math.ceil(-n * math.log(false_positive_rate) / math.log(2) ** 2)), 8)
+        bloom = cls(bits, max(int(round(bits / float(n) * math.log(2))), 1))
+        for item in items:
+            bloom.add(item)
+        bloom.items = len(items)
+        return bloom
+
+    def positions(self, item):
+        digest = hashlib.sha1(item.encode('utf-8')).hexdigest()
+        h1 = int(digest[:16], 16)
+        h2 = int(digest[16:32], 16) | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, item):
+        data = self.data
+        for p in self.positions(item):
+            data[p >> 3] |= 1 << (p & 7)
+
+    def __contains__(self, item):
+        data = self.data
+        return all(data[p >> 3] & (1 << (p & 7)) for p in self.positions(item))
+
+    def to_dict(self):
+        return {'bits': self.bits, 'hashes': self.hashes, 'items': self.items,
+                'data': base64.b64encode(bytes(self.data)).decode('ascii')}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d['bits'], d['hashes'], base64.b64decode(d['data']), d['items'])
+
+
+def filter_file(snapshot):
+    '''
+    the sidecar of a backup json (or of a backup file name without extension)
+    '''
+    if snapshot.endswith('.json'):
+        snapshot = snapshot[:-len('.json')]
+    return snapshot + FILTER_SUFFIX
+
+
+def wanted_columns(command):
+    wanted = list((DIFF_HANDLE_CONFIG.get(command) or {}).get('grouping', [])) + FILTER_COLUMNS.get(command, [])
+    return [c for n, c in enumerate(wanted) if c not in wanted[:n]]
+
+
+def filter_columns(command, column):
+    '''
+    the columns of a (stripped) table header to keep a filter of
+    '''
+    return [c for c in wanted_columns(command) if c in column]
+
+
+def filterable_columns(commands=None):
+    '''
+    the columns a query can use, for every command or only for commands
+    '''
+    known = set(DIFF_HANDLE_CONFIG) | set(FILTER_COLUMNS)
+    return sorted(set(c for command in known if not commands or command in commands
+                      for c in wanted_columns(command)))
+
+
+def table_filters(command, table, false_positive_rate=FALSE_POSITIVE_RATE):
+    '''
+    {column: BloomFilter} of the key columns of one parsed table
+    '''
+    column = stripped_column(table)
+    wanted = filter_columns(command, column)
+    values = dict((c, set()) for c in wanted)
+    positions = [(column.index(c), values[c]) for c in wanted]
+    for row in stripped_rows(table, overflow_pos(command, column)):
+        for n, found in positions:
+            found.add(row[n])
+    return dict((c, BloomFilter.for_items(values[c], false_positive_rate)) for c in wanted)
+
+
+def snapshot_filters(data, device=None, timestamp=None, false_positive_rate=FALSE_POSITIVE_RATE):
+    '''
+    the sidecar content of a loaded backup
+    '''
+    filters = {}
+    tables = [r for r in data if r.get('encoding') == 'list' and isinstance(r.get('result'), list) and r['result']]
+    for r in tables:
+        blooms = table_filters(r['command'], r['result'], false_positive_rate)
+        if blooms:
+            filters[r['command']] = dict((c, b.to_dict()) for c, b in blooms.items())
+    return {'version': FILTER_VERSION, 'device': device, 'timestamp': timestamp, 'filters': filters,
+            'config': key_config(r['command'] for r in tables)}
+
+
+def write_filters(filters, file_name):
+    with open(file_name, 'w') as f:
+        json.dump(filters, f, sort_keys=True)
+    return file_name
+
+
+def load_filters(snapshot):
+    '''
+    the filters of a backup json from its sidecar, made (and written) from the backup if it is missing or stale
+    snapshot may also be the name a backup json would have in a deltastore.DeltaStore directory
+    '''
+    file_name = filter_file(snapshot)
+    source = snapshot if os.path.exists(snapshot) else stored_file(snapshot)
+    if os.path.exists(file_name) and (source is None or os.path.getmtime(file_name) >= os.path.getmtime(source)):
+        with open(file_name) as f:
+            filters = json.load(f)
+        if (filters.get('version') == FILTER_VERSION and 'config' in filters and
+                filters['config'] == key_config(filters['config'])):
+            return filters
+    device, timestamp = backup_name(snapshot) or (None, None)
+    filters = snapshot_filters(load_backup(snapshot), device, timestamp)
+    write_filters(filters, file_name)
+    return filters
+
+
+def find_backups(paths):
+    '''
+    the backup json files of paths, a directory is searched for *_backup_*.json and for the
+    snapshots of a deltastore.DeltaStore, named as the backup json they would be in it
+    empty files (interrupted backups) are ignored
+    '''
+    result = set()
+    for path in paths:
+        if os.path.isdir(path):
+            files = glob.glob(os.path.join(path, '*_backup_*.json')) + stored_backups(path)
+        else:
+            files = [path]
+        result.update(f for f in files if backup_name(f) and (not os.path.exists(f) or os.path.getsize(f)))
+    return sorted(result)
+
+
+def may_contain(filters, column, value, commands=None):
+    '''
+    the commands of a sidecar whose filter of column may hold value
+    '''
+    return [command for command, blooms in sorted(filters['filters'].items())
+            if (not commands or command in commands) and column in blooms and
+            value in BloomFilter.from_dict(blooms[column])]
+
+
+def query(paths, column, value, commands=None, counts=None):
+    '''
+    yield (device, timestamp, command, matching rows) of every backup of paths holding value in column
+
+    only the backups whose filters may hold the value are loaded, a backup which is not
+    valid json (e.g. cut short by a failed run) is skipped; counts, a dict, gets the
+    number of 'backups', 'unreadable', 'opened' and 'matched'
+    raise ValueError if no filter is kept of column (for commands)
+    '''
+    column = column.strip()
+    value = value.strip()
+    if column not in filterable_columns(commands):
+        raise ValueError('no filter of %s, the columns with one are %s' %
+                         (column, ', '.join(filterable_columns(commands))))
+    counts = counts if counts is not None else {}
+    counts.update(backups=0, unreadable=0, opened=0, matched=0)
+    for snapshot in find_backups(paths):
+        counts['backups'] += 1
+        try:
+            filters = load_filters(snapshot)
+        except ValueError:
+            counts['unreadable'] += 1
+            continue
+        candidates = may_contain(filters, column, value, commands)
+        if not candidates:
+            continue
+        counts['opened'] += 1
+        device, timestamp = backup_name(snapshot)
+        matched = False
+        for r in load_backup(snapshot):
+            if r['command'] not in candidates:
+                continue
+            n = stripped_column(r['result']).index(column)
+            rows = [row for row in stripped_rows(r['result'], overflow_pos(r['command'], r['result'][0]))
+                    if row[n] == value]
+            if rows:
+                matched = True
+                yield device, timestamp, r['command'], rows
+        counts['matched'] += matched
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Bloom filter sidecars of backups and the queries using them')
+    sub_parser = arg_parser.add_subparsers(dest='action')
+    sub_parser.required = True
+    write_parser = sub_parser.add_parser('write', help='(re)write the filter sidecar of backups')
+    write_parser.add_argument('snapshot', nargs='+')
+    write_parser.add_argument('--false-positive-rate', type=float, default=FALSE_POSITIVE_RATE)
+    query_parser = sub_parser.add_parser('query', help='find the backups holding a value')
+    query_parser.add_argument('path', nargs='+', help='backup json files or directories holding them')
+    query_parser.add_argument('--column', required=True, help='e.g. MAC_ADDRESS, NETWORK, ADDRESS')
+    query_parser.add_argument('--value', required=True)
+    query_parser.add_argument('--command', action='append', default=None, help='only these commands')
+    query_parser.add_argument('--rows', action='store_true', help='print the matching rows too')
+    args = arg_parser.parse_args()
+
+    if args.action == 'write':
+        for snapshot in args.snapshot:
+            device, timestamp = backup_name(snapshot) or (None, None)
+            filters = snapshot_filters(load_backup(snapshot), device, timestamp, args.false_positive_rate)
+            file_name = write_filters(filters, filter_file(snapshot))
+            print("%s: %d filters, %d bytes" % (file_name, sum(len(b) for b in filters['filters'].values()),
+                                               os.path.getsize(file_name)))
+    else:
+        counts = {}
+        if args.column.strip() not in filterable_columns(args.command):
+            arg_parser.error('no filter of %s, use one of %s' %
+                             (args.column, ', '.join(filterable_columns(args.command))))
+        for device, timestamp, command, rows in query(args.path, args.column, args.value, args.command, counts):
+            print("%-20s %s  %-30s %d rows" % (device, timestamp, command, len(rows)))
+            if args.rows:
+                for row in rows:
+                    print("    %s" % list(row))
+        print("%(backups)d backups (%(unreadable)d unreadable), %(opened)d opened, %(matched)d holding the value" %
+              counts)
@@ -0,0 +1,346 @@
+#!/usr/bin/env python
+'''
+Resident snapshot daemon: scheduled backups of many devices from one process
+
+A cron job of arista-cli.py per device pays for the interpreter start, the imports,
+reading the template index and compiling every TextFSM template, a TCP / TLS
+handshake and the password on every single run. SnapshotDaemon pays them once:
+    - the templates are compiled once into a shared aristacli.TemplateCache
+    - sessions stay warm in a connpool.ConnectionPool, credentials come from its sources
+    - every device has its own schedule, interval +/- jitter, first run at a random
+      offset within the interval, so the devices don't all hit the eAPI at once
+    - at most max_concurrency snapshots run at a time, on-demand ones included
+    - snapshots are written to store_dir as <device>_backup_<timestamp>.txt/.json, the
+      names difftable.backup_name and the other tools expect, and optionally ingested
+      into a history.History database
+The CPU time of each snapshot (time.thread_time) is kept in the status, to compare
+the steady state with the cost of the same snapshots run from cron.
+
+A small HTTP endpoint serves the status and on-demand requests:
+    GET  /status                     schedule, last snapshot of every device, pool stats
+    POST /snapshot/<device>          take a snapshot now, return its file
+    GET  /diff/<device>              diff of the last two snapshots of the device
+    GET  /diff/<device>?first=..&second=..   diff of two given timestamps
+
+Usage:
+    ./snapshotd.py carcore3 jpncore2 --store /var/snapshot --interval 900 --jitter 0.1 \\
+        --max-concurrency 4 --credentials file:~/.arista.json --listen 127.0.0.1:8080
+    curl -X POST http://127.0.0.1:8080/snapshot/carcore3
+    curl http://127.0.0.1:8080/diff/carcore3
+'''
+from __future__ import print_function
+
+import os
+import json
+import time
+import heapq
+import random
+import signal
+import argparse
+import threading
+
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import urlparse, parse_qs
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer as ThreadingHTTPServer
+    from urlparse import urlparse, parse_qs
+
+import fastdiff
+import connpool
+from aristacli import (AristaStateBackup, AristaStateDiff, TemplateCache, COMMAND_LIST,
+                       TEMPLATE_INDEX_DIR, TEMPLATE_INDEX_FLIE)
+from difftable import backup_name
+
+INTERVAL = 900
+JITTER = 0.1
+MAX_CONCURRENCY = 4
+
+
+class SnapshotDaemon(object):
+    '''
+    self.schedule --> heap of (next run time, device)
+    self.status   --> {device: {'next', 'running', 'count', 'last', 'file', 'seconds', 'cpu', 'error'}}
+    '''
+    def __init__(self, devices, store_dir, pool, templates, command_list=COMMAND_LIST, encoding='text',
+                 interval=INTERVAL, jitter=JITTER, max_concurrency=MAX_CONCURRENCY, history_db=None, cache=None):
+        self.devices = list(devices)
+        self.store_dir = store_dir
+        self.pool = pool
+        self.templates = templates
+        self.command_list = command_list
+        self.encoding = encoding
+        self.interval = interval
+        self.jitter = jitter
+        self.max_concurrency = max_concurrency
+        self.history_db = history_db
+        self.cache = cache
+
+        self.schedule = []
+        self.status = dict((device, {'next': None, 'running': False, 'count': 0, 'last': None,
+                                     'file': None, 'seconds': None, 'cpu': None, 'error': None})
+                           for device in self.devices)
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.executor = ThreadPoolExecutor(max_concurrency)
+        self.stopping = threading.Event()
+        self.ingest_queue = []
+        self.server = None
+        self.started = time.time()
+
+        if not os.path.isdir(self.store_dir):
+            os.makedirs(self.store_dir)
+
+    def next_time(self, last):
+        return last + self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def snapshot(self, device):
+        '''
+        take one snapshot of device into the store and return the json file name
+        runs in an executor thread or an HTTP request thread, within one of the max_concurrency slots
+        '''
+        with self.slots:
+            start = time.time()
+            cpu = time.thread_time()
+            with self.lock:
+                self.status[device]['running'] = True
+            try:
+                with self.pool.session(device) as cli:
+                    # the session lock serializes a device, a second snapshot within the same
+                    # second would overwrite the first one
+                    while True:
+                        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+                        name = os.path.join(self.store_dir, '%s_backup_%s' % (device, timestamp))
+                        if not os.path.exists(name + '.json'):
+                            break
+                        time.sleep(1 - time.time() % 1)
+                    backup = AristaStateBackup(device, command_list=self.command_list, backup_file_name=name,
+                                               encoding=self.encoding, cli=cli, templates=self.templates)
+                    backup.get_status()
+            except Exception as e:
+                with self.lock:
+                    self.status[device].update(running=False, error='%s: %s' % (type(e).__name__, e))
+                raise
+            with self.lock:
+                self.status[device].update(running=False, count=self.status[device]['count'] + 1,
+                                           last=timestamp, file=name + '.json', error=None,
+                                           seconds=round(time.time() - start, 3),
+                                           cpu=round(time.thread_time() - cpu, 3))
+                self.ingest_queue.append(name + '.json')
+        return name + '.json'
+
+    def run_scheduled(self, device):
+        try:
+            self.snapshot(device)
+        except Exception as e:
+            print("%s: snapshot failed: %s" % (device, e))
+
+    def ingest(self):
+        '''
+        add the new snapshots to the history database, in the scheduler thread which owns the connection
+        '''
+        with self.lock:
+            files, self.ingest_queue = self.ingest_queue, []
+        if not self.history_db or not files:
+            return
+        for snapshot in sorted(files, key=lambda s: backup_name(s) or ('', s)):
+            self.history_db.ingest(snapshot)
+
+    def snapshots(self, device):
+        '''
+        return {timestamp: json file} of the device in the store
+        '''
+        result = {}
+        for name in os.listdir(self.store_dir):
+            parsed = backup_name(name)
+            if parsed and parsed[0] == device:
+                result[parsed[1]] = os.path.join(self.store_dir, name)
+        return result
+
+    def diff(self, device, first=None, second=None):
+        '''
+        return the diff of two snapshots of device, by default the last two
+        '''
+        snapshots = self.snapshots(device)
+        if first is None and second is None:
+            timestamps = sorted(snapshots)[-2:]
+            if len(timestamps) < 2:
+                raise KeyError('%s: less than 2 snapshots in %s' % (device, self.store_dir))
+            first, second = timestamps
+        for timestamp in (first, second):
+            if timestamp not in snapshots:
+                raise KeyError('%s: no snapshot %s' % (device, timestamp))
+        state_diff = AristaStateDiff(snapshots[first], snapshots[second], engine='merge', verbose=False,
+                                     cache=self.cache)
+        return {'device': device, 'first': first, 'second': second,
+                'diff': dict((command, fastdiff.normalize_diff(diff))
+                             for command, diff in state_diff.diff_result.items())}
+
+    def get_status(self):
+        with self.lock:
+            status = dict((device, dict(s)) for device, s in self.status.items())
+        done = [s for s in status.values() if s['cpu'] is not None]
+        return {'uptime': int(time.time() - self.started),
+                'interval': self.interval,
+                'max_concurrency': self.max_concurrency,
+                'devices': status,
+                'snapshots': sum(s['count'] for s in status.values()),
+                'last_cpu_total': round(sum(s['cpu'] for s in done), 3),
+                'pool': self.pool.stats(),
+                }
+
+    def serve(self, host, port):
+        self.server = ThreadingHTTPServer((host, port), make_handler(self))
+        self.server.daemon_threads = True
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        print("listening on %s:%d" % self.server.server_address[:2])
+
+    def run(self):
+        '''
+        schedule loop, until stop()
+        '''
+        now = time.time()
+        for device in self.devices:
+            first = now + random.uniform(0, self.interval)
+            heapq.heappush(self.schedule, (first, device))
+            self.status[device]['next'] = first
+        running = {}
+        while not self.stopping.is_set():
+            self.ingest()
+            now = time.time()
+            while self.schedule and self.schedule[0][0] <= now:
+                due, device = heapq.heappop(self.schedule)
+                if device in running and not running[device].done():
+                    print("%s: previous snapshot still running, skip this one" % device)
+                else:
+                    running[device] = self.executor.submit(self.run_scheduled, device)
+                # next from the due time, not from now, so the schedule doesn't drift
+                following = self.next_time(due)
+                if following <= now:
+                    following = now + self.interval * random.uniform(0, self.jitter)
+                heapq.heappush(self.schedule, (following, device))
+                with self.lock:
+                    self.status[device]['next'] = following
+            wait = self.schedule[0][0] - time.time() if self.schedule else 1.0
+            self.stopping.wait(max(0.0, min(wait, 1.0)))
+        self.executor.shutdown(wait=True)
+        self.ingest()
+
+    def stop(self, *args):
+        self.stopping.set()
+        if self.server:
+            threading.Thread(target=self.server.shutdown).start()
+
+
+def make_handler(daemon):
+    class SnapshotHandler(BaseHTTPRequestHandler):
+        def reply(self, code, result):
+            body = json.dumps(result, indent=2, default=str).encode()
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def route(self, method):
+            url = urlparse(self.path)
+            parts = [p for p in url.path.split('/') if p]
+            query = dict((k, v[0]) for k, v in parse_qs(url.query).items())
+            if method == 'GET' and parts == ['status']:
+                return 200, daemon.get_status()
+            if len(parts) != 2 or parts[1] not in daemon.status:
+                return 404, {'error': 'unknown path or device %s' % url.path}
+            device = parts[1]
+            if method == 'POST' and parts[0] == 'snapshot':
+                return 200, {'device': device, 'file': daemon.snapshot(device)}
+            if parts[0] == 'diff':
+                return 200, daemon.diff(device, query.get('first'), query.get('second'))
+            return 404, {'error': 'unknown path %s' % url.path}
+
+        def handle_method(self, method):
+            try:
+                code, result = self.route(method)
+            except KeyError as e:
+                code, result = 404, {'error': str(e.args[0])}
+            except Exception as e:
+                code, result = 500, {'error': '%s: %s' % (type(e).__name__, e)}
+            self.reply(code, result)
+
+        def do_GET(self):
+            self.handle_method('GET')
+
+        def do_POST(self):
+            self.handle_method('POST')
+
+        def log_message(self, format, *args):
+            pass
+
+    return SnapshotHandler
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='resident scheduled snapshots of many devices')
+    arg_parser.add_argument('device', nargs='*')
+    arg_parser.add_argument('--store', required=True, help='directory of the backup files')
+    arg_parser.add_argument('--interval', type=float, default=INTERVAL, help='seconds between snapshots of a device')
+    arg_parser.add_argument('--jitter', type=float, default=JITTER, help='fraction of the interval to vary it by')
+    arg_parser.add_argument('--max-concurrency', type=int, default=MAX_CONCURRENCY)
+    arg_parser.add_argument('--encoding', choices=['text', 'json'], default='text')
+    arg_parser.add_argument('--credentials', action='append', default=None,
+                            help='env, file:PATH or keyring, in the order to try (default env)')
+    arg_parser.add_argument('--client', choices=['pyeapi', 'async'], default='async')
+    arg_parser.add_argument('--template-dir', default=TEMPLATE_INDEX_DIR)
+    arg_parser.add_argument('--index-file', default=TEMPLATE_INDEX_FLIE)
+    arg_parser.add_argument('--history', default=None, help='sqlite history database to ingest the snapshots into')
+    arg_parser.add_argument('--cache-dir', default=None, help='diffcache directory for the diff endpoint')
+    arg_parser.add_argument('--listen', default='127.0.0.1:8080', help='host:port of the HTTP endpoint, "" for none')
+    arg_parser.add_argument('--fake', default=None, help='backup .txt file served by a local fake eAPI server')
+    args = arg_parser.parse_args()
+
+    transport = 'https'
+    port = None
+    devices = args.device
+    credentials = connpool.get_credentials(args.credentials or ['env'])
+    if args.fake:
+        import asyncio
+        import eapiclient
+        server = eapiclient.FakeEapiServer.from_backup(args.fake)
+        server_loop = asyncio.new_event_loop()
+        server_loop.run_until_complete(server.start())
+        threading.Thread(target=server_loop.run_forever, daemon=True).start()
+        transport = 'http'
+        port = server.port
+        devices = devices or ['127.0.0.1', 'localhost']
+        credentials = connpool.CredentialChain([connpool.EnvCredentials(environ={'ARISTA_PASSWORD': 'fake'})])
+    if not devices:
+        arg_parser.error('no device given')
+
+    history_db = None
+    if args.history:
+        from history import History
+        history_db = History(args.history)
+    cache = None
+    if args.cache_dir:
+        from diffcache import DiffCache
+        cache = DiffCache(args.cache_dir)
+
+    pool = connpool.ConnectionPool(credentials, client=args.client, transport=transport, port=port,
+                                   max_size=len(devices))
+    daemon = SnapshotDaemon(devices, args.store, pool, TemplateCache(args.template_dir, args.index_file),
+                            encoding=args.encoding, interval=args.interval, jitter=args.jitter,
+                            max_concurrency=args.max_concurrency, history_db=history_db, cache=cache)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    if args.listen:
+        host, _, listen_port = args.listen.rpartition(':')
+        daemon.serve(host or '127.0.0.1', int(listen_port))
+    daemon.run()
+    pool.close()
+    if history_db:
+        history_db.close()
+    print(json.dumps(daemon.get_status(), indent=2, default=str))
@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+'''
+Per command summary statistics of a backup, kept in a small sidecar file
+
+"How many routes per protocol", "how many MACs per VLAN", "how many prefixes per
+BGP next hop" or a quick before/after check of two snapshots only need a few counts
+per table, but answering them meant loading the whole backup json (megabytes to
+hundreds of megabytes). AristaStateBackup computes the statistics of every parsed
+table as it parses it and writes them next to the backup, a few kilobytes:
+    <device>_backup_<timestamp>.stats.json
+        {'device', 'timestamp',
+         'commands': {command: {'encoding', 'column', 'rows', 'keys', 'digest',
+                                'distinct': {column: number of distinct values},
+                                'groups': {column: {value: rows}}}},
+         'config': {command: {'grouping', 'overflow'}}}
+    - rows are the folded table rows (difftable.table_rows, into the overflow column
+      of the diff handle config), keys the distinct
+      values of the diff key (grouping of the diff handle config); column names
+      and values are stripped (difftable.stripped_rows), the older backups split
+      on ',' keep the ' ' after it
+    - groups holds the row count per value of the columns of SUMMARY_COLUMNS and of
+      every other column with at most AUTO_GROUPS distinct values, the MAX_GROUPS
+      most common values only (distinct tells if some were left out)
+    - digest is a hash of the rows which does not depend on their order: two
+      snapshots with the same digest for a command have the same table
+A command which is not a parsed table only gets its encoding.
+
+load_stats reads the sidecar of a backup, or computes it from the backup (and
+writes it) when there is none or it is older than the backup or than STATS_VERSION,
+or was made with another grouping or overflow column of diff_config.json (its 'config'),
+so older backups get theirs the first time they are asked. A snapshot of a
+deltastore.DeltaStore is named as the backup json it would be in the store directory,
+where AristaStateBackup writes its sidecar. A backup which is not
+valid json (empty, cut short by a failed run) gets statistics with no command and
+the reason in 'error', nothing is written, and its commands show as unavailable.
+
+Usage:
+    stats = load_stats('carcore3_backup_20170928110800.json')
+    stats['commands']['show ip route']['groups']['PROTOCOL']    # {'O': 455, 'B E': 301, ...}
+
+    ./snapstats.py write carcore3_backup_*.json
+    ./snapstats.py show carcore3_backup_20170928110800.json --command 'show mac address-table' --column VLAN
+    ./snapstats.py compare carcore3_backup_20170928005037.json carcore3_backup_20170928110800.json
+'''
+from __future__ import print_function
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+
+from collections import Counter
+
+from deltastore import load_backup, stored_file
+from difftable import (DIFF_HANDLE_CONFIG, backup_name, stripped_rows, stripped_column, tuple_getter, overflow_pos,
+                       key_config)
+
+STATS_SUFFIX = '.stats.json'
+# sidecars of an older version are made again (2: stripped columns and values,
+# 3: rows folded into the overflow column of the diff handle config)
+STATS_VERSION = 3
+AUTO_GROUPS = 16
+MAX_GROUPS = 256
+DIGEST_BITS = 64
+
+# the group by columns asked for whatever their number of values
+SUMMARY_COLUMNS = {'show ip route': ['PROTOCOL', 'NEXT_HOP', 'INTERFACE'],
+                   'show ip bgp': ['NEXT_HOP', 'ROUTE_SOURCE', 'LOCAL_PREF'],
+                   'show ip bgp summary': ['STATE', 'NEIGH_AS'],
+                   'show mac address-table': ['VLAN', 'TYPE', 'DESTINATION_PORT'],
+                   'show ip arp': ['INTERFACE'],
+                   'show ip mroute': ['RP', 'INCOMING_INTERFACE'],
+                   'show interfaces status': ['STATUS', 'VLAN'],
+                   }
+
+
+def stats_file(snapshot):
+    '''
+    the sidecar of a backup json (or of a backup file name without extension)
+    '''
+    if snapshot.endswith('.json'):
+        snapshot = snapshot[:-len('.json')]
+    return snapshot + STATS_SUFFIX
+
+
+def row_digest(row):
+    return int(hashlib.sha1('\x1f'.join(row).encode('utf-8')).hexdigest()[:DIGEST_BITS // 4], 16)
+
+
+def table_stats(command, table):
+    '''
+    the statistics of one parsed table (header, rows, trailing [''])
+    '''
+    column = stripped_column(table)
+    width = len(column)
+    counters = [Counter() for _ in column]
+    grouping = [c for c in (DIFF_HANDLE_CONFIG.get(command) or {}).get('grouping', []) if c in column]
+    get_key = tuple_getter([column.index(c) for c in grouping]) if grouping else None
+    keys = set()
+    rows = 0
+    digest = 0
+    for row in stripped_rows(table, overflow_pos(command, column)):
+        rows += 1
+        for n in range(width):
+            counters[n][row[n]] += 1
+        if get_key:
+            keys.add(get_key(row))
+        # a sum of the row hashes, so the row order doesn't matter and a repeated row still counts
+        digest += row_digest(row)
+    wanted = SUMMARY_COLUMNS.get(command, [])
+    groups = {}
+    for c, counter in zip(column, counters):
+        if c in wanted or len(counter) <= AUTO_GROUPS:
+            groups[c] = dict(counter.most_common(MAX_GROUPS))
+    return {'encoding': 'list',
+            'column': column,
+            'rows': rows,
+            'keys': len(keys) if get_key else None,
+            'digest': '%016x' % (digest % (1 << DIGEST_BITS)),
+            'distinct': dict((c, len(counter)) for c, counter in zip(column, counters)),
+            'groups': groups,
+            }
+
+
+def command_stats(r):
+    '''
+    the statistics of one command result of a backup json
+    '''
+    if r.get('encoding') == 'list' and isinstance(r.get('result'), list) and r['result']:
+        return table_stats(r['command'], r['result'])
+    return {'encoding': r.get('encoding')}
+
+
+def snapshot_stats(data, device=None, timestamp=None):
+    '''
+    the sidecar content of a loaded backup
+    '''
+    commands = dict((r['command'], command_stats(r)) for r in data)
+    return {'version': STATS_VERSION,
+            'device': device,
+            'timestamp': timestamp,
+            'commands': commands,
+            'config': key_config(c for c, s in commands.items() if 'rows' in s),
+            }
+
+
+def write_stats(stats, file_name):
+    with open(file_name, 'w') as f:
+        json.dump(stats, f, indent=1, sort_keys=True)
+    return file_name
+
+
+def load_stats(snapshot):
+    '''
+    the statistics of a backup json from its sidecar, made (and written) from the backup if it is missing or stale
+    an unreadable backup gives {'commands': {}, 'error': why} and no sidecar
+    snapshot may also be the name a backup json would have in a deltastore.DeltaStore directory
+    '''
+    file_name = stats_file(snapshot)
+    source = snapshot if os.path.exists(snapshot) else stored_file(snapshot)
+    if os.path.exists(file_name) and (source is None or os.path.getmtime(file_name) >= os.path.getmtime(source)):
+        with open(file_name) as f:
+            stats = json.load(f)
+        if (stats.get('version') == STATS_VERSION and 'config' in stats and
+                stats['config'] == key_config(stats['config'])):
+            return stats
+    device, timestamp = backup_name(snapshot) or (None, None)
+    try:
+        data = load_backup(snapshot)
+    except ValueError as e:
+        return {'version': STATS_VERSION, 'device': device, 'timestamp': timestamp, 'commands': {},
+                'error': "can't load %s (%s)" % (snapshot, e)}
+    stats = snapshot_stats(data, device, timestamp)
+    write_stats(stats, file_name)
+    return stats
+
+
+def compare_stats(stats_1, stats_2):
+    '''
+    yield (command, rows 1, rows 2, same digest) of every command of both statistics
+    '''
+    commands_1 = stats_1['commands']
+    commands_2 = stats_2['commands']
+    for command in sorted(set(commands_1) | set(commands_2)):
+        s1 = commands_1.get(command, {})
+        s2 = commands_2.get(command, {})
+        same = 'digest' in s1 and s1.get('digest') == s2.get('digest')
+        yield command, s1.get('rows'), s2.get('rows'), same
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='summary statistics sidecars of backups')
+    sub_parser = arg_parser.add_subparsers(dest='action')
+    sub_parser.required = True
+    write_parser = sub_parser.add_parser('write', help='(re)write the statistics sidecar of backups')
+    write_parser.add_argument('snapshot', nargs='+')
+    show_parser = sub_parser.add_parser('show', help='print the statistics of a backup')
+    show_parser.add_argument('snapshot')
+    show_parser.add_argument('--command', action='append', default=None, help='only these commands')
+    show_parser.add_argument('--column', action='append', default=None, help='only the groups of these columns')
+    compare_parser = sub_parser.add_parser('compare', help='row counts of the commands of two backups')
+    compare_parser.add_argument('first')
+    compare_parser.add_argument('second')
+    args = arg_parser.parse_args()
+
+    if args.action == 'write':
+        for snapshot in args.snapshot:
+            device, timestamp = backup_name(snapshot) or (None, None)
+            try:
+                data = load_backup(snapshot)
+            except ValueError as e:
+                print("%s: can't load it (%s), skip it" % (snapshot, e))
+                continue
+            stats = snapshot_stats(data, device, timestamp)
+            print("%s: %d commands" % (write_stats(stats, stats_file(snapshot)), len(stats['commands'])))
+    elif args.action == 'show':
+        stats = load_stats(args.snapshot)
+        if 'error' in stats:
+            print(stats['error'])
+            sys.exit(1)
+        for command, s in sorted(stats['commands'].items()):
+            if args.command and command not in args.command:
+                continue
+            print("%s: %s rows, %s keys, digest %s" % (command, s.get('rows', '-'), s.get('keys', '-'),
+                                                       s.get('digest', '-')))
+            for column, counts in sorted(s.get('groups', {}).items()):
+                if args.column and column not in args.column:
+                    continue
+                print("    %-20s %s" % (column, ', '.join('%s: %d' % (v or "''", n) for v, n in
+                                                        sorted(counts.items(), key=lambda item: -item[1]))))
+    else:
+        stats_1 = load_stats(args.first)
+        stats_2 = load_stats(args.second)
+        for stats in (stats_1, stats_2):
+            if 'error' in stats:
+                print("%s, its commands are unavailable" % stats['error'])
+        # an unreadable backup has no command, it shows as n/a rather than as a missing command
+        absent_1 = 'n/a' if 'error' in stats_1 else '-'
+        absent_2 = 'n/a' if 'error' in stats_2 else '-'
+        print("%-30s %10s %10s %10s  %s" % ('command', 'first', 'second', 'delta', 'same'))
+        for command, rows_1, rows_2, same in compare_stats(stats_1, stats_2):
+            delta = rows_2 - rows_1 if rows_1 is not None and rows_2 is not None else None
+            print("%-30s %10s %10s %10s  %s" % (command, absent_1 if rows_1 is None else rows_1,
+                                                absent_2 if rows_2 is None else rows_2,
+                                                '-' if delta is None else '%+d' % delta, same))
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+'''
+Command --> template dispatch of a clitable index in one regex match
+
+clitable finds the template of a command by trying the regex of every index row in
+turn (IndexTable.GetRowMatch), on every ParseCmd. A show tech has hundreds of show
+sections and most of them have no template, so each of those walks the whole index
+for nothing. TemplateIndex reads the index once through clitable (same completion
+of sh[[ow]] abbreviations, same row order) and keeps
+    - only the rows whose other columns (Vendor, Hostname ...) match the fixed
+      attributes given, e.g. {'Vendor': 'Arista'}
+    - their Command regexes as the alternatives of one combined regex, each in a
+      named group, so a single match of the command returns the first row which
+      matches, exactly like GetRowMatch (re.match, first row wins)
+    - the answer of every command seen, so a repeated command is a dict lookup
+
+Usage:
+    index = TemplateIndex('index', template_dir)
+    index.templates('show ip route')      # ['arista_show_ip_route.template']
+    index.has_template('show logging')    # False
+    ./templateindex.py --template-dir ~/template 'show ip route' 'sh mac addr' 'show logging'
+'''
+from __future__ import print_function
+
+import re
+import argparse
+
+
+class TemplateIndex(object):
+    def __init__(self, index_file, template_dir, attributes=None):
+        import clitable
+        self.index_file = index_file
+        self.template_dir = template_dir
+        self.attributes = {'Vendor': 'Arista'} if attributes is None else dict(attributes)
+        cli_table = clitable.CliTable(index_file, template_dir)
+        index = cli_table.index
+
+        self.rows = {}
+        patterns = []
+        for row, compiled in zip(index.index, index.compiled):
+            if not all(key not in compiled.header or not compiled[key] or compiled[key].match(value)
+                       for key, value in self.attributes.items()):
+                continue
+            group = 'r%d' % row.row
+            self.rows[group] = (row.row, row['Template'].split(':'))
+            # an empty Command matches every command, like GetRowMatch skipping the column
+            patterns.append('(?P<%s>%s)' % (group, row['Command'] if 'Command' in row.header else ''))
+        self.regex = re.compile('|'.join(patterns)) if patterns else None
+        self.found = {}
+
+    def match(self, command):
+        '''
+        return (index row number, [template]) of command, (0, None) without a template
+        '''
+        result = self.found.get(command)
+        if result is None:
+            m = self.regex.match(command) if self.regex else None
+            # the alternative which matched is the only named group with a value
+            result = (self.rows[next(g for g, v in m.groupdict().items() if v is not None)]
+                      if m else (0, None))
+            self.found[command] = result
+        return result
+
+    def row(self, command):
+        return self.match(command)[0]
+
+    def templates(self, command):
+        return self.match(command)[1]
+
+    def has_template(self, command):
+        return self.match(command)[1] is not None
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='look commands up in a clitable index')
+    arg_parser.add_argument('command', nargs='+')
+    arg_parser.add_argument('--template-dir', required=True)
+    arg_parser.add_argument('--index-file', default='index')
+    args = arg_parser.parse_args()
+
+    index = TemplateIndex(args.index_file, args.template_dir)
+    for command in args.command:
+        print("%-40s %s" % (command, index.templates(command)))
@@ -0,0 +1,90 @@
+'''
+Tables of EOS json against the tables the templates made of the text of the same state
+
+The json is written the way eAPI answers (routeType, vias, macAddress with ':'...)
+for routes and MACs of carcore3_backup_20170928110800, the text side is the table of
+that backup: an ECMP route, a connected route, an interface static route, MACs with
+a last move in days. Diffing one against the other must find nothing.
+
+    python -m pytest test_eosjson.py
+'''
+from __future__ import print_function
+
+import os
+import copy
+
+import eosjson
+import fastdiff
+
+from difftable import DIFF_HANDLE_CONFIG, load_snapshot, table_rows
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+TEXT_BACKUP = os.path.join(HERE, 'carcore3_backup_20170928110800.json')
+NOW = 1506596880
+
+ROUTE_JSON = {'vrfs': {'default': {'routes': {
+    '0.0.0.0/0': {'routeType': 'iBGP', 'preference': 200, 'metric': 0, 'directlyConnected': False,
+                  'vias': [{'nexthopAddr': '10.5.253.26', 'interface': 'Ethernet12'}]},
+    '10.5.81.0/24': {'routeType': 'ospfIntraArea', 'preference': 110, 'metric': 200, 'directlyConnected': False,
+                     'vias': [{'nexthopAddr': '10.5.253.130', 'interface': 'Ethernet4'},
+                              {'nexthopAddr': '10.5.253.186', 'interface': 'Ethernet17'}]},
+    '10.4.94.8/30': {'routeType': 'connected', 'preference': 0, 'metric': 1, 'directlyConnected': True,
+                     'vias': [{'interface': 'Ethernet3'}]},
+    '10.5.4.9/32': {'routeType': 'static', 'preference': 1, 'metric': 0, 'directlyConnected': False,
+                    'vias': [{'interface': 'Null0'}]},
+}}}}
+
+MAC_JSON = {'unicastTable': {'tableEntries': [
+    {'macAddress': '00:00:5e:00:01:02', 'vlanId': 101, 'interface': 'Ethernet7', 'entryType': 'dynamic',
+     'moves': 1, 'lastMove': NOW - (201 * 86400 + 51 * 60 + 52)},
+    {'macAddress': '00:00:5e:00:01:04', 'vlanId': 101, 'interface': 'Ethernet7', 'entryType': 'dynamic',
+     'moves': 1, 'lastMove': NOW - (201 * 86400 + 51 * 60 + 52)},
+]}}
+
+
+def text_table(command, keys):
+    '''
+    the table of command of the text backup, only the rows of the diff keys in keys
+    '''
+    table = [r['result'] for r in load_snapshot(TEXT_BACKUP) if r['command'] == command][0]
+    key_pos = [table[0].index(c) for c in DIFF_HANDLE_CONFIG[command]['grouping']]
+    rows = [row for row in table[1:] if len(row) >= len(table[0]) and tuple(row[p] for p in key_pos) in keys]
+    return [table[0]] + rows + [['']]
+
+
+def json_table(command, result):
+    table = eosjson.normalize(command, result, NOW)
+    key_pos = [table[0].index(c) for c in DIFF_HANDLE_CONFIG[command]['grouping']]
+    return table, set(tuple(row[p] for p in key_pos) for row in table_rows(table))
+
+
+def assert_no_diff(command, diff):
+    assert diff is not None
+    assert dict((kind, rows) for kind, rows in diff.items() if rows) == {}, command
+
+
+def test_routes():
+    table, keys = json_table('show ip route', ROUTE_JSON)
+    text = text_table('show ip route', keys)
+    # the ECMP route is two rows in both
+    assert len(text) - 2 == len(table) - 2 == 5
+    assert sorted(table_rows(table)) == sorted(table_rows(text))
+    assert_no_diff('show ip route', fastdiff.sort_merge_diff(text, table, DIFF_HANDLE_CONFIG['show ip route']))
+
+
+def test_route_next_hop_change():
+    result = copy.deepcopy(ROUTE_JSON)
+    result['vrfs']['default']['routes']['10.5.81.0/24']['vias'][1]['nexthopAddr'] = '10.5.253.190'
+    table, keys = json_table('show ip route', result)
+    diff = fastdiff.sort_merge_diff(text_table('show ip route', keys), table, DIFF_HANDLE_CONFIG['show ip route'])
+    assert [row[1:3] for row in diff['changed']] == [['10.5.81.0', '24']]
+    assert not diff['new'] and not diff['missing']
+
+
+def test_macs():
+    table, keys = json_table('show mac address-table', MAC_JSON)
+    text = text_table('show mac address-table', keys)
+    # LAST_MOVE included, as the text table has it once folded
+    assert sorted(table_rows(table)) == sorted(table_rows(text))
+    assert_no_diff('show mac address-table',
+                   fastdiff.sort_merge_diff(text, table, DIFF_HANDLE_CONFIG['show mac address-table']))
@@ -0,0 +1,78 @@
+'''
+The streamed diffs against sort_merge_diff: extdiff.py on its sorted files and the
+records of changefeed.py, straight out of the join or through the sorted files, hold
+the same rows as the diff dict of the same tables
+
+    python -m pytest test_extdiff.py
+'''
+from __future__ import print_function
+
+import os
+import shutil
+
+import pytest
+
+import extdiff
+import fastdiff
+import changefeed
+
+from diffconfig import DiffRegistry
+from test_partdiff import PAIRS, HERE, diff_tables
+
+
+@pytest.fixture(scope='module', params=PAIRS, ids=lambda pair: pair[0].split('_backup_')[0])
+def pair(request, tmp_path_factory):
+    # the sorted files go next to the backups, so they are copied out of the repository
+    tmp_dir = str(tmp_path_factory.mktemp('backups'))
+    first, second = [shutil.copy(os.path.join(HERE, name), tmp_dir) for name in request.param]
+    tables = diff_tables(first, second)
+    expected = dict((command, fastdiff.sort_merge_diff(data_1, data_2, spec))
+                    for command, data_1, data_2, spec in tables)
+    return first, second, tables, expected
+
+
+def streamed_diff(results):
+    '''
+    the diff dict of (kind, merged row) results
+    '''
+    diff = dict((kind, []) for kind in changefeed.KINDS)
+    for kind, row in results:
+        diff[kind].append(row)
+    return diff
+
+
+@pytest.mark.parametrize('chunk_rows', [extdiff.CHUNK_ROWS, 50])
+def test_stream_diff(pair, chunk_rows):
+    first, second, _, expected = pair
+    registry = DiffRegistry()
+    for snapshot in (first, second):
+        # small chunks sort in spilled runs merged back
+        extdiff.sort_snapshot(snapshot, registry, chunk_rows)
+    for command, diff in expected.items():
+        result = streamed_diff(extdiff.stream_diff(first, second, command, registry, chunk_rows))
+        assert fastdiff.same_diff(result, diff), command
+
+
+def test_stream_diff_all(pair):
+    first, second, _, expected = pair
+    result = {}
+    for command, kind, row in extdiff.stream_diff_all(first, second):
+        result.setdefault(command, dict((k, []) for k in changefeed.KINDS))[kind].append(row)
+    for command, diff in expected.items():
+        assert fastdiff.same_diff(result.get(command, streamed_diff([])), diff), command
+
+
+@pytest.mark.parametrize('engine', changefeed.STREAM_ENGINE)
+def test_table_changes(pair, engine):
+    _, _, tables, expected = pair
+    for command, data_1, data_2, spec in tables:
+        records = list(changefeed.iter_table_changes(command, data_1, data_2, spec, engine))
+        assert records == list(changefeed.diff_changes(command, expected[command], spec)), command
+
+
+def test_external_changes(pair):
+    first, second, tables, expected = pair
+    records = [record for record in changefeed.external_changes(first, second, DiffRegistry())
+               if record['command'] in expected]
+    assert records == [record for command, _, _, spec in tables
+                       for record in changefeed.diff_changes(command, expected[command], spec)]
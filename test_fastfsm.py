@@ -0,0 +1,147 @@
+'''
+FastTextFSM against textfsm.TextFSM: the same records, or the same error, for every template
+
+    python -m pytest test_fastfsm.py
+'''
+from __future__ import print_function
+
+import io
+import glob
+import os
+
+import pytest
+
+textfsm = pytest.importorskip('textfsm')
+
+from fastfsm import FastTextFSM  # noqa: E402
+from cliparser import BACKUP_SECTION_DELIMITER, iter_sections  # noqa: E402
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+ROUTE_TEMPLATE = r'''Value Filldown VRF (\S+)
+Value Filldown,Key PROTOCOL ([A-Z]+(?: [A-Z0-9]+)?)
+Value Filldown,Key NETWORK (\d+\.\d+\.\d+\.\d+)
+Value Filldown MASK (\d+)
+Value DISTANCE (\d+)
+Value METRIC (\d+)
+Value DIRECT (directly)
+Value NEXT_HOP (\S+)
+Value Required INTERFACE (\S+)
+
+Start
+  ^VRF: -> Continue.Clearall
+  ^VRF:\s+${VRF}\s*$$
+  ^Gateway of last resort -> Routes
+  ^\s*\S
+
+Routes
+  ^VRF: -> Continue.Clearall
+  ^VRF:\s+${VRF}\s*$$ -> Start
+  ^\s+${PROTOCOL}\s+${NETWORK}/${MASK}\s+\[${DISTANCE}/${METRIC}\]\s+via\s+${NEXT_HOP},\s+${INTERFACE} -> Record
+  ^\s+${PROTOCOL}\s+${NETWORK}/${MASK}\s+is\s+${DIRECT} -> Continue
+  ^.*\s+connected,\s+${INTERFACE} -> Record
+  ^\s+${PROTOCOL}\s+${NETWORK}/${MASK}\s+\[${DISTANCE}/${METRIC}\]\s*$$
+  ^\s+via\s+${NEXT_HOP},\s+${INTERFACE} -> Record
+  ^\s+via\s+${NEXT_HOP}\s*$$ -> Record
+  ^\s+${PROTOCOL}\s+${NETWORK}/${MASK}\s+is\s+a\s+summary -> Clear
+  ^\s*$$
+  ^!\s+ -> Error "unexpected line"
+'''
+
+ROUTE_TEXT = '''VRF: default
+Codes: C - connected, S - static, O - OSPF, B I - iBGP, B E - eBGP
+
+Gateway of last resort:
+ B I    0.0.0.0/0 [200/0] via 10.5.253.26, Ethernet12
+
+ O      10.1.17.0/27 [110/6560] via 10.12.254.61, Port-Channel7
+ O E1   10.2.251.17/32 [110/16430]
+                            via 10.12.158.81, Vlan680
+                            via 10.12.158.85, Vlan681
+                            via 10.12.158.89
+ C      10.4.94.8/30 is directly connected, Ethernet3
+ S      10.5.4.9/32 is directly connected, Null0
+ A B    10.6.0.0/16 is a summary route
+ B E    10.7.0.0/16 [20/0] via 10.7.255.1, Ethernet7
+VRF: mgmt
+Gateway of last resort:
+                            via 192.168.1.253, Management1
+ C      192.168.1.0/24 is directly connected, Management1
+ S      0.0.0.0/0 [1/0] via 192.168.1.254, Management1
+'''
+
+# the fast path is off for List values, rules with backreferences are matched one by one
+LIST_TEMPLATE = r'''Value Filldown NETWORK (\S+)
+Value List NEXT_HOP (\S+)
+
+Start
+  ^\s+\S+\s+${NETWORK}\s+\[ -> Continue
+  ^.*via\s+${NEXT_HOP}
+  ^\s*$$ -> Record
+'''
+
+BACKREFERENCE_TEMPLATE = r'''Value INTERFACE (\S+)
+Value PEER (\S+)
+
+Start
+  ^${INTERFACE}\s+(\S+)\s+\1\s+${PEER} -> Record
+  ^\s+\S+\s+\S+\s+is\s+directly\s+connected,\s+${INTERFACE} -> Record
+'''
+
+
+def parse(fsm_class, template, text):
+    fsm = fsm_class(io.StringIO(template))
+    try:
+        return fsm.header, fsm.ParseText(text)
+    except textfsm.TextFSMError as e:
+        return 'error', str(e)
+
+
+def assert_same(template, text):
+    stock = parse(textfsm.TextFSM, template, text)
+    assert parse(FastTextFSM, template, text) == stock
+    return stock
+
+
+def test_route_template():
+    header, records = assert_same(ROUTE_TEMPLATE, ROUTE_TEXT)
+    assert len(records) == 10
+    # Filldown carries PROTOCOL and NETWORK to the ECMP next hops, Clearall resets them at a VRF
+    assert [r[header.index('NEXT_HOP')] for r in records[2:4]] == ['10.12.158.81', '10.12.158.85']
+    assert set(r[header.index('NETWORK')] for r in records[2:4]) == {'10.2.251.17'}
+    assert [r[header.index('VRF')] for r in records] == ['default'] * 7 + ['mgmt'] * 3
+    # and the next hop of no route left by a VRF keeps none of the routes before it
+    assert records[7][header.index('NETWORK')] == ''
+
+
+def test_required_drops_the_record():
+    # the last next hop has no interface, the Required INTERFACE drops its record in both
+    header, records = assert_same(ROUTE_TEMPLATE, ROUTE_TEXT)
+    assert '10.12.158.89' not in [r[header.index('NEXT_HOP')] for r in records]
+
+
+def test_error_rule():
+    stock = assert_same(ROUTE_TEMPLATE, ROUTE_TEXT + '! not a route\n')
+    assert stock[0] == 'error'
+
+
+def test_parse_again():
+    for fsm_class in (textfsm.TextFSM, FastTextFSM):
+        fsm = fsm_class(io.StringIO(ROUTE_TEMPLATE))
+        first = fsm.ParseText(ROUTE_TEXT)
+        fsm.Reset()
+        assert fsm.ParseText(ROUTE_TEXT) == first
+
+
+@pytest.mark.parametrize('template', [LIST_TEMPLATE, BACKREFERENCE_TEMPLATE])
+def test_slow_paths(template):
+    assert_same(template, ROUTE_TEXT)
+
+
+@pytest.mark.parametrize('backup', sorted(glob.glob(os.path.join(HERE, '*_backup_*.txt'))))
+def test_backup_routes(backup):
+    with open(backup) as f:
+        sections = [data for command, data in iter_sections(f, BACKUP_SECTION_DELIMITER)
+                    if command == 'show ip route' and data]
+    for data in sections:
+        assert_same(ROUTE_TEMPLATE, data)
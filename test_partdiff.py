@@ -0,0 +1,90 @@
+'''
+The partitioned diffs of partdiff.py against the sequential one: the same rows, with
+the same row index, whatever the partitions, the bucket count or the spill
+
+    python -m pytest test_partdiff.py
+'''
+from __future__ import print_function
+
+import os
+
+import pytest
+
+import fastdiff
+import partdiff
+
+from difftable import load_snapshot
+from diffconfig import DiffRegistry
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PAIRS = [('carcore3_backup_20170928005037.json', 'carcore3_backup_20170928110800.json'),
+         ('jpncore2_backup_20170929193311.json', 'jpncore2_backup_20170930030120.json')]
+
+
+def diff_tables(first, second):
+    '''
+    [(command, table_1, table_2, DiffSpec)] of the tables of two backups the merge engine can diff
+    '''
+    registry = DiffRegistry()
+    tables_1 = dict((r['command'], r['result']) for r in load_snapshot(first) if r.get('encoding') == 'list')
+    tables_2 = dict((r['command'], r['result']) for r in load_snapshot(second) if r.get('encoding') == 'list')
+    result = []
+    for command in sorted(set(tables_1) & set(tables_2)):
+        data_1, data_2 = tables_1[command], tables_2[command]
+        spec = registry.compile(command, data_1[0])
+        if spec is not None and data_1[0] == data_2[0] and spec.grouping == spec.index:
+            result.append((command, data_1, data_2, spec))
+    return result
+
+
+@pytest.fixture(scope='module', params=PAIRS, ids=lambda pair: pair[0].split('_backup_')[0])
+def pair(request):
+    first, second = [os.path.join(HERE, name) for name in request.param]
+    tables = diff_tables(first, second)
+    expected = dict((command, fastdiff.sort_merge_diff(data_1, data_2, spec))
+                    for command, data_1, data_2, spec in tables)
+    # something to partition: tables of hundreds of rows and differences in them
+    assert max(len(data_1) for _, data_1, _, _ in tables) > 100
+    assert any(rows for diff in expected.values() for rows in diff.values())
+    return first, second, tables, expected
+
+
+def assert_same(expected, result):
+    assert sorted(result) == sorted(expected)
+    for command in expected:
+        assert fastdiff.same_diff(result[command], expected[command]), command
+
+
+@pytest.mark.parametrize('buckets', [1, 2, 7, 16])
+@pytest.mark.parametrize('spill', [False, True])
+def test_diff_buckets(pair, buckets, spill, tmp_path):
+    _, _, tables, expected = pair
+    spill_dir = str(tmp_path) if spill else None
+    result = dict((command, partdiff.diff_buckets(data_1, data_2, spec, buckets, spill_dir=spill_dir))
+                  for command, data_1, data_2, spec in tables)
+    assert_same(expected, result)
+    # the spilled buckets are removed
+    assert os.listdir(str(tmp_path)) == []
+
+
+@pytest.mark.parametrize('workers, buckets', [(2, None), (3, None), (2, 5)])
+def test_parallel_diff(pair, workers, buckets):
+    _, _, tables, expected = pair
+    # every table is cut, down to partitions of a few rows
+    result = partdiff.parallel_diff(tables, workers=workers, partition_rows=10, buckets=buckets)
+    assert_same(expected, result)
+
+
+@pytest.mark.parametrize('spill', [False, True])
+def test_diff_snapshots(pair, spill, tmp_path):
+    first, second, _, expected = pair
+    result = partdiff.diff_snapshots(first, second, 7, spill_dir=str(tmp_path) if spill else None)
+    assert_same(expected, dict((command, diff) for command, diff in result.items() if command in expected))
+
+
+def test_merge_parts_row_index():
+    # keys a < b < c < d in two partitions, the row index is the position in all of them
+    diffs = [{'new': [[0, 'b', 'x']], 'missing': [], 'changed': []},
+             {'new': [], 'missing': [[1, 'd', 'y']], 'changed': [[0, 'a', 'z']]}]
+    merged = partdiff.merge_parts(diffs, [[('b',), ('c',)], [('a',), ('d',)]], 1)
+    assert merged == {'new': [[1, 'b', 'x']], 'missing': [[3, 'd', 'y']], 'changed': [[0, 'a', 'z']]}